@@ -0,0 +1,67 @@
+"""启动耗时基准测试
+在全新的Python进程中导入各个入口模块，记录导入耗时，并检查是否误导入了
+whisper/torch/MoviePy 等重量级依赖；超出耗时上限或误导入时以非零状态退出。
+
+用法（在项目根目录运行）:
+    python -m benchmarks.bench_import --max-ms 500
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+# 这些模块只应在对应功能真正运行时导入
+HEAVY_MODULES = ('whisper', 'torch', 'moviepy')
+ENTRY_MODULES = ('main', 'utils.merge_subtitle', 'utils.video_concat', 'utils.video_processor',
+                 'utils.images_to_video', 'utils.pipeline', 'utils.job_queue', 'utils.composer',
+                 'utils.transcript')
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = sorted(name for name in sys.modules if name.split('.')[0] in {heavy!r})
+print(json.dumps([elapsed, heavy]))
+"""
+
+
+def measure(module, repeat=3):
+    """在新进程中导入模块，返回 (最短耗时毫秒, 被导入的重量级模块)"""
+    best = None
+    heavy = []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                                capture_output=True, text=True, check=True)
+        elapsed, heavy = json.loads(result.stdout.strip().splitlines()[-1])
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000, sorted({name.split('.')[0] for name in heavy})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动耗时基准测试")
+    parser.add_argument('--modules', nargs='+', default=list(ENTRY_MODULES))
+    parser.add_argument('--max-ms', type=float, default=500.0, help="单个模块导入耗时上限（毫秒）")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help="结果JSON输出路径")
+    args = parser.parse_args()
+
+    results = []
+    failed = False
+    print(f"{'模块':<28} {'耗时(毫秒)':>12}  重量级依赖")
+    for module in args.modules:
+        ms, heavy = measure(module, args.repeat)
+        ok = ms <= args.max_ms and not heavy
+        failed = failed or not ok
+        results.append({'module': module, 'ms': round(ms, 1), 'heavy': heavy, 'ok': ok})
+        print(f"{module:<28} {ms:>12.1f}  {', '.join(heavy) or '-'}{'' if ok else '  ← 超限'}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
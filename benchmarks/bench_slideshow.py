@@ -0,0 +1,66 @@
+"""幻灯片渲染引擎基准测试
+对比 ffmpeg 引擎与 MoviePy 引擎在不同图片数量下的耗时。
+
+用法（在项目根目录运行）:
+    python -m benchmarks.bench_slideshow --sizes 4 100 1000 --engines ffmpeg moviepy
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.fixtures import make_audio, make_images
+from utils.images_to_video import RENDER_ENGINES
+
+
+def run(sizes, engines, duration_per_image, fps, work_dir):
+    """依次运行每种图片数量和引擎，返回耗时结果列表"""
+    results = []
+    audio_dir = os.path.join(work_dir, "audio")
+    make_audio(os.path.join(audio_dir, "bed.mp3"), 10)
+    for count in sizes:
+        images_dir = make_images(os.path.join(work_dir, f"images_{count}"), count)
+        for engine in engines:
+            output_path = os.path.join(work_dir, "out", f"{engine}_{count}.mp4")
+            start = time.perf_counter()
+            RENDER_ENGINES[engine](
+                images_dir=images_dir,
+                audio_dir=audio_dir,
+                output_path=output_path,
+                duration_per_image=duration_per_image,
+                fps=fps,
+                audio_count=1
+            )
+            elapsed = time.perf_counter() - start
+            results.append({
+                'engine': engine,
+                'images': count,
+                'seconds': round(elapsed, 3),
+                'output_bytes': os.path.getsize(output_path),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="幻灯片渲染引擎基准测试")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[4, 100, 1000])
+    parser.add_argument('--engines', nargs='+', default=list(RENDER_ENGINES), choices=list(RENDER_ENGINES))
+    parser.add_argument('--duration-per-image', type=float, default=1.0)
+    parser.add_argument('--fps', type=int, default=24)
+    parser.add_argument('--output', help="结果JSON输出路径")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_slideshow_") as work_dir:
+        results = run(args.sizes, args.engines, args.duration_per_image, args.fps, work_dir)
+
+    print(f"\n{'图片数':>8} {'引擎':>10} {'耗时(秒)':>10}")
+    for item in results:
+        print(f"{item['images']:>8} {item['engine']:>10} {item['seconds']:>10.2f}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
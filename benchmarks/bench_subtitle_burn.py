@@ -0,0 +1,60 @@
+"""字幕烧录基准测试
+对比整段串行烧录与分段并行烧录在长视频上的耗时，默认输入为1小时的合成视频。
+
+用法（在项目根目录运行）:
+    python -m benchmarks.bench_subtitle_burn --seconds 3600 --segments 0 1
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.fixtures import make_srt, make_video
+from utils.merge_subtitle import merge_subtitle_to_video
+
+
+def run(seconds, size, segment_options, workers, work_dir):
+    """依次用每种分段数烧录同一个输入，返回耗时结果列表"""
+    width, height = (int(v) for v in size.split('x'))
+    video_path = make_video(os.path.join(work_dir, "input.mp4"), seconds, width, height)
+    subtitle_path = make_srt(os.path.join(work_dir, "subtitle.srt"), seconds)
+    results = []
+    for segments in segment_options:
+        output_path = os.path.join(work_dir, "out", f"burn_{segments}.mp4")
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        start = time.perf_counter()
+        ok = merge_subtitle_to_video(video_path, subtitle_path, output_path, segments, workers)
+        elapsed = time.perf_counter() - start
+        results.append({
+            'segments': segments,
+            'seconds': round(elapsed, 3),
+            'ok': ok,
+            'output_bytes': os.path.getsize(output_path) if ok else 0,
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="字幕烧录基准测试")
+    parser.add_argument('--seconds', type=int, default=3600, help="输入视频时长（秒）")
+    parser.add_argument('--size', default="1280x720", help="输入视频分辨率")
+    parser.add_argument('--segments', type=int, nargs='+', default=[1, 0],
+                        help="要对比的分段数，1为串行，0为按CPU核数分段")
+    parser.add_argument('--workers', type=int, default=0)
+    parser.add_argument('--output', help="结果JSON输出路径")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_burn_") as work_dir:
+        results = run(args.seconds, args.size, args.segments, args.workers, work_dir)
+
+    print(f"\n{'分段数':>8} {'耗时(秒)':>10} {'输出(MB)':>10}")
+    for item in results:
+        print(f"{item['segments']:>8} {item['seconds']:>10.2f} {item['output_bytes'] / 1024 / 1024:>10.1f}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
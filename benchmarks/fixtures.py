@@ -0,0 +1,61 @@
+"""基准测试用的合成素材
+全部由ffmpeg离线生成（testsrc/sine），内容确定，可重复生成。
+
+"""
+import os
+import subprocess
+from utils.srt import format_srt_time
+
+
+def _ensure_parent(output_path):
+    """创建输出文件所在目录；路径只有文件名时即当前目录，无需创建"""
+    dirname = os.path.dirname(output_path)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+
+
+def make_images(output_dir, count, width=1280, height=720):
+    """生成 count 张测试图片，命名为 0.png, 1.png, ...（与 get_sorted_images 的排序规则一致）"""
+    os.makedirs(output_dir, exist_ok=True)
+    subprocess.run([
+        'ffmpeg', '-v', 'error', '-y',
+        '-f', 'lavfi', '-i', f"testsrc=size={width}x{height}:rate=1",
+        '-frames:v', str(count), '-start_number', '0',
+        os.path.join(output_dir, '%d.png')
+    ], check=True)
+    return output_dir
+
+
+def make_audio(output_path, seconds, frequency=440):
+    """生成指定时长的正弦波音频"""
+    _ensure_parent(output_path)
+    subprocess.run([
+        'ffmpeg', '-v', 'error', '-y',
+        '-f', 'lavfi', '-i', f"sine=frequency={frequency}:duration={seconds}",
+        output_path
+    ], check=True)
+    return output_path
+
+
+def make_video(output_path, seconds, width=1280, height=720, fps=30, gop=60, audio=True):
+    """生成指定时长的测试视频（testsrc画面 + 正弦波音轨），关键帧间隔为 gop 帧"""
+    _ensure_parent(output_path)
+    cmd = ['ffmpeg', '-v', 'error', '-y',
+           '-f', 'lavfi', '-i', f"testsrc=size={width}x{height}:rate={fps}:duration={seconds}"]
+    if audio:
+        cmd += ['-f', 'lavfi', '-i', f"sine=frequency=440:duration={seconds}", '-c:a', 'aac']
+    cmd += ['-c:v', 'libx264', '-preset', 'ultrafast', '-g', str(gop), '-pix_fmt', 'yuv420p',
+            output_path]
+    subprocess.run(cmd, check=True)
+    return output_path
+
+
+def make_srt(output_path, seconds, cue_seconds=2.5, gap_seconds=0.5):
+    """生成覆盖整段时长的字幕文件，每条字幕显示 cue_seconds 秒"""
+    _ensure_parent(output_path)
+    step = int((cue_seconds + gap_seconds) * 1000)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        for i, start in enumerate(range(0, int(seconds * 1000), step), start=1):
+            end = min(start + int(cue_seconds * 1000), int(seconds * 1000))
+            f.write(f"{i}\n{format_srt_time(start)} --> {format_srt_time(end)}\n第{i}条测试字幕 subtitle {i}\n\n")
+    return output_path
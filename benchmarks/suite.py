@@ -0,0 +1,206 @@
+"""端到端基准测试套件
+用ffmpeg离线生成确定的合成素材（testsrc/sine/生成的字幕），按规模依次测试各个环节：
+图片转视频（ffmpeg/MoviePy引擎）、whisper转写（tiny模型）、视频拼接、字幕烧录、软字幕封装。
+
+每个环节在独立的子进程中运行，记录墙钟时间、CPU时间（含ffmpeg子进程）、
+峰值内存和输出文件大小，结果写入JSON；指定基线时与基线比较，超出容差即以非零状态退出。
+
+基线与机器的CPU、ffmpeg版本和是否安装whisper/MoviePy有关，仓库中不提交基线，
+需要先在同一台机器上用 --save-baseline 生成。--baseline 指定的文件不存在时，
+不运行任何环节，直接以状态码2退出（而不是静默跳过比较）。
+
+用法（在项目根目录运行）:
+    python -m benchmarks.suite --sizes small --save-baseline benchmarks/baseline.json
+    python -m benchmarks.suite --sizes small --baseline benchmarks/baseline.json
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.fixtures import make_audio, make_images, make_srt, make_video
+
+# 各规模的素材参数：图片数、音频/视频时长（秒）、拼接片段数
+SIZES = {
+    'small': {'images': 10, 'seconds': 20, 'clips': 3},
+    'medium': {'images': 100, 'seconds': 120, 'clips': 6},
+    'large': {'images': 1000, 'seconds': 900, 'clips': 12},
+}
+STAGES = ('slideshow', 'slideshow_moviepy', 'transcribe', 'concat', 'burn', 'soft')
+# 比较基线时检查的指标及绝对容差：很短的环节按比例比较时容易被抖动误判
+METRICS = {'wall_seconds': 0.25, 'cpu_seconds': 0.25, 'peak_rss_mb': 10.0}
+# 基线文件不存在时的退出状态，与性能回归（1）区分
+EXIT_MISSING_BASELINE = 2
+
+
+def make_fixtures(size, work_dir):
+    """生成某一规模的全部素材，返回路径字典"""
+    spec = SIZES[size]
+    fixtures = {
+        'images_dir': make_images(os.path.join(work_dir, "images"), spec['images'], 640, 360),
+        'audio_dir': os.path.dirname(make_audio(os.path.join(work_dir, "audio", "bed.mp3"), spec['seconds'])),
+        'video': make_video(os.path.join(work_dir, "video.mp4"), spec['seconds'], 640, 360),
+        'subtitle': make_srt(os.path.join(work_dir, "subtitle.srt"), spec['seconds']),
+        'clips': [],
+    }
+    # 拼接片段交替使用两种分辨率，触发部分重新编码
+    for i in range(spec['clips']):
+        width, height = (640, 360) if i % 2 == 0 else (480, 270)
+        fixtures['clips'].append(make_video(os.path.join(work_dir, "clips", f"{i}.mp4"),
+                                            max(2, spec['seconds'] // spec['clips']), width, height))
+    return fixtures
+
+
+def run_stage(stage, fixtures, output_path):
+    """运行单个环节（在子进程中调用）"""
+    if stage in ('slideshow', 'slideshow_moviepy'):
+        from utils.images_to_video import render_slideshow
+        render_slideshow(engine="ffmpeg" if stage == 'slideshow' else "moviepy", images_dir=fixtures['images_dir'], audio_dir=fixtures['audio_dir'],
+                         output_path=output_path, duration_per_image=1.0, fps=24)
+    elif stage == 'transcribe':
+        from pathlib import Path
+        from utils.video_processor import generate_subtitle
+        output_dir = os.path.dirname(output_path)
+        os.makedirs(os.path.join(output_dir, "video"), exist_ok=True)
+        generate_subtitle(Path(fixtures['video']),
+                          {'model': 'tiny', 'device': 'cpu', 'fp16': False},
+                          {'output_dir': output_dir, 'is_subtitle': True, 'is_text': True})
+        os.replace(os.path.join(output_dir, "video", "subtitle.srt"), output_path)
+    elif stage == 'concat':
+        from utils.video_concat import concatenate_multiple_videos
+        with tempfile.TemporaryDirectory(prefix="bench_norm_") as cache_dir:
+            if not concatenate_multiple_videos(fixtures['clips'], output_path, cache_dir=cache_dir):
+                raise RuntimeError("拼接失败")
+    elif stage in ('burn', 'soft'):
+        from utils.merge_subtitle import merge_subtitle_to_video
+        if not merge_subtitle_to_video(fixtures['video'], fixtures['subtitle'], output_path,
+                                       mode=stage if stage == 'soft' else 'burn'):
+            raise RuntimeError("合并字幕失败")
+    else:
+        raise ValueError(f"未知的环节: {stage}")
+
+
+def _stage_worker(stage, fixtures_path, output_path):
+    """子进程入口：运行环节并输出资源用量"""
+    with open(fixtures_path, 'r', encoding='utf-8') as f:
+        fixtures = json.load(f)
+    start = time.perf_counter()
+    run_stage(stage, fixtures, output_path)
+    wall = time.perf_counter() - start
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    child_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    # ru_maxrss 在Linux上以KB为单位
+    print("BENCH_RESULT " + json.dumps({
+        'wall_seconds': wall,
+        'cpu_seconds': self_usage.ru_utime + self_usage.ru_stime + child_usage.ru_utime + child_usage.ru_stime,
+        'peak_rss_mb': max(self_usage.ru_maxrss, child_usage.ru_maxrss) / 1024,
+    }))
+
+
+def measure(stage, fixtures_path, output_path):
+    """在新进程中运行一个环节，返回指标；失败时返回带 error 的结果"""
+    result = subprocess.run([sys.executable, '-m', 'benchmarks.suite', '--stage-worker', stage,
+                             fixtures_path, output_path], capture_output=True, text=True)
+    line = next((l for l in result.stdout.splitlines() if l.startswith("BENCH_RESULT ")), None)
+    if result.returncode != 0 or line is None:
+        return {'error': (result.stderr.strip().splitlines() or ["未知错误"])[-1]}
+    metrics = json.loads(line[len("BENCH_RESULT "):])
+    metrics['output_bytes'] = os.path.getsize(output_path) if os.path.exists(output_path) else 0
+    return {k: round(v, 3) if isinstance(v, float) else v for k, v in metrics.items()}
+
+
+def run_suite(sizes, stages, work_root):
+    """按规模生成素材并测试各环节，返回 {规模: {环节: 指标}}"""
+    results = {}
+    for size in sizes:
+        work_dir = os.path.join(work_root, size)
+        print(f"生成 {size} 规模素材...")
+        fixtures = make_fixtures(size, work_dir)
+        fixtures_path = os.path.join(work_dir, "fixtures.json")
+        with open(fixtures_path, 'w', encoding='utf-8') as f:
+            json.dump(fixtures, f)
+        results[size] = {}
+        for stage in stages:
+            suffix = ".srt" if stage == 'transcribe' else ".mp4"
+            output_path = os.path.join(work_dir, "out", f"{stage}{suffix}")
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            metrics = measure(stage, fixtures_path, output_path)
+            results[size][stage] = metrics
+            if 'error' in metrics:
+                print(f"  {stage:<12} 失败: {metrics['error']}")
+            else:
+                print(f"  {stage:<12} {metrics['wall_seconds']:>8.2f}s 墙钟  {metrics['cpu_seconds']:>8.2f}s CPU  "
+                      f"{metrics['peak_rss_mb']:>8.1f}MB  {metrics['output_bytes']:>12}B")
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """与基线比较，返回回归列表
+
+    指标同时超出比例容差和绝对容差才算回归；基线中失败的环节不参与比较。
+    """
+    regressions = []
+    for size, stages in results.items():
+        for stage, metrics in stages.items():
+            base = baseline.get(size, {}).get(stage)
+            if not base or 'error' in base:
+                continue
+            if 'error' in metrics:
+                regressions.append(f"{size}/{stage}: 运行失败（基线中成功）: {metrics['error']}")
+                continue
+            for name, slack in METRICS.items():
+                if base.get(name) and metrics[name] > max(base[name] * (1 + tolerance), base[name] + slack):
+                    regressions.append(f"{size}/{stage}: {name} {metrics[name]} > 基线 {base[name]} "
+                                       f"(+{(metrics[name] / base[name] - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--stage-worker':
+        _stage_worker(*sys.argv[2:5])
+        return
+
+    parser = argparse.ArgumentParser(description="端到端基准测试套件")
+    parser.add_argument('--sizes', nargs='+', default=['small'], choices=list(SIZES))
+    parser.add_argument('--stages', nargs='+', default=list(STAGES), choices=list(STAGES))
+    parser.add_argument('--output', help="结果JSON输出路径")
+    parser.add_argument('--baseline', help="与该基线JSON比较，回归时以状态码1退出；文件不存在时以状态码2退出")
+    parser.add_argument('--save-baseline', help="把本次结果保存为基线")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="允许超出基线的比例")
+    args = parser.parse_args()
+
+    if args.baseline and not os.path.exists(args.baseline):
+        print(f"基线文件不存在: {args.baseline}")
+        print(f"请先在本机运行 python -m benchmarks.suite --sizes {' '.join(args.sizes)} "
+              f"--save-baseline {args.baseline} 生成基线")
+        sys.exit(EXIT_MISSING_BASELINE)
+
+    with tempfile.TemporaryDirectory(prefix="bench_suite_") as work_root:
+        results = run_suite(args.sizes, args.stages, work_root)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+
+    failed = any('error' in m for stages in results.values() for m in stages.values())
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\n性能回归:")
+            for item in regressions:
+                print(f"  - {item}")
+            sys.exit(1)
+        print("\n与基线相比没有回归")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,9 @@
+import argparse
+import json
 import yaml
-from utils.video_processor import process_videos
-from utils.images_to_video import begin_images_to_video
-from utils.merge_subtitle import begin_merge_subtitle
+# 各功能模块在对应子命令中才导入：whisper/torch、MoviePy 的导入要耗时数秒，
+# 只合并字幕或拼接视频时不应为它们付出启动时间
+
 def load_config():
     """加载配置文件"""
     try:
@@ -11,21 +13,137 @@ def load_config():
         print(f"加载配置文件失败: {str(e)}")
         return None
 
-def main():
-    # 加载配置
+def run_actions(args=None):
+    """按 config.yaml 中启用的功能依次执行"""
     config = load_config()
     if not config:
         return
-    
+
     actions = config.get('actions', {})
+    if actions.get('pipeline', False):
+        # 流水线已包含转写和字幕合并
+        run_pipeline()
+        return
     if actions.get('images_to_video', False):
-        begin_images_to_video()
+        run_images()
     if actions.get('process_videos', False):
-        process_videos()
+        run_transcribe()
     if actions.get('begin_merge_subtitle', False):
-        begin_merge_subtitle()
+        run_merge()
 
-if __name__ == "__main__":
-    main()
+def run_images(args=None):
+    from utils.images_to_video import begin_images_to_video
+    begin_images_to_video()
+
+def run_transcribe(args=None):
+    from utils.video_processor import process_videos
+    process_videos()
+
+def run_merge(args=None):
+    if args and args.video and args.subtitle and args.output:
+        from utils.merge_subtitle import merge_subtitle_to_video
+        merge_subtitle_to_video(args.video, args.subtitle, args.output, args.segments, mode=args.mode,
+                                profile=args.profile)
+        return
+    from utils.merge_subtitle import begin_merge_subtitle
+    begin_merge_subtitle()
+
+def run_concat(args):
+    from utils.video_concat import concatenate_multiple_videos
+    concatenate_multiple_videos(args.videos, args.output, dry_run=args.dry_run,
+                                reencode=args.reencode, profile=args.profile)
+
+def run_compose(args):
+    from utils.composer import begin_compose
+    begin_compose(args.config, args.dry_run)
+
+def run_search(args):
+    from utils.transcript import print_matches, reindex, search
+    if args.reindex:
+        reindex(args.dir)
+    if args.phrase:
+        print_matches(search(args.dir, args.phrase, args.limit))
+
+def run_pipeline(args=None):
+    from utils.pipeline import begin_pipeline
+    begin_pipeline()
+
+def run_worker(args):
+    from utils.job_queue import load_config as load_queue_config, run_worker as start_worker, DEFAULT_DB_PATH
+    queue_config = load_queue_config() or {}
+    start_worker(queue_config.get('db_path', DEFAULT_DB_PATH), queue_config.get('limits'),
+                 queue_config.get('poll_interval', 1.0), queue_config.get('worker'), args.once,
+                 queue_config.get('warm_up', False))
+
+def run_submit(args):
+    from utils.job_queue import load_config as load_queue_config, connect, submit_job, DEFAULT_DB_PATH
+    queue_config = load_queue_config() or {}
+    conn = connect(queue_config.get('db_path', DEFAULT_DB_PATH))
+    print(f"已提交任务 #{submit_job(conn, args.type, json.loads(args.payload))}")
 
+def run_status(args):
+    from utils.job_queue import load_config as load_queue_config, connect, print_status, DEFAULT_DB_PATH
+    queue_config = load_queue_config() or {}
+    print_status(connect(queue_config.get('db_path', DEFAULT_DB_PATH)), args.limit)
 
+def build_parser():
+    """命令行参数：不带子命令时按 config.yaml 的 actions 执行"""
+    parser = argparse.ArgumentParser(description="视频处理工具")
+    parser.set_defaults(func=run_actions)
+    sub = parser.add_subparsers(dest='command')
+
+    sub.add_parser('run', help="按 config.yaml 的 actions 执行").set_defaults(func=run_actions)
+    sub.add_parser('images', help="图片转视频（config/images_to_video.yaml）").set_defaults(func=run_images)
+    sub.add_parser('transcribe', help="转写视频（config/video_processor.yaml）").set_defaults(func=run_transcribe)
+
+    merge = sub.add_parser('merge', help="合并字幕（config/merge_subtitle.yaml，也可在命令行指定）")
+    merge.add_argument('--video', help="输入视频")
+    merge.add_argument('--subtitle', help="字幕文件")
+    merge.add_argument('--output', help="输出视频")
+    merge.add_argument('--mode', choices=['burn', 'soft'], default='burn')
+    merge.add_argument('--segments', type=int, default=1, help="烧录分段数，1为串行，0为按CPU核数")
+    merge.add_argument('--profile', help="编码配置：draft/delivery/intermediate")
+    merge.set_defaults(func=run_merge)
+
+    concat = sub.add_parser('concat', help="拼接视频")
+    concat.add_argument('output', help="输出视频路径")
+    concat.add_argument('videos', nargs='+', help="输入视频路径")
+    concat.add_argument('--dry-run', action='store_true', help="只打印拼接计划")
+    concat.add_argument('--reencode', action='store_true', help="全部重新编码")
+    concat.add_argument('--profile', help="重新编码使用的编码配置：draft/delivery/intermediate")
+    concat.set_defaults(func=run_concat)
+
+    compose = sub.add_parser('compose', help="按声明式描述一次编码合成成品（config/compose.yaml）")
+    compose.add_argument('config', nargs='?', default='config/compose.yaml', help="合成描述（YAML）")
+    compose.add_argument('--dry-run', action='store_true', help="只打印编译出的滤镜图")
+    compose.set_defaults(func=run_compose)
+
+    search = sub.add_parser('search', help="在转写结果中检索短语")
+    search.add_argument('phrase', nargs='?', help="要查找的短语")
+    search.add_argument('--dir', default="output_video/processed", help="转写输出目录")
+    search.add_argument('--limit', type=int, default=None, help="最多返回的条数")
+    search.add_argument('--reindex', action='store_true', help="为只有 subtitle.srt 的旧结果补建索引")
+    search.set_defaults(func=run_search)
+
+    sub.add_parser('pipeline', help="流水线处理（config/pipeline.yaml）").set_defaults(func=run_pipeline)
+
+    worker = sub.add_parser('worker', help="启动常驻任务工作进程（config/job_queue.yaml）")
+    worker.add_argument('--once', action='store_true', help="队列清空后退出")
+    worker.set_defaults(func=run_worker)
+
+    submit = sub.add_parser('submit', help="提交任务到队列")
+    submit.add_argument('type', help="任务类型：transcribe/merge_subtitle/concat/images_to_video/compose/pipeline")
+    submit.add_argument('payload', help="任务参数（JSON）")
+    submit.set_defaults(func=run_submit)
+
+    status = sub.add_parser('status', help="查看任务队列状态")
+    status.add_argument('--limit', type=int, default=20)
+    status.set_defaults(func=run_status)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""任务队列测试：租约过期的任务由任意工作进程重新排队，续约中的任务不受影响"""
+from utils.job_queue import claim_job, connect, renew_leases, requeue_stale, submit_job
+
+
+def _state(conn, job_id):
+    return conn.execute("SELECT state, worker FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+
+def test_expired_lease_is_requeued_by_any_worker(tmp_path):
+    conn = connect(tmp_path / "jobs.sqlite3")
+    crashed = submit_job(conn, 'concat', {'video_paths': [], 'output_path': 'a.mp4'})
+    alive = submit_job(conn, 'concat', {'video_paths': [], 'output_path': 'b.mp4'})
+    assert claim_job(conn, 'concat', 'host:100', lease_seconds=60)['id'] == crashed
+    assert claim_job(conn, 'concat', 'host:200', lease_seconds=60)['id'] == alive
+
+    # 租约都未过期时，其他工作进程不会抢走任务
+    assert requeue_stale(conn, 'host:300') == 0
+
+    # host:100 崩溃后不再续约，租约过期；host:200 仍在续约
+    conn.execute("UPDATE jobs SET lease_expires = 0")
+    renew_leases(conn, [alive], 'host:200', lease_seconds=60)
+    assert requeue_stale(conn, 'host:300') == 1
+    assert tuple(_state(conn, crashed)) == ('queued', None)
+    assert tuple(_state(conn, alive)) == ('running', 'host:200')
+
+    # 重新排队的任务可以被其他工作进程领取
+    assert claim_job(conn, 'concat', 'host:300')['id'] == crashed
+    assert conn.execute("SELECT attempts FROM jobs WHERE id = ?", (crashed,)).fetchone()[0] == 2
+
+
+def test_restarted_worker_requeues_its_own_jobs(tmp_path):
+    conn = connect(tmp_path / "jobs.sqlite3")
+    job_id = submit_job(conn, 'concat', {'video_paths': [], 'output_path': 'a.mp4'})
+    claim_job(conn, 'concat', 'fixed-name', lease_seconds=60)
+    # 固定名字的工作进程重启时不必等租约过期
+    assert requeue_stale(conn, 'fixed-name') == 1
+    assert _state(conn, job_id)['state'] == 'queued'
@@ -0,0 +1,56 @@
+"""流水线增量执行测试：产物比输入旧时重新执行任务并真正覆盖产物"""
+import os
+import shutil
+import subprocess
+import time
+
+import pytest
+
+from utils.pipeline import build_video_tasks, is_up_to_date, run_pipeline
+
+pytestmark = pytest.mark.skipif(shutil.which('ffmpeg') is None, reason="需要ffmpeg")
+
+
+def _make_video(path):
+    subprocess.run(['ffmpeg', '-v', 'error', '-y',
+                    '-f', 'lavfi', '-i', 'testsrc=d=1:s=160x120:r=10',
+                    '-f', 'lavfi', '-i', 'sine=d=1',
+                    '-shortest', '-c:v', 'libx264', '-c:a', 'aac', str(path)], check=True)
+
+
+def test_stale_subtitle_output_is_rewritten(tmp_path):
+    video = tmp_path / "input" / "clip.mp4"
+    video.parent.mkdir()
+    _make_video(video)
+
+    processed_dir = tmp_path / "processed"
+    subtitle = processed_dir / "clip" / "subtitle.srt"
+    subtitle.parent.mkdir(parents=True)
+    subtitle.write_text("1\n00:00:00,000 --> 00:00:00,800\nhello\n\n", encoding='utf-8')
+
+    subtitled_dir = tmp_path / "subtitled"
+    subtitled_dir.mkdir()
+    merged = subtitled_dir / "clip.mp4"
+    merged.write_bytes(b"stale output")
+
+    # 视频 < 旧产物 < 字幕 < 当前时间：转写产物是最新的，合并字幕的产物已过期
+    now = time.time_ns()
+    for path, age in ((video, 3), (merged, 2), (subtitle, 1)):
+        os.utime(path, ns=(now - age * 1_000_000_000, now - age * 1_000_000_000))
+
+    pipeline_config = {'subtitled_dir': str(subtitled_dir), 'final_dir': str(tmp_path / "final")}
+    vp_config = {'video': {'output': {'output_dir': str(processed_dir), 'is_audio': False,
+                                      'is_text': False, 'is_subtitle': True}}}
+    ms_config = {'mode': 'burn', 'profile': 'draft'}
+    tasks = build_video_tasks([video], pipeline_config, vp_config, ms_config)
+
+    report = run_pipeline(tasks, workers=2)
+
+    assert report['transcribe:clip']['state'] == 'skipped'
+    assert report['subtitle:clip']['state'] == 'done'
+    assert merged.read_bytes() != b"stale output"
+    assert is_up_to_date([merged], [video, subtitle])
+
+    # 产物更新后再次运行应直接跳过
+    report = run_pipeline(build_video_tasks([video], pipeline_config, vp_config, ms_config), workers=2)
+    assert report['subtitle:clip']['state'] == 'skipped'
@@ -0,0 +1,65 @@
+"""转写结果缓存测试：条目原子写入，中途失败不会留下可被命中的残缺条目"""
+import shutil
+
+import pytest
+
+from utils.result_cache import TMP_PREFIX, evict, restore_result, save_result
+
+NAMES = ['subtitle.srt', 'text.txt']
+
+
+def _write_outputs(directory, text):
+    directory.mkdir(parents=True, exist_ok=True)
+    for name in NAMES:
+        (directory / name).write_text(f"{name}: {text}", encoding='utf-8')
+
+
+def test_save_and_restore(tmp_path):
+    cache_dir = tmp_path / "cache"
+    _write_outputs(tmp_path / "out", "first")
+    save_result("k1", tmp_path / "out", NAMES, cache_dir)
+    # 覆盖已有条目
+    _write_outputs(tmp_path / "out", "second")
+    save_result("k1", tmp_path / "out", NAMES, cache_dir)
+
+    assert restore_result("k1", tmp_path / "restored", NAMES, cache_dir)
+    assert (tmp_path / "restored" / "text.txt").read_text(encoding='utf-8') == "text.txt: second"
+    assert not [d for d in cache_dir.iterdir() if d.name.startswith(TMP_PREFIX)]
+
+
+def test_interrupted_save_leaves_no_entry(tmp_path, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    _write_outputs(tmp_path / "out", "first")
+    copied = []
+    copyfile = shutil.copyfile
+
+    def copy_then_crash(src, dst):
+        # 第二个文件只写了一半时进程被中断
+        copied.append(dst)
+        if len(copied) > 1:
+            with open(dst, 'w', encoding='utf-8') as f:
+                f.write("text.txt: fi")
+            raise KeyboardInterrupt
+        return copyfile(src, dst)
+
+    monkeypatch.setattr(shutil, 'copyfile', copy_then_crash)
+    with pytest.raises(KeyboardInterrupt):
+        save_result("k1", tmp_path / "out", NAMES, cache_dir)
+    monkeypatch.undo()
+
+    # 两个文件都已出现在磁盘上，但条目目录不存在，也没有残留的临时目录
+    assert len(copied) == 2
+    assert not restore_result("k1", tmp_path / "restored", NAMES, cache_dir)
+    assert list(cache_dir.iterdir()) == []
+
+
+def test_evict_skips_entries_being_written(tmp_path):
+    cache_dir = tmp_path / "cache"
+    _write_outputs(tmp_path / "out", "x" * 1000)
+    save_result("k1", tmp_path / "out", NAMES, cache_dir)
+    in_progress = cache_dir / f"{TMP_PREFIX}k2.abc"
+    in_progress.mkdir()
+    (in_progress / "subtitle.srt").write_text("partial", encoding='utf-8')
+
+    assert evict(cache_dir, 0) == 1
+    assert in_progress.exists()
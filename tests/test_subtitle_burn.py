@@ -0,0 +1,54 @@
+"""分段并行烧录字幕测试：逐帧与整段串行烧录的结果一致"""
+import shutil
+import subprocess
+
+import pytest
+
+from utils.merge_subtitle import merge_subtitle_to_video
+from utils.subtitle_burn import burn_subtitle_segmented
+
+pytestmark = pytest.mark.skipif(shutil.which('ffmpeg') is None or shutil.which('ffprobe') is None,
+                                reason="需要ffmpeg和ffprobe")
+
+# 字幕跨越分段边界（第1、2、3秒处的关键帧）
+SUBTITLE = """1
+00:00:00,500 --> 00:00:01,500
+first cue
+
+2
+00:00:01,900 --> 00:00:02,300
+second cue
+
+3
+00:00:03,000 --> 00:00:03,960
+third cue
+
+"""
+
+
+def _framemd5(path):
+    result = subprocess.run(['ffmpeg', '-v', 'error', '-i', str(path), '-map', '0:v',
+                             '-fps_mode', 'passthrough', '-f', 'framemd5', '-'],
+                            capture_output=True, text=True, check=True)
+    return [line for line in result.stdout.splitlines() if not line.startswith('#')]
+
+
+def test_segmented_burn_matches_single_pass(tmp_path):
+    # 文件起始时间为2秒，分段定位和字幕时间都要以起始时间为零点
+    video = tmp_path / "input.mp4"
+    subprocess.run(['ffmpeg', '-v', 'error', '-y', '-f', 'lavfi', '-i', 'testsrc=d=4:s=320x240:r=25',
+                    '-c:v', 'libx264', '-g', '25', '-pix_fmt', 'yuv420p', '-output_ts_offset', '2',
+                    str(video)], check=True)
+    subtitle = tmp_path / "subtitle.srt"
+    subtitle.write_text(SUBTITLE, encoding='utf-8')
+
+    # 无损中间编码配置：两种方式解码出的每一帧都可以逐字节比较
+    single = tmp_path / "single.mp4"
+    assert merge_subtitle_to_video(video, subtitle, single, segments=1, profile='intermediate')
+    segmented = tmp_path / "segmented.mp4"
+    assert burn_subtitle_segmented(video, subtitle, segmented, segments=4, workers=2,
+                                   temp_dir=str(tmp_path / "temp"), profile='intermediate')
+
+    expected = _framemd5(single)
+    assert len(expected) == 100
+    assert _framemd5(segmented) == expected
@@ -0,0 +1,43 @@
+"""按旁白排列幻灯片测试：格式不一致的旁白片段统一转换后全部进入输出音轨"""
+import shutil
+import subprocess
+
+import pytest
+
+from utils.timeline import create_video_timeline
+
+pytestmark = pytest.mark.skipif(shutil.which('ffmpeg') is None or shutil.which('ffprobe') is None,
+                                reason="需要ffmpeg和ffprobe")
+
+
+def _ffmpeg(*args):
+    subprocess.run(['ffmpeg', '-v', 'error', '-y'] + [str(a) for a in args], check=True)
+
+
+def _mean_volume(path, start, end):
+    result = subprocess.run(['ffmpeg', '-i', str(path), '-map', '0:a',
+                             '-af', f"atrim={start}:{end},volumedetect", '-f', 'null', '-'],
+                            capture_output=True, text=True, check=True)
+    line = next(l for l in result.stderr.splitlines() if 'mean_volume' in l)
+    return float(line.split('mean_volume:')[1].split()[0])
+
+
+def test_mixed_format_narration(tmp_path):
+    images_dir = tmp_path / "images"
+    narration_dir = tmp_path / "narration"
+    images_dir.mkdir()
+    narration_dir.mkdir()
+    _ffmpeg('-f', 'lavfi', '-i', 'testsrc=s=160x120', '-frames:v', '2', '-start_number', '0',
+            images_dir / "%d.png")
+    # 两个片段的编码、采样率和声道数都不同
+    _ffmpeg('-f', 'lavfi', '-i', 'sine=f=440:d=1', '-ar', '16000', '-ac', '1', narration_dir / "0.wav")
+    _ffmpeg('-f', 'lavfi', '-i', 'sine=f=880:d=1.5', '-ar', '44100', '-ac', '2', narration_dir / "1.mp3")
+
+    output = tmp_path / "out.mp4"
+    slots = create_video_timeline(str(images_dir), str(output), fps=10, narration_dir=str(narration_dir),
+                                  image_cache_dir=str(tmp_path / "cache"), profile='draft')
+    assert slots[0] == pytest.approx(1.0, abs=0.1)
+
+    # 第二张图片期间播放的是第二个旁白片段，而不是被当成第一个片段的格式解码后丢失
+    assert _mean_volume(output, 0.1, 0.9) > -40
+    assert _mean_volume(output, 1.2, 2.3) > -40
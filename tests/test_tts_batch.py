@@ -0,0 +1,165 @@
+"""Batch TTS against a local stub of the GPT-SoVITS endpoint: dedup, cache reuse, ordered concat"""
+import json
+import shutil
+import struct
+import tempfile
+import threading
+import urllib.request
+import wave
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils.audio.tts_batch import concat_audio, synthesize_batch
+
+SAMPLE_RATE = 32000
+# Each text becomes a clip of constant samples at its own level, so the concatenated
+# output can be decoded back into the sequence of texts it was built from
+LEVELS = {'first': 1000, 'second': 2000, 'third': 3000, 'fourth': 4000}
+CLIP_SAMPLES = 1600
+
+
+def _wav_bytes(level):
+    with tempfile.TemporaryFile() as f:
+        with wave.open(f, 'wb') as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(SAMPLE_RATE)
+            w.writeframes(struct.pack('<h', level) * CLIP_SAMPLES)
+        f.seek(0)
+        return f.read()
+
+
+class StubTTSServer:
+    """Serves POST /get_tts_wav with a WAV body and counts requests per text"""
+
+    def __init__(self):
+        self.requests = Counter()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                server.requests[payload['text']] += 1
+                body = _wav_bytes(LEVELS[payload['text']])
+                self.send_response(200)
+                self.send_header('Content-Type', 'audio/wav')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class StubClient:
+    """Minimal stand-in for gradio_client.Client: predict() returns the path of a downloaded file"""
+
+    def __init__(self, api_url, download_dir):
+        self.api_url = api_url
+        self.download_dir = download_dir
+
+    def predict(self, api_name, **kwargs):
+        request = urllib.request.Request(self.api_url + api_name, data=json.dumps(kwargs).encode('utf-8'),
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request) as response:
+            data = response.read()
+        with tempfile.NamedTemporaryFile(suffix='.wav', dir=self.download_dir, delete=False) as f:
+            f.write(data)
+        return f.name
+
+
+def _config(tmp_path, api_url):
+    ref_audio = tmp_path / "ref.wav"
+    ref_audio.write_bytes(_wav_bytes(0))
+    return {
+        'api_url': api_url,
+        'reference_audio': {'file_path': str(ref_audio), 'text': "reference", 'language': "中文"},
+        'tts_settings': {'text_language': "中文", 'how_to_cut': "不切", 'top_k': 15, 'top_p': 1.0,
+                         'temperature': 1.0, 'ref_free': False, 'speed': 1.0, 'if_freeze': False,
+                         'sample_steps': 8, 'if_sr': False, 'pause_second': 0.3},
+    }
+
+
+def _levels(wav_path):
+    """Collapse the decoded samples into the sequence of constant-level runs"""
+    with wave.open(str(wav_path), 'rb') as w:
+        frames = w.readframes(w.getnframes())
+    samples = struct.unpack(f'<{len(frames) // 2}h', frames)
+    runs = []
+    for sample in samples:
+        if not runs or runs[-1] != sample:
+            runs.append(sample)
+    return runs
+
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None, reason="concat_audio needs ffmpeg")
+def test_dedup_cache_and_ordered_concat(tmp_path):
+    texts = ['second', 'first', 'second', 'third', 'first']
+    cache_dir = tmp_path / "cache"
+    download_dir = tmp_path / "downloads"
+    download_dir.mkdir()
+
+    with StubTTSServer() as server:
+        config = _config(tmp_path, server.url)
+        factory = lambda api_url: StubClient(api_url, download_dir)  # noqa: E731
+        reference = lambda path: path  # noqa: E731
+
+        paths = synthesize_batch(texts, config, cache_dir=cache_dir, workers=3,
+                                 client_factory=factory, reference_factory=reference)
+        # Repeated texts are synthesized once and share one cache entry
+        assert server.requests == Counter({'first': 1, 'second': 1, 'third': 1})
+        assert paths[0] == paths[2] and paths[1] == paths[4]
+        assert len(set(paths)) == 3
+
+        # A second run is served entirely from the cache
+        again = synthesize_batch(texts, config, cache_dir=cache_dir, workers=3,
+                                 client_factory=factory, reference_factory=reference)
+        assert again == paths
+        assert sum(server.requests.values()) == 3
+
+        # A new text only requests the new segment
+        extended = synthesize_batch(texts + ['fourth'], config, cache_dir=cache_dir,
+                                    client_factory=factory, reference_factory=reference)
+        assert server.requests['fourth'] == 1
+        assert sum(server.requests.values()) == 4
+        assert extended[:len(texts)] == paths
+
+    output = tmp_path / "out.wav"
+    concat_audio(paths, output)
+    assert _levels(output) == [LEVELS[text] for text in texts]
+
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None or shutil.which('ffprobe') is None,
+                    reason="concat_audio needs ffmpeg and ffprobe")
+def test_concat_pause_matches_clip_format(tmp_path):
+    # Stereo 44.1 kHz clips: the silence between them must use the same rate and layout
+    paths = []
+    for text in ('first', 'second'):
+        path = tmp_path / f"{text}.wav"
+        with wave.open(str(path), 'wb') as w:
+            w.setnchannels(2)
+            w.setsampwidth(2)
+            w.setframerate(44100)
+            w.writeframes(struct.pack('<hh', LEVELS[text], LEVELS[text]) * 4410)
+        paths.append(str(path))
+
+    output = tmp_path / "out.wav"
+    concat_audio(paths, output, pause_seconds=0.05)
+    with wave.open(str(output), 'rb') as w:
+        assert (w.getnchannels(), w.getframerate()) == (2, 44100)
+        assert w.getnframes() == 4410 * 2 + 2205
+    assert _levels(output) == [LEVELS['first'], 0, LEVELS['second']]
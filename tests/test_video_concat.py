@@ -0,0 +1,82 @@
+"""拼接测试：归一化片段缓存的LRU淘汰，部分重新编码时片段编码参数的核对"""
+import os
+import shutil
+import subprocess
+import time
+
+import pytest
+
+from utils.video_concat import (ConcatMismatchError, check_normalized, clip_params, concatenate_multiple_videos,
+                                evict_normalized_cache, plan_concat)
+from utils.media_info import probe
+
+needs_ffmpeg = pytest.mark.skipif(shutil.which('ffmpeg') is None or shutil.which('ffprobe') is None,
+                                  reason="需要ffmpeg和ffprobe")
+
+
+def _make_clip(cache_dir, name, size, age):
+    path = cache_dir / name
+    path.write_bytes(b"\0" * size)
+    ts = time.time() - age
+    os.utime(path, (ts, ts))
+    return path
+
+
+def test_evicts_least_recently_used_clips(tmp_path):
+    oldest = _make_clip(tmp_path, "a.mp4", 400, age=40)
+    older = _make_clip(tmp_path, "b.mp4", 400, age=30)
+    recent = _make_clip(tmp_path, "c.mp4", 400, age=20)
+    newest = _make_clip(tmp_path, "d.mp4", 400, age=10)
+
+    # 总计1600字节，上限1000字节：淘汰最旧的两个即可
+    assert evict_normalized_cache(tmp_path, 1000) == 2
+    assert not oldest.exists() and not older.exists()
+    assert recent.exists() and newest.exists()
+
+    # 未超出上限时不淘汰
+    assert evict_normalized_cache(tmp_path, 1000) == 0
+
+
+def test_keeps_clips_in_use(tmp_path):
+    in_use = _make_clip(tmp_path, "a.mp4", 400, age=40)
+    stale = _make_clip(tmp_path, "b.mp4", 400, age=30)
+    fresh = _make_clip(tmp_path, "c.mp4", 400, age=20)
+    # 正在写入的临时文件不计入、不淘汰
+    tmp_file = _make_clip(tmp_path, "d.123.tmp.mp4", 4000, age=50)
+
+    assert evict_normalized_cache(tmp_path, 800, keep=[in_use]) == 1
+    assert in_use.exists() and fresh.exists() and tmp_file.exists()
+    assert not stale.exists()
+
+
+def _make_video(path, size):
+    subprocess.run(['ffmpeg', '-v', 'error', '-y',
+                    '-f', 'lavfi', '-i', f'testsrc=d=1:s={size}:r=25',
+                    '-f', 'lavfi', '-i', 'sine=d=1',
+                    '-shortest', '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-c:a', 'aac', str(path)], check=True)
+    return str(path)
+
+
+@needs_ffmpeg
+def test_partial_concat_matches_stream_copied_clips(tmp_path):
+    clips = [_make_video(tmp_path / "a.mp4", "320x240"),
+             _make_video(tmp_path / "b.mp4", "160x120"),
+             _make_video(tmp_path / "c.mp4", "320x240")]
+    plan = plan_concat(clips)
+    assert plan['strategy'] == 'partial' and plan['reencode'] == [clips[1]]
+
+    output = tmp_path / "out.mp4"
+    assert concatenate_multiple_videos(clips, output, temp_dir=str(tmp_path / "temp"),
+                                       cache_dir=str(tmp_path / "cache"), cache_max_mb=None)
+    # 归一化片段与流复制片段的档次、级别、像素格式、时间基和声道布局一致
+    normalized = list((tmp_path / "cache").glob("*.mp4"))
+    assert len(normalized) == 1
+    check_normalized(normalized, plan['target'])
+    info = probe(output, cache_path=None)
+    assert abs(info.duration - 3.0) < 0.2
+
+    # 目标参数无法匹配时报告不一致，由调用方退回全部重新编码
+    target = dict(plan['target'], video=dict(plan['target']['video'], level=62))
+    with pytest.raises(ConcatMismatchError):
+        check_normalized(normalized, target)
+    assert clip_params(probe(normalized[0], cache_path=None))['video']['level'] == plan['target']['video']['level']
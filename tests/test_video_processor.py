@@ -0,0 +1,78 @@
+"""whisper模型缓存测试：加载在锁外进行，命中缓存不被其他模型的加载阻塞，同一模型只加载一次"""
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+from utils import video_processor
+from utils.video_processor import MODEL_LOCK, clear_model_cache, get_model
+
+
+class FakeWhisper(types.ModuleType):
+    """替代 whisper 模块：load_model 在 release 之前一直阻塞，并记录加载次数"""
+
+    def __init__(self):
+        super().__init__('whisper')
+        self.loads = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def load_model(self, name, device=None):
+        self.loads.append(name)
+        self.started.set()
+        assert self.release.wait(5)
+        return object()
+
+
+@pytest.fixture
+def fake_whisper(monkeypatch):
+    module = FakeWhisper()
+    monkeypatch.setitem(sys.modules, 'whisper', module)
+    clear_model_cache()
+    yield module
+    module.release.set()
+    clear_model_cache()
+
+
+def _config(name):
+    return {'model': name, 'device': 'cpu', 'fp16': False, 'cache_size': 2}
+
+
+def test_cache_hit_not_blocked_by_loading(fake_whisper):
+    fake_whisper.release.set()
+    cached = get_model(_config('tiny'))
+    fake_whisper.release.clear()
+
+    loaded = {}
+    loader = threading.Thread(target=lambda: loaded.update(model=get_model(_config('base'))))
+    loader.start()
+    assert fake_whisper.started.wait(5)
+
+    # base 正在加载，转写锁也被占用：命中缓存的 tiny 依然立即返回
+    with MODEL_LOCK:
+        start = time.perf_counter()
+        assert get_model(_config('tiny')) is cached
+        assert time.perf_counter() - start < 0.5
+
+    fake_whisper.release.set()
+    loader.join(5)
+    assert loaded['model'] is get_model(_config('base'))
+    assert fake_whisper.loads == ['tiny', 'base']
+
+
+def test_concurrent_requests_load_once(fake_whisper):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(get_model(_config('small'))))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    assert fake_whisper.started.wait(5)
+    fake_whisper.release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert fake_whisper.loads == ['small']
+    assert len(results) == 4 and all(model is results[0] for model in results)
+    assert list(video_processor._MODEL_CACHE) == [('small', 'cpu', False)]
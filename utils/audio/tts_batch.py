@@ -0,0 +1,233 @@
+"""
+Batch TTS client
+Synthesizes many text segments through the GPT-SoVITS Gradio API concurrently,
+with retries and an on-disk cache keyed by text + reference audio + TTS settings.
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from utils.media_info import probe
+from utils.result_cache import media_digest
+
+# Bump when the request parameters change, so stale cache entries are not reused
+CACHE_VERSION = 1
+
+
+def load_config(config_path="config.json"):
+    """Load configuration from JSON file"""
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        print(f"Error: Config file '{config_path}' not found")
+        return None
+    except json.JSONDecodeError:
+        print(f"Error: Invalid JSON in config file '{config_path}'")
+        return None
+
+
+def synthesis_key(text, ref_digest, config):
+    """Cache key for one segment: text + reference audio content + reference text + TTS settings"""
+    payload = json.dumps({
+        'version': CACHE_VERSION,
+        'text': text,
+        'ref_audio': ref_digest,
+        'ref_text': config["reference_audio"]["text"],
+        'ref_language': config["reference_audio"]["language"],
+        'settings': config["tts_settings"],
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def predict_kwargs(text, config, ref_audio):
+    """Arguments for the /get_tts_wav endpoint"""
+    settings = config["tts_settings"]
+    return dict(
+        ref_wav_path=ref_audio,
+        prompt_text=config["reference_audio"]["text"],
+        prompt_language=config["reference_audio"]["language"],
+        text=text,
+        text_language=settings["text_language"],
+        how_to_cut=settings["how_to_cut"],
+        top_k=settings["top_k"],
+        top_p=settings["top_p"],
+        temperature=settings["temperature"],
+        ref_free=settings["ref_free"],
+        speed=settings["speed"],
+        if_freeze=settings["if_freeze"],
+        inp_refs=None,
+        sample_steps=settings["sample_steps"],
+        if_sr=settings["if_sr"],
+        pause_second=settings["pause_second"],
+        api_name="/get_tts_wav"
+    )
+
+
+def _default_client_factory(api_url):
+    from gradio_client import Client
+    return Client(api_url)
+
+
+def _reference_file(ref_audio_path):
+    from gradio_client import handle_file
+    return handle_file(ref_audio_path)
+
+
+def synthesize_batch(texts, config, cache_dir="cache/tts", workers=4, retries=3, backoff=1.0,
+                     client_factory=None, reference_factory=None):
+    """
+    Synthesize a list of text segments, returning one WAV path per segment in input order.
+
+    Segments already in the cache are not sent again; identical texts are synthesized once.
+    Up to `workers` requests run at the same time, each thread holding its own client.
+    A failed request is retried `retries` times with exponential backoff; if a segment
+    still fails the whole batch raises, after the other segments have been cached.
+
+    Args:
+        texts: list of text segments
+        config: same structure as config.json of tts_api_example.py
+        cache_dir: directory holding <key>.wav files
+        client_factory: callable(api_url) -> object with .predict(**kwargs); defaults to gradio_client.Client
+        reference_factory: callable(path) -> value passed as ref_wav_path; defaults to gradio_client.handle_file
+    """
+    client_factory = client_factory or _default_client_factory
+    reference_factory = reference_factory or _reference_file
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    ref_audio_path = config["reference_audio"]["file_path"]
+    if not os.path.exists(ref_audio_path):
+        raise FileNotFoundError(f"Reference audio file not found at {ref_audio_path}")
+    ref_digest = media_digest(ref_audio_path, cache_dir)
+
+    outputs = [cache_dir / f"{synthesis_key(text, ref_digest, config)}.wav" for text in texts]
+    missing = {}
+    for text, output in zip(texts, outputs):
+        if not output.exists() and output not in missing:
+            missing[output] = text
+    print(f"TTS: {len(texts)} segments, {len(set(outputs)) - len(missing)} unique cached, "
+          f"{len(missing)} to synthesize")
+
+    local = threading.local()
+
+    def synthesize(text, output):
+        for attempt in range(retries + 1):
+            try:
+                if not hasattr(local, 'client'):
+                    local.client = client_factory(config["api_url"])
+                result = local.client.predict(**predict_kwargs(text, config, reference_factory(ref_audio_path)))
+                # Copy to a temp name first so an interrupted run never leaves a partial cache entry
+                tmp_path = output.with_name(f"{output.stem}.{os.getpid()}.{threading.get_ident()}.tmp.wav")
+                shutil.copyfile(result, tmp_path)
+                os.replace(tmp_path, output)
+                return output
+            except Exception as e:
+                if attempt == retries:
+                    raise RuntimeError(f"TTS failed after {retries + 1} attempts for {text!r}: {e}") from e
+                delay = backoff * (2 ** attempt)
+                print(f"TTS request failed ({e}), retrying in {delay:.1f}s")
+                # The connection may be broken; reconnect on the next attempt
+                local.__dict__.pop('client', None)
+                time.sleep(delay)
+
+    if missing:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = [pool.submit(synthesize, text, output) for output, text in missing.items()]
+            errors = []
+            for future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    errors.append(e)
+            if errors:
+                raise errors[0]
+    return [str(path) for path in outputs]
+
+
+def _audio_format(audio_path):
+    """Sample rate, channel count, channel layout and codec of the first audio stream"""
+    info = probe(audio_path)
+    audio = info.audio if info else None
+    if audio is None or not audio.sample_rate or not audio.channels:
+        raise ValueError(f"Cannot read the audio format of {audio_path}")
+    layout = audio.channel_layout or ('mono' if audio.channels == 1 else f"{audio.channels}c")
+    return audio.sample_rate, audio.channels, layout, audio.codec_name
+
+
+def concat_audio(audio_paths, output_path, pause_seconds=0.0, sample_rate=None):
+    """Concatenate segment audio in order with ffmpeg, optionally inserting silence between segments
+
+    The silence is generated in the first segment's sample rate, channel layout and codec, so the
+    concat demuxer sees one format throughout. sample_rate resamples the output; None keeps the
+    segments' own rate.
+    """
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    clip_rate, channels, layout, codec = _audio_format(audio_paths[0])
+    with tempfile.TemporaryDirectory(prefix="tts_concat_") as work_dir:
+        entries = []
+        if pause_seconds > 0:
+            silence = os.path.join(work_dir, "silence" + Path(audio_paths[0]).suffix)
+            subprocess.run(['ffmpeg', '-y', '-v', 'error', '-f', 'lavfi',
+                            '-i', f"anullsrc=r={clip_rate}:cl={layout}", '-t', f"{pause_seconds:.3f}",
+                            '-c:a', codec, silence], check=True)
+        for i, path in enumerate(audio_paths):
+            if i and pause_seconds > 0:
+                entries.append(silence)
+            entries.append(os.path.abspath(path))
+        list_path = os.path.join(work_dir, "list.txt")
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for path in entries:
+                escaped = path.replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        # The concat demuxer expects every segment in the same format (one TTS server, one set of settings)
+        subprocess.run(['ffmpeg', '-y', '-v', 'error', '-f', 'concat', '-safe', '0', '-i', list_path,
+                        '-ar', str(sample_rate or clip_rate), '-ac', str(channels), str(output_path)],
+                       check=True)
+    return output_path
+
+
+def synthesize_to_file(texts, config, output_path, pause_seconds=0.0, **kwargs):
+    """Synthesize all segments and write them, in order, to a single audio file"""
+    paths = synthesize_batch(texts, config, **kwargs)
+    return concat_audio(paths, output_path, pause_seconds)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Batch TTS: one text segment per line")
+    parser.add_argument('input', help="text file, one segment per line")
+    parser.add_argument('output', help="output audio file")
+    parser.add_argument('--config', default="config.json")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--retries', type=int, default=3)
+    parser.add_argument('--cache-dir', default="cache/tts")
+    parser.add_argument('--pause', type=float, default=0.0, help="seconds of silence between segments")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    if not config:
+        return
+    with open(args.input, 'r', encoding='utf-8') as f:
+        texts = [line.strip() for line in f if line.strip()]
+    if not texts:
+        print("No text provided, exiting.")
+        return
+
+    start = time.perf_counter()
+    synthesize_to_file(texts, config, args.output, args.pause, cache_dir=args.cache_dir,
+                       workers=args.workers, retries=args.retries)
+    print(f"Synthesized {len(texts)} segments in {time.perf_counter() - start:.2f}s: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""音频底轨构建
+用ffmpeg流式滤镜完成多音轨的循环、截取、音量调整、混音和淡入淡出，
+不在Python中加载或重采样音频。
+
+"""
+import os
+import tempfile
+from utils.telemetry import run_ffmpeg
+
+
+def audio_bed_inputs(audio_files):
+    """音频输入参数：每个音轨无限循环输入（流式读取，不把整段音频放进内存）"""
+    input_args = []
+    for audio_path in audio_files:
+        input_args += ['-stream_loop', '-1', '-i', str(audio_path)]
+    return input_args
+
+
+def audio_bed_filter(track_count, duration, first_input=0, gains=None, fade_in=0.0, fade_out=0.0,
+                     output_label="a", label_prefix="bed"):
+    """构造音频底轨滤镜，输出标签为 [output_label]
+
+    Args:
+        track_count: 音轨数量
+        duration: 底轨时长（秒），每个音轨循环后截取到该长度
+        first_input: 第一个音轨在ffmpeg输入中的序号
+        gains: 每个音轨的增益（dB），缺省为0
+        fade_in: 混音后淡入时长（秒）
+        fade_out: 混音后淡出时长（秒）
+        label_prefix: 中间标签前缀，同一滤镜图中有多个底轨时需各不相同
+    """
+    gains = list(gains or [])
+    chains = []
+    labels = []
+    for i in range(track_count):
+        gain = gains[i] if i < len(gains) else 0
+        label = f"{label_prefix}{i}"
+        chains.append(f"[{first_input + i}:a]atrim=0:{duration:.6f},asetpts=N/SR/TB,"
+                      f"volume={gain}dB[{label}]")
+        labels.append(f"[{label}]")
+
+    # 与CompositeAudioClip一致，各音轨直接叠加，不做音量归一化
+    mix = f"{''.join(labels)}amix=inputs={track_count}:duration=longest:normalize=0"
+    if fade_in > 0:
+        mix += f",afade=t=in:st=0:d={fade_in:.3f}"
+    if fade_out > 0:
+        mix += f",afade=t=out:st={max(0.0, duration - fade_out):.3f}:d={fade_out:.3f}"
+    chains.append(f"{mix}[{output_label}]")
+    return ';'.join(chains)
+
+
+def build_audio_bed(audio_files, duration, output_path=None, gains=None, fade_in=0.0, fade_out=0.0,
+                    tmp_dir=None):
+    """把多个音轨渲染成一个底轨文件，返回输出路径
+
+    output_path 为空时在 tmp_dir 中创建唯一的临时文件，多个任务并发运行也不会冲突，
+    由调用方负责删除。
+    """
+    if output_path is None:
+        fd, output_path = tempfile.mkstemp(prefix="audio_bed_", suffix=".m4a", dir=tmp_dir)
+        os.close(fd)
+    run_ffmpeg(['ffmpeg', '-y', '-v', 'error'] + audio_bed_inputs(audio_files) + [
+        '-filter_complex', audio_bed_filter(len(audio_files), duration, 0, gains, fade_in, fade_out),
+        '-map', '[a]', '-t', f"{duration:.6f}",
+        '-c:a', 'aac',
+        str(output_path)
+    ], 'render', duration=duration, output=str(output_path))
+    return output_path
@@ -0,0 +1,229 @@
+"""单次编码合成
+把最终成品的声明式描述（片头/正片等视频片段、图片幻灯片、各段音频和背景音、字幕）
+编译成一个ffmpeg滤镜图，一次解码、一次编码得到成品。
+
+原来的做法是先渲染幻灯片、再拼接片头、最后烧录字幕，同一批画面经过三次有损编码；
+合成器中缩放补边、帧率统一、拼接、字幕和混音都在同一个滤镜图里完成，只编码一次。
+
+描述格式见 config/compose.yaml。
+"""
+import os
+import shutil
+import tempfile
+import yaml
+from utils.audio_bed import audio_bed_filter, audio_bed_inputs
+from utils.encoder_profiles import audio_args, container_args, video_args
+from utils.images_to_video import (
+    build_slideshow_filter,
+    frame_boundaries,
+    get_audio_files,
+    get_sorted_images,
+    get_target_resolution,
+    prepare_image_inputs,
+    write_image_concat_list,
+)
+from utils.media_info import probe_many
+from utils.telemetry import run_ffmpeg
+
+# 各段音频统一的采样格式，concat 滤镜要求所有分段的音频参数一致
+AUDIO_FORMAT = "aresample=48000,aformat=sample_fmts=fltp:channel_layouts=stereo"
+
+
+def load_config(config_path='config/compose.yaml'):
+    """加载合成描述"""
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f)
+    except Exception as e:
+        print(f"加载配置文件失败: {str(e)}")
+        return None
+
+
+def _bed_files(spec):
+    """音频描述中实际使用的音频文件"""
+    if not spec or not spec.get('audio_dir'):
+        return []
+    return get_audio_files(spec['audio_dir'])[:spec.get('audio_count', 1)]
+
+
+def resolve_sections(spec, fps):
+    """读取各段的素材和时长
+
+    Returns:
+        list: 每段一个字典，包含 type / duration，片段另有 path / has_audio，
+              幻灯片另有 images / frame_counts / audio_files / spec
+    """
+    sections = []
+    for item in spec.get('sections') or []:
+        kind = item.get('type')
+        if kind == 'clip':
+            sections.append({'type': 'clip', 'path': item['path'], 'spec': item})
+        elif kind == 'slideshow':
+            image_files = get_sorted_images(item.get('images_dir', 'input_images'))
+            if not image_files:
+                raise ValueError(f"在 {item.get('images_dir')} 中没有找到图片文件")
+            bounds = frame_boundaries(len(image_files), item.get('duration_per_image', 3.0), fps)
+            sections.append({
+                'type': 'slideshow',
+                'images': image_files,
+                'frame_counts': [bounds[i + 1] - bounds[i] for i in range(len(image_files))],
+                'duration': bounds[-1] / fps,
+                'audio_files': _bed_files(item),
+                'spec': item,
+            })
+        else:
+            raise ValueError(f"未知的分段类型: {kind}，可选: clip/slideshow")
+    if not sections:
+        raise ValueError("合成描述中没有任何分段")
+
+    clips = [section for section in sections if section['type'] == 'clip']
+    for section, info in zip(clips, probe_many([section['path'] for section in clips])):
+        if info is None or info.video is None:
+            raise ValueError(f"无法读取视频片段: {section['path']}")
+        section['info'] = info
+        section['duration'] = info.video.duration or info.duration
+        section['has_audio'] = info.audio is not None
+    return sections
+
+
+def output_resolution(spec, sections):
+    """输出分辨率：描述中指定，否则取第一个视频片段的分辨率，再否则取幻灯片图片的最大宽高"""
+    if spec.get('resolution'):
+        return tuple(int(v) for v in spec['resolution'])
+    for section in sections:
+        if section['type'] == 'clip':
+            video = section['info'].video
+            return video.width + video.width % 2, video.height + video.height % 2
+    return get_target_resolution(sections[0]['images'])
+
+
+def shift_subtitle(subtitle_path, offset, output_path):
+    """把字幕整体后移 offset 秒（如字幕按正片计时而前面接了片头），移出开头的条目被丢弃"""
+    from utils.srt import read_srt, write_srt
+    shift = round(offset * 1000)
+    cues = [(max(0, start + shift), end + shift, text)
+            for start, end, text in read_srt(subtitle_path) if end + shift > 0]
+    write_srt(cues, output_path)
+    return output_path
+
+
+def build_compose_command(spec, work_dir):
+    """把合成描述编译成一条ffmpeg命令
+
+    Returns:
+        (命令, 输出时长秒)
+    """
+    fps = spec.get('fps', 24)
+    profile = spec.get('profile')
+    sections = resolve_sections(spec, fps)
+    width, height = output_resolution(spec, sections)
+    scale = build_slideshow_filter(width, height, fps)
+
+    inputs = []
+    filters = []
+    labels = []
+    input_index = 0
+    for i, section in enumerate(sections):
+        duration = section['duration']
+        if section['type'] == 'clip':
+            inputs += ['-i', section['path']]
+            filters.append(f"[{input_index}:v]{scale},trim=duration={duration:.6f},setpts=PTS-STARTPTS[v{i}]")
+            if section['has_audio']:
+                filters.append(f"[{input_index}:a]{AUDIO_FORMAT},asetpts=PTS-STARTPTS,"
+                               f"apad,atrim=0:{duration:.6f}[a{i}]")
+            else:
+                filters.append(f"anullsrc=r=48000:cl=stereo,{AUDIO_FORMAT},atrim=0:{duration:.6f}[a{i}]")
+            input_index += 1
+        else:
+            item = section['spec']
+            image_files, _ = prepare_image_inputs(section['images'], (width, height), item.get('image_cache_dir'))
+            list_path = os.path.join(work_dir, f"images_{i}.txt")
+            write_image_concat_list(image_files, [n / fps for n in section['frame_counts']], list_path)
+            inputs += ['-f', 'concat', '-safe', '0', '-i', list_path]
+            filters.append(f"[{input_index}:v]{scale},trim=duration={duration:.6f},setpts=PTS-STARTPTS[v{i}]")
+            input_index += 1
+            if section['audio_files']:
+                inputs += audio_bed_inputs(section['audio_files'])
+                filters.append(audio_bed_filter(len(section['audio_files']), duration, input_index,
+                                                item.get('audio_gains'), item.get('audio_fade_in', 0.0),
+                                                item.get('audio_fade_out', 0.0),
+                                                output_label=f"bed{i}", label_prefix=f"s{i}bed"))
+                filters.append(f"[bed{i}]{AUDIO_FORMAT},apad,atrim=0:{duration:.6f}[a{i}]")
+                input_index += len(section['audio_files'])
+            else:
+                filters.append(f"anullsrc=r=48000:cl=stereo,{AUDIO_FORMAT},atrim=0:{duration:.6f}[a{i}]")
+        labels.append(f"[v{i}][a{i}]")
+
+    total = sum(section['duration'] for section in sections)
+    filters.append(f"{''.join(labels)}concat=n={len(sections)}:v=1:a=1[vcat][acat]")
+
+    video_label = "[vcat]"
+    subtitle = spec.get('subtitle') or {}
+    if subtitle.get('path'):
+        from utils.merge_subtitle import subtitle_filter
+        subtitle_path = subtitle['path']
+        if subtitle.get('offset'):
+            subtitle_path = shift_subtitle(subtitle_path, subtitle['offset'], os.path.join(work_dir, "subtitle.srt"))
+        filters.append(f"[vcat]{subtitle_filter(subtitle_path)}[vout]")
+        video_label = "[vout]"
+
+    audio_label = "[acat]"
+    background = spec.get('audio') or {}
+    background_files = _bed_files(background)
+    if background_files:
+        inputs += audio_bed_inputs(background_files)
+        filters.append(audio_bed_filter(len(background_files), total, input_index, background.get('audio_gains'),
+                                        background.get('audio_fade_in', 0.0), background.get('audio_fade_out', 0.0),
+                                        output_label="background", label_prefix="bg"))
+        filters.append(f"[background]{AUDIO_FORMAT}[bgfmt];"
+                       f"[acat][bgfmt]amix=inputs=2:duration=first:normalize=0[aout]")
+        audio_label = "[aout]"
+
+    cmd = ['ffmpeg', '-y'] + inputs + [
+        '-filter_complex', ';'.join(filters),
+        '-map', video_label, '-map', audio_label,
+        # setpts 之后滤镜图不再携带帧率，需在输出端指定，否则按默认的25帧封装
+        '-r', str(fps), '-t', f"{total:.6f}"
+    ] + video_args(profile) + audio_args(profile) + container_args(profile) + [spec['output']]
+    return cmd, total
+
+
+def compose(spec, dry_run=False):
+    """按合成描述渲染成品，dry_run 时只打印编译出的滤镜图，返回输出时长（秒）"""
+    output_path = spec.get('output', 'output/composed.mp4')
+    spec = dict(spec, output=output_path)
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    work_dir = tempfile.mkdtemp(prefix="compose_")
+    try:
+        cmd, total = build_compose_command(spec, work_dir)
+        print(f"合成 {len(spec['sections'])} 段，输出时长: {total:.2f} 秒")
+        if dry_run:
+            print(cmd[cmd.index('-filter_complex') + 1].replace(';', ';\n'))
+            return total
+        print(f"\n正在输出视频到: {output_path}")
+        run_ffmpeg(cmd, 'render', duration=total, output=output_path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    print(f"\n✅ 合成完成: {output_path}")
+    return total
+
+
+def begin_compose(config_path='config/compose.yaml', dry_run=False):
+    """按配置文件合成成品"""
+    spec = load_config(config_path)
+    if not spec:
+        return
+    try:
+        compose(spec, dry_run)
+    except Exception as e:
+        print(f"❌ 合成失败: {e}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="按声明式描述一次编码合成成品")
+    parser.add_argument('config', nargs='?', default='config/compose.yaml', help="合成描述（YAML）")
+    parser.add_argument('--dry-run', action='store_true', help="只打印编译出的滤镜图")
+    args = parser.parse_args()
+    begin_compose(args.config, args.dry_run)
@@ -0,0 +1,89 @@
+"""编码配置（encoder profiles）
+所有模块的视频/音频编码参数都在这里按名称定义一次，各模块只引用配置名：
+- draft: 草稿预览，ultrafast + 较高CRF，编码最快
+- delivery: 最终成品，CRF恒定质量 + faststart
+- intermediate: 阶段之间传递的中间产物，全帧内（每帧关键帧）无损编码，
+  编码快、可在任意帧精确切分，下一阶段重新编码时没有二次压缩损失
+
+中间产物体积较大，只应用在会被下一阶段重新编码的输出上（如流水线中先烧录字幕、再拼接片头片尾）。
+"""
+
+ENCODER_PROFILES = {
+    'draft': {
+        'codec': 'libx264', 'preset': 'ultrafast', 'quality': ['-crf', '28'],
+        'keyframe_interval': None, 'lossless': False,
+        'audio_codec': 'aac', 'audio_bitrate': '96k', 'faststart': False,
+    },
+    'delivery': {
+        'codec': 'libx264', 'preset': 'medium', 'quality': ['-crf', '20'],
+        'keyframe_interval': None, 'lossless': False,
+        'audio_codec': 'aac', 'audio_bitrate': '192k', 'faststart': True,
+    },
+    'intermediate': {
+        'codec': 'libx264', 'preset': 'ultrafast', 'quality': ['-qp', '0'],
+        'keyframe_interval': 1, 'lossless': True,
+        'audio_codec': 'alac', 'audio_bitrate': None, 'faststart': False,
+    },
+}
+DEFAULT_PROFILE = 'delivery'
+INTERMEDIATE_PROFILE = 'intermediate'
+
+
+def get_profile(name=None):
+    """按名称获取编码配置，None为默认的 delivery"""
+    name = name or DEFAULT_PROFILE
+    if name not in ENCODER_PROFILES:
+        raise ValueError(f"未知的编码配置: {name}，可选: {', '.join(ENCODER_PROFILES)}")
+    return ENCODER_PROFILES[name]
+
+
+def video_args(name=None, pix_fmt='yuv420p', threads=None, keyframe_interval=None):
+    """视频编码参数
+
+    keyframe_interval 为调用方需要的关键帧间隔（帧），配置本身要求全帧内时以配置为准。
+    """
+    profile = get_profile(name)
+    args = ['-c:v', profile['codec'], '-preset', profile['preset']] + profile['quality']
+    interval = profile['keyframe_interval'] or keyframe_interval
+    if interval:
+        args += ['-g', str(interval)]
+    if pix_fmt:
+        args += ['-pix_fmt', pix_fmt]
+    if threads:
+        args += ['-threads', str(threads)]
+    return args
+
+
+def audio_args(name=None):
+    """音频编码参数"""
+    profile = get_profile(name)
+    args = ['-c:a', profile['audio_codec']]
+    if profile['audio_bitrate']:
+        args += ['-b:a', profile['audio_bitrate']]
+    return args
+
+
+def container_args(name=None):
+    """封装参数：成品把moov移到文件头，便于边下边播"""
+    return ['-movflags', '+faststart'] if get_profile(name)['faststart'] else []
+
+
+def is_lossless(name=None):
+    """无损配置不能指定 -profile:v high 等不支持无损的H.264档次"""
+    return get_profile(name)['lossless']
+
+
+def moviepy_args(name=None):
+    """MoviePy write_videofile 的编码参数"""
+    profile = get_profile(name)
+    ffmpeg_params = list(profile['quality'])
+    if profile['keyframe_interval']:
+        ffmpeg_params += ['-g', str(profile['keyframe_interval'])]
+    ffmpeg_params += container_args(name)
+    return {
+        'codec': profile['codec'],
+        'preset': profile['preset'],
+        'audio_codec': profile['audio_codec'],
+        'audio_bitrate': profile['audio_bitrate'],
+        'ffmpeg_params': ffmpeg_params,
+    }
@@ -0,0 +1,62 @@
+"""图片预处理缓存
+把每张图片统一缩放、居中补边到目标分辨率并转换像素格式，结果按
+图片内容哈希 + 目标尺寸 存在磁盘上；重复渲染或修改与图片无关的配置时直接复用，
+不再解码原始的大图。
+
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from utils.result_cache import media_digests
+from utils.telemetry import run_ffmpeg
+
+# 预处理结果的像素格式，改动处理方式时同时修改版本号，使旧缓存失效
+PIX_FMT = "rgb24"
+CACHE_VERSION = 1
+# 未配置缓存目录时使用的默认目录：concat demuxer要求所有图片格式一致，图片总要先统一
+DEFAULT_CACHE_DIR = "cache/images"
+
+
+def cached_image_name(digest, width, height):
+    """预处理结果的缓存文件名"""
+    return f"{digest}_{width}x{height}_{PIX_FMT}_v{CACHE_VERSION}.png"
+
+
+def normalize_image(image_path, output_path, width, height):
+    """缩放并居中补边到目标分辨率（先写临时文件再改名，避免留下不完整的缓存）"""
+    output_path = Path(output_path)
+    tmp_path = output_path.with_name(f"{output_path.stem}.{os.getpid()}.tmp.png")
+    run_ffmpeg([
+        'ffmpeg', '-y', '-v', 'error', '-i', str(image_path),
+        '-vf', (f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+                f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,format={PIX_FMT}"),
+        '-frames:v', '1', str(tmp_path)
+    ], 'render', input=str(image_path), output=str(output_path))
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+def prepare_images(image_files, width, height, cache_dir, workers=0):
+    """返回与 image_files 一一对应的预处理后图片路径
+
+    未命中缓存的图片用多个ffmpeg进程并行处理，workers 为0时按CPU核数。
+    """
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    digests = media_digests(image_files, cache_dir)
+    outputs = [cache_dir / cached_image_name(digest, width, height) for digest in digests]
+
+    # 内容相同的图片只处理一次
+    missing = {}
+    for image_path, output_path in zip(image_files, outputs):
+        if not output_path.exists() and output_path not in missing:
+            missing[output_path] = image_path
+
+    print(f"图片预处理缓存命中 {len(image_files) - len(missing)} 张，需处理 {len(missing)} 张")
+    if missing:
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+            futures = [pool.submit(normalize_image, image_path, output_path, width, height)
+                       for output_path, image_path in missing.items()]
+            for future in futures:
+                future.result()
+    return [str(path) for path in outputs]
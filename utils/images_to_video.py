@@ -6,15 +6,16 @@
 
 import os
 import glob
-from moviepy.editor import (
-    ImageSequenceClip, 
-    AudioFileClip, 
-    CompositeVideoClip,
-    CompositeAudioClip,
-    concatenate_audioclips,
-    concatenate_videoclips
-)
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 import yaml
+from utils.audio_bed import audio_bed_filter, audio_bed_inputs, build_audio_bed
+from utils.encoder_profiles import audio_args, container_args, moviepy_args, video_args
+from utils.image_cache import DEFAULT_CACHE_DIR, prepare_images
+from utils.media_info import probe
+from utils.telemetry import run_ffmpeg
+from utils.video_concat import write_concat_list
 
 
 def load_config():
@@ -54,10 +55,16 @@ def create_video_with_dual_audio(images_dir="input_images",
                                 output_path="output/combined_video.mp4",
                                 duration_per_image=2.0,
                                 fps=24,
-                                audio_count=1
+                                audio_count=1,
+                                audio_gains=None,
+                                audio_fade_in=0.0,
+                                audio_fade_out=0.0,
+                                resolution=None,
+                                image_cache_dir=None,
+                                profile=None
                                 ):
     """
-    创建带双音轨的视频
+    创建带双音轨的视频（MoviePy逐帧合成）
     
     Args:
         images_dir: 图片目录
@@ -65,7 +72,20 @@ def create_video_with_dual_audio(images_dir="input_images",
         output_path: 输出视频路径
         duration_per_image: 每张图片显示时长（秒）
         fps: 视频帧率
+        audio_count: 使用的音轨数量
+        audio_gains: 每个音轨的增益（dB）
+        audio_fade_in: 音频淡入时长（秒）
+        audio_fade_out: 音频淡出时长（秒）
+        resolution: 输出分辨率 [宽, 高]，缺省为所有图片的最大宽高
+        image_cache_dir: 图片预处理缓存目录，设置后先把图片统一到输出分辨率
+        profile: 编码配置名（见 utils.encoder_profiles），缺省为 delivery
     """
+    # MoviePy只在使用该引擎时才需要
+    from moviepy.editor import (
+        ImageSequenceClip,
+        AudioFileClip,
+        concatenate_videoclips
+    )
     
     # 确保输出目录存在
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
@@ -78,6 +98,7 @@ def create_video_with_dual_audio(images_dir="input_images",
     print(f"找到 {len(image_files)} 张图片:")
     for img in image_files:
         print(f"  - {os.path.basename(img)}")
+    image_files, _ = prepare_image_inputs(image_files, resolution, image_cache_dir)
     
     # 获取音频文件
     audio_files = get_audio_files(audio_dir)
@@ -103,54 +124,334 @@ def create_video_with_dual_audio(images_dir="input_images",
     
     print(f"视频时长: {video_duration} 秒")
     
-    # 处理音频轨道
-    print("\n正在处理音频轨道...")
-    audio_clips = []
-
-    for audio_path in audio_files[:audio_count]:  # 只使用前audio_count个音频文件
-        audio = AudioFileClip(audio_path)
+    # 处理音频轨道：循环/截取/混音由ffmpeg流式完成，只前audio_count个音频文件参与混音
+    print("\n正在生成音频底轨...")
+    used_audio_files = audio_files[:audio_count]
+    work_dir = tempfile.mkdtemp(prefix="moviepy_")
+    try:
+        bed_path = build_audio_bed(used_audio_files, video_duration,
+                                   os.path.join(work_dir, "audio_bed.m4a"),
+                                   audio_gains, audio_fade_in, audio_fade_out)
+        mixed_audio = AudioFileClip(bed_path)
         
-        # 如果音频比视频长，截取到视频长度
-        if audio.duration > video_duration:
-            audio = audio.subclip(0, video_duration)
-        # 如果音频比视频短，循环播放
-        elif audio.duration < video_duration:
-            loops_needed = int(video_duration / audio.duration) + 1
-            audio = concatenate_audioclips([audio] * loops_needed).subclip(0, video_duration)
+        # 将音频添加到视频
+        final_video = video_clip.set_audio(mixed_audio)
         
-        audio_clips.append(audio)
-        print(f"  - {os.path.basename(audio_path)}: {audio.duration:.2f}s")
-    
-    # 混合两个音轨
-    print("\n正在混合音轨...")
-    mixed_audio = CompositeAudioClip(audio_clips)
-    
-    # 将音频添加到视频
-    final_video = video_clip.set_audio(mixed_audio)
-    
-    # 输出视频
-    print(f"\n正在输出视频到: {output_path}")
-    final_video.write_videofile(
-        output_path,
-        fps=fps,
-        audio_codec='aac',
-        codec='libx264',
-        temp_audiofile='temp-audio.m4a',
-        remove_temp=True
-    )
-    
-    # 清理资源
-    video_clip.close()
-    mixed_audio.close()
-    for clip in clips:
-        clip.close()
-    for audio in audio_clips:
-        audio.close()
+        # 输出视频（临时音频文件放在本任务独立的临时目录中，并发运行互不冲突）
+        print(f"\n正在输出视频到: {output_path}")
+        final_video.write_videofile(
+            output_path,
+            fps=fps,
+            **moviepy_args(profile),
+            temp_audiofile=os.path.join(work_dir, "temp-audio.m4a"),
+            remove_temp=True
+        )
+        
+        # 清理资源
+        video_clip.close()
+        mixed_audio.close()
+        for clip in clips:
+            clip.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
     
     print(f"\n✅ 视频创建完成: {output_path}")
     print(f"   - 图片数量: {len(image_files)}")
     print(f"   - 视频时长: {video_duration:.2f}秒")
-    print(f"   - 音轨数量: {len(audio_clips)}")
+    print(f"   - 音轨数量: {len(used_audio_files)}")
+
+
+def get_image_size(image_path):
+    """读取图片尺寸（只解析文件头，不解码像素）"""
+    from PIL import Image
+    with Image.open(image_path) as img:
+        return img.size
+
+
+def get_target_resolution(image_files):
+    """计算输出分辨率：与MoviePy compose方式一致取所有图片的最大宽高（取偶数，满足yuv420p要求）"""
+    sizes = [get_image_size(path) for path in image_files]
+    width = max(w for w, _ in sizes)
+    height = max(h for _, h in sizes)
+    return width + width % 2, height + height % 2
+
+
+def _escape_concat_path(path):
+    """转义concat列表中的文件路径"""
+    return os.path.abspath(path).replace("\\", "/").replace("'", "'\\''")
+
+
+def write_image_concat_list(image_files, durations, list_path):
+    """生成ffmpeg concat demuxer的图片列表，每张图片带显示时长"""
+    with open(list_path, 'w', encoding='utf-8') as f:
+        f.write("ffconcat version 1.0\n")
+        for img_path, duration in zip(image_files, durations):
+            f.write(f"file '{_escape_concat_path(img_path)}'\n")
+            f.write(f"duration {duration:.6f}\n")
+        # concat demuxer会忽略最后一项的duration，需要再写一次最后一张图片
+        f.write(f"file '{_escape_concat_path(image_files[-1])}'\n")
+
+
+def build_slideshow_filter(width, height, fps):
+    """图片统一缩放并居中补边到目标分辨率，再转换为恒定帧率"""
+    return (f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={fps},format=yuv420p")
+
+
+def prepare_image_inputs(image_files, resolution=None, image_cache_dir=None):
+    """确定输出分辨率，把图片统一为相同格式和尺寸，返回 (预处理后的图片列表, (宽, 高))
+
+    concat demuxer按第一张图片选择解码器，PNG和JPG混用时后面的图片无法解码、
+    输出只剩音轨，因此图片总是先经过预处理缓存（未配置目录时使用默认目录）。
+    """
+    if resolution:
+        width, height = (int(v) for v in resolution)
+    else:
+        width, height = get_target_resolution(image_files)
+    image_files = prepare_images(image_files, width, height, image_cache_dir or DEFAULT_CACHE_DIR)
+    return image_files, (width, height)
+
+
+def check_video_output(output_path, duration=None, tolerance=0.5):
+    """确认输出文件包含视频流且时长符合预期
+
+    ffmpeg在部分输入解码失败时仍可能以0退出，输出只剩音轨或只有开头几帧。
+    """
+    info = probe(output_path, cache_path=None)
+    if info is None or info.video is None:
+        raise RuntimeError(f"输出文件没有视频流: {output_path}")
+    if duration is not None and info.video.duration is not None and \
+            abs(info.video.duration - duration) > tolerance:
+        raise RuntimeError(f"输出视频流时长 {info.video.duration:.2f} 秒，预期 {duration:.2f} 秒: {output_path}")
+    return info
+
+
+def collect_inputs(images_dir, audio_dir, audio_count):
+    """获取并校验图片和音频文件，返回 (图片列表, 使用的音频列表)"""
+    image_files = get_sorted_images(images_dir)
+    if not image_files:
+        raise ValueError(f"在 {images_dir} 中没有找到图片文件")
+    print(f"找到 {len(image_files)} 张图片")
+
+    audio_files = get_audio_files(audio_dir)
+    if len(audio_files) < 1:
+        raise ValueError(f"需要至少1个音频文件，但在 {audio_dir} 中只找到 {len(audio_files)} 个")
+    audio_files = audio_files[:audio_count]
+    print(f"使用 {len(audio_files)} 个音频文件:")
+    for audio in audio_files:
+        print(f"  - {os.path.basename(audio)}")
+    return image_files, audio_files
+
+
+def create_video_with_ffmpeg(images_dir="input_images",
+                             audio_dir="input_audio",
+                             output_path="output/combined_video.mp4",
+                             duration_per_image=2.0,
+                             fps=24,
+                             audio_count=1,
+                             audio_gains=None,
+                             audio_fade_in=0.0,
+                             audio_fade_out=0.0,
+                             resolution=None,
+                             image_cache_dir=None,
+                             profile=None
+                             ):
+    """
+    创建带多音轨混音的视频（ffmpeg一次调用完成）
+
+    参数与 create_video_with_dual_audio 相同。静态图片通过concat demuxer按时长排列，
+    缩放/补边/帧率转换都在ffmpeg滤镜图中完成，不再逐帧经过Python。
+    """
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    image_files, audio_files = collect_inputs(images_dir, audio_dir, audio_count)
+
+    video_duration = len(image_files) * duration_per_image
+    image_files, (width, height) = prepare_image_inputs(image_files, resolution, image_cache_dir)
+    print(f"视频时长: {video_duration} 秒，分辨率: {width}x{height}")
+
+    work_dir = tempfile.mkdtemp(prefix="slideshow_")
+    try:
+        list_path = os.path.join(work_dir, "images.txt")
+        write_image_concat_list(image_files, [duration_per_image] * len(image_files), list_path)
+
+        audio_filter = audio_bed_filter(len(audio_files), video_duration, 1,
+                                        audio_gains, audio_fade_in, audio_fade_out)
+        cmd = ['ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', list_path] + audio_bed_inputs(audio_files) + [
+            '-filter_complex', f"[0:v]{build_slideshow_filter(width, height, fps)}[v];{audio_filter}",
+            '-map', '[v]', '-map', '[a]',
+            '-t', f"{video_duration:.6f}"
+        ] + video_args(profile) + audio_args(profile) + container_args(profile) + [output_path]
+        print(f"\n正在输出视频到: {output_path}")
+        run_ffmpeg(cmd, 'render', duration=video_duration, output=output_path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    check_video_output(output_path, video_duration)
+
+    print(f"\n✅ 视频创建完成: {output_path}")
+    print(f"   - 图片数量: {len(image_files)}")
+    print(f"   - 视频时长: {video_duration:.2f}秒")
+    print(f"   - 音轨数量: {len(audio_files)}")
+
+
+# 分段编码使用统一的时间基，保证各分段可以直接拼接
+SEGMENT_TIMESCALE = 90000
+
+
+def frame_boundaries(count, duration_per_image, fps):
+    """每张图片的起始帧号（共 count + 1 个），各分段按整帧对齐"""
+    return [round(i * duration_per_image * fps) for i in range(count + 1)]
+
+
+def encode_segment(image_files, frame_counts, output_path, width, height, fps, threads=0, profile=None):
+    """把一组图片编码为无音频的视频分段
+
+    所有分段使用完全相同的编码参数和封闭GOP，每段以关键帧开始，可无损拼接。
+    图片须已经过 prepare_image_inputs 统一格式；编码结果没有视频流或时长不符时抛出异常，
+    不会把空分段交给流复制拼接。
+    """
+    work_dir = tempfile.mkdtemp(prefix="segment_")
+    try:
+        list_path = os.path.join(work_dir, "images.txt")
+        write_image_concat_list(image_files, [n / fps for n in frame_counts], list_path)
+        run_ffmpeg([
+            'ffmpeg', '-y', '-v', 'error',
+            '-f', 'concat', '-safe', '0', '-i', list_path,
+            '-vf', build_slideshow_filter(width, height, fps),
+            '-frames:v', str(sum(frame_counts)), '-an'
+        ] + video_args(profile, threads=threads, keyframe_interval=fps * 2) + [
+            '-flags', '+cgop',
+            '-video_track_timescale', str(SEGMENT_TIMESCALE),
+            output_path
+        ], 'render', duration=sum(frame_counts) / fps, output=output_path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    check_video_output(output_path, sum(frame_counts) / fps)
+    return output_path
+
+
+def mux_segments(segment_paths, audio_files, output_path, video_duration,
+                 audio_gains=None, audio_fade_in=0.0, audio_fade_out=0.0, profile=None):
+    """用concat demuxer无损拼接视频分段，并一次性混入音频"""
+    work_dir = tempfile.mkdtemp(prefix="mux_")
+    try:
+        list_path = os.path.join(work_dir, "segments.txt")
+        write_concat_list(segment_paths, list_path)
+        audio_filter = audio_bed_filter(len(audio_files), video_duration, 1,
+                                        audio_gains, audio_fade_in, audio_fade_out)
+        run_ffmpeg(['ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', list_path] +
+                   audio_bed_inputs(audio_files) + [
+            '-filter_complex', audio_filter,
+            '-map', '0:v', '-map', '[a]',
+            '-t', f"{video_duration:.6f}",
+            '-c:v', 'copy'
+        ] + audio_args(profile) + container_args(profile) + [output_path], 'mux', duration=video_duration, output=output_path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def create_video_segmented(images_dir="input_images",
+                           audio_dir="input_audio",
+                           output_path="output/combined_video.mp4",
+                           duration_per_image=2.0,
+                           fps=24,
+                           audio_count=1,
+                           audio_gains=None,
+                           audio_fade_in=0.0,
+                           audio_fade_out=0.0,
+                           resolution=None,
+                           image_cache_dir=None,
+                           segments=0,
+                           workers=0,
+                           profile=None
+                           ):
+    """
+    分段并行渲染幻灯片视频
+
+    图片列表按整帧对齐切成 segments 段，各段并发编码（每段一个ffmpeg进程），
+    再用concat demuxer流复制拼接，最后一次性混入音频。
+
+    Args:
+        segments: 分段数，0为CPU核数
+        workers: 同时编码的分段数，0为与分段数相同
+        其余参数与 create_video_with_ffmpeg 相同
+    """
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    image_files, audio_files = collect_inputs(images_dir, audio_dir, audio_count)
+
+    cpu_count = os.cpu_count() or 1
+    segments = max(1, min(segments or cpu_count, len(image_files)))
+    workers = max(1, min(workers or segments, segments))
+    # 平分CPU核心给各个x264实例
+    threads = max(1, cpu_count // workers)
+
+    bounds = frame_boundaries(len(image_files), duration_per_image, fps)
+    frame_counts = [bounds[i + 1] - bounds[i] for i in range(len(image_files))]
+    video_duration = bounds[-1] / fps
+    image_files, (width, height) = prepare_image_inputs(image_files, resolution, image_cache_dir)
+    edges = [round(k * len(image_files) / segments) for k in range(segments + 1)]
+    print(f"视频时长: {video_duration} 秒，分辨率: {width}x{height}，"
+          f"分 {segments} 段并行编码（并发 {workers}）")
+
+    work_dir = tempfile.mkdtemp(prefix="segments_")
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(encode_segment, image_files[edges[k]:edges[k + 1]],
+                            frame_counts[edges[k]:edges[k + 1]],
+                            os.path.join(work_dir, f"segment_{k:04d}.mp4"),
+                            width, height, fps, threads, profile)
+                for k in range(segments)
+            ]
+            segment_paths = [future.result() for future in futures]
+
+        print(f"\n正在拼接分段并输出视频到: {output_path}")
+        mux_segments(segment_paths, audio_files, output_path, video_duration,
+                     audio_gains, audio_fade_in, audio_fade_out, profile)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    check_video_output(output_path, video_duration)
+
+    print(f"\n✅ 视频创建完成: {output_path}")
+    print(f"   - 图片数量: {len(image_files)}")
+    print(f"   - 视频时长: {video_duration:.2f}秒")
+    print(f"   - 音轨数量: {len(audio_files)}")
+
+
+def create_video_incremental(**kwargs):
+    """增量渲染：只重新编码图片发生变化的分段（见 utils.incremental_render）"""
+    from utils.incremental_render import create_video_incremental as render_incremental
+    return render_incremental(**kwargs)
+
+
+# 渲染引擎：ffmpeg 一次调用渲染静态图片；segmented 分段并行编码，适合大量图片；
+# incremental 保留分段，只重新编码变化的部分；moviepy 逐帧合成，适合需要逐帧特效的场景
+RENDER_ENGINES = {
+    'ffmpeg': create_video_with_ffmpeg,
+    'segmented': create_video_segmented,
+    'incremental': create_video_incremental,
+    'moviepy': create_video_with_dual_audio,
+}
+
+
+def render_slideshow(engine="auto", segments=0, segment_min_images=200, segment_images=20, **kwargs):
+    """按引擎名渲染幻灯片视频
+
+    auto：目前没有逐帧特效，图片数达到 segment_min_images 且有多核时使用分段并行引擎，
+    否则使用ffmpeg引擎。
+    """
+    if engine == "auto":
+        image_count = len(get_sorted_images(kwargs.get('images_dir', 'input_images')))
+        if image_count >= segment_min_images and (os.cpu_count() or 1) > 1:
+            engine = "segmented"
+        else:
+            engine = "ffmpeg"
+    if engine not in RENDER_ENGINES:
+        raise ValueError(f"未知的渲染引擎: {engine}，可选: {', '.join(RENDER_ENGINES)}")
+    if engine == "segmented":
+        kwargs['segments'] = segments
+    elif engine == "incremental":
+        kwargs['segment_images'] = segment_images
+    return RENDER_ENGINES[engine](**kwargs)
 
 
 def begin_images_to_video():
@@ -172,14 +473,47 @@ def begin_images_to_video():
         duration_per_image = output_config.get('duration_per_image', 3.0)  
         fps = output_config.get('fps', 24)
 
+        timeline_config = config.get('video', {}).get('timeline', {})
+        if timeline_config.get('enabled', False):
+            # 按旁白时长排列图片，背景音仍取自 audio_dir
+            from utils.timeline import create_video_timeline
+            create_video_timeline(
+                images_dir=images_dir,
+                output_path=output_path,
+                fps=fps,
+                narration_dir=timeline_config.get('narration_dir'),
+                subtitle_path=timeline_config.get('subtitle_path'),
+                narration_audio=timeline_config.get('narration_audio'),
+                gap=timeline_config.get('gap', 0.0),
+                audio_dir=audio_dir if timeline_config.get('background', True) else None,
+                audio_count=output_config.get('audio_count', 1),
+                audio_gains=output_config.get('audio_gains'),
+                audio_fade_in=output_config.get('audio_fade_in', 0.0),
+                audio_fade_out=output_config.get('audio_fade_out', 0.0),
+                resolution=output_config.get('resolution'),
+                image_cache_dir=output_config.get('image_cache_dir'),
+                profile=output_config.get('profile')
+            )
+            return 0
+
         # 创建视频
-        create_video_with_dual_audio(
+        render_slideshow(
+            engine=output_config.get('engine', 'auto'),
+            segments=output_config.get('segments', 0),
+            segment_min_images=output_config.get('segment_min_images', 200),
+            segment_images=output_config.get('segment_images', 20),
             images_dir=images_dir,
             audio_dir=audio_dir,
             output_path=output_path,
             duration_per_image=duration_per_image,
             fps=fps,
-            audio_count=output_config.get('audio_count', 1)
+            audio_count=output_config.get('audio_count', 1),
+            audio_gains=output_config.get('audio_gains'),
+            audio_fade_in=output_config.get('audio_fade_in', 0.0),
+            audio_fade_out=output_config.get('audio_fade_out', 0.0),
+            resolution=output_config.get('resolution'),
+            image_cache_dir=output_config.get('image_cache_dir'),
+            profile=output_config.get('profile')
         )
         
     except Exception as e:
@@ -0,0 +1,208 @@
+"""幻灯片增量渲染
+图片列表按内容切分成若干分段，每个分段按 图片内容 + 帧数 + 编码参数 命名并保留在磁盘上；
+清单（manifest.json）记录每张图片、每个分段和音频在输出中对应的时间范围。
+重新渲染时只编码内容变化的分段，其余分段直接复用，再流复制拼接并混入音频。
+
+"""
+import os
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from utils.images_to_video import (
+    check_video_output,
+    collect_inputs,
+    encode_segment,
+    frame_boundaries,
+    mux_segments,
+    prepare_image_inputs,
+)
+from utils.encoder_profiles import audio_args, container_args, video_args
+from utils.result_cache import media_digests
+
+MANIFEST_NAME = "manifest.json"
+# 分段编码参数变化时修改版本号，使旧分段失效（编码配置名已包含在键中）
+SEGMENT_VERSION = 2
+
+
+def split_segments(digests, target_size=20):
+    """按内容切分分段，返回 [(起始序号, 结束序号), ...]
+
+    分段边界由图片内容哈希决定（内容定义切分），插入或删除一张图片
+    只会影响相邻的分段，不会让后面所有分段整体错位。
+    """
+    min_size = max(1, target_size // 4)
+    max_size = target_size * 2
+    groups = []
+    start = 0
+    for i, digest in enumerate(digests):
+        size = i - start + 1
+        if (size >= min_size and int(digest[:8], 16) % target_size == 0) or size >= max_size:
+            groups.append((start, i + 1))
+            start = i + 1
+    if start < len(digests):
+        groups.append((start, len(digests)))
+    return groups
+
+
+def segment_key(digests, frame_counts, width, height, fps, profile=None):
+    """分段的内容键"""
+    payload = json.dumps({
+        'version': SEGMENT_VERSION,
+        'images': digests,
+        'frames': frame_counts,
+        'size': [width, height],
+        'fps': fps,
+        'profile': video_args(profile),
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+def load_manifest(segment_dir):
+    """读取上次渲染的清单"""
+    try:
+        with open(Path(segment_dir) / MANIFEST_NAME, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_manifest(segment_dir, manifest):
+    """原子写入清单"""
+    manifest_path = Path(segment_dir) / MANIFEST_NAME
+    tmp_path = manifest_path.with_name(MANIFEST_NAME + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def output_stamp(output_path):
+    """输出文件的 (大小, 修改时间)，文件不存在时返回None"""
+    try:
+        stat = os.stat(output_path)
+    except OSError:
+        return None
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def default_segment_dir(output_path):
+    """分段和清单的默认保存目录：输出文件旁的隐藏目录"""
+    output_path = Path(output_path)
+    return output_path.parent / f".segments_{output_path.stem}"
+
+
+def create_video_incremental(images_dir="input_images",
+                             audio_dir="input_audio",
+                             output_path="output/combined_video.mp4",
+                             duration_per_image=2.0,
+                             fps=24,
+                             audio_count=1,
+                             audio_gains=None,
+                             audio_fade_in=0.0,
+                             audio_fade_out=0.0,
+                             resolution=None,
+                             image_cache_dir=None,
+                             segment_images=20,
+                             segment_dir=None,
+                             workers=0,
+                             profile=None
+                             ):
+    """
+    增量渲染幻灯片视频
+
+    Args:
+        segment_images: 每个分段的目标图片数
+        segment_dir: 分段与清单的保存目录，缺省为输出文件旁的 .segments_<文件名>
+        workers: 同时编码的分段数，0为CPU核数
+        其余参数与 create_video_with_ffmpeg 相同
+    """
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    segment_dir = Path(segment_dir or default_segment_dir(output_path))
+    segment_dir.mkdir(parents=True, exist_ok=True)
+
+    image_files, audio_files = collect_inputs(images_dir, audio_dir, audio_count)
+    image_digests = media_digests(image_files, segment_dir)
+    audio_digests = media_digests(audio_files, segment_dir)
+    encode_files, (width, height) = prepare_image_inputs(image_files, resolution, image_cache_dir)
+
+    bounds = frame_boundaries(len(image_files), duration_per_image, fps)
+    frame_counts = [bounds[i + 1] - bounds[i] for i in range(len(image_files))]
+    video_duration = bounds[-1] / fps
+
+    segments = []
+    for start, end in split_segments(image_digests, segment_images):
+        key = segment_key(image_digests[start:end], frame_counts[start:end], width, height, fps, profile)
+        segments.append({
+            'key': key,
+            'file': f"{key}.mp4",
+            'images': [start, end],
+            'start': bounds[start] / fps,
+            'end': bounds[end] / fps,
+        })
+    manifest = {
+        'output': str(Path(output_path).absolute()),
+        'settings': {'width': width, 'height': height, 'fps': fps,
+                     'duration_per_image': duration_per_image, 'duration': video_duration,
+                     'profile': profile},
+        'images': [{'path': path, 'digest': digest, 'start': bounds[i] / fps, 'end': bounds[i + 1] / fps}
+                   for i, (path, digest) in enumerate(zip(image_files, image_digests))],
+        'segments': segments,
+        'audio': {
+            'files': [{'path': path, 'digest': digest, 'start': 0.0, 'end': video_duration}
+                      for path, digest in zip(audio_files, audio_digests)],
+            'gains': list(audio_gains or []),
+            'fade_in': audio_fade_in,
+            'fade_out': audio_fade_out,
+            'encode': audio_args(profile) + container_args(profile),
+        },
+    }
+
+    previous = load_manifest(segment_dir)
+    # 输出文件须是上次增量渲染写出的那个文件：其他引擎或其他设置后来覆盖了同一路径时，
+    # 大小或修改时间会与清单记录不一致，不能跳过
+    stamp = output_stamp(output_path)
+    if previous and stamp is not None and previous.get('output_file') == stamp and \
+            [s['key'] for s in previous['segments']] == [s['key'] for s in segments] and \
+            [a['digest'] for a in previous['audio']['files']] == audio_digests and \
+            {k: v for k, v in previous['audio'].items() if k != 'files'} == \
+            {k: v for k, v in manifest['audio'].items() if k != 'files'}:
+        print(f"图片和音频均未变化，跳过渲染: {output_path}")
+        return
+
+    missing = [segment for segment in segments if not (segment_dir / segment['file']).exists()]
+    print(f"共 {len(segments)} 个分段，复用 {len(segments) - len(missing)} 个，需重新编码 {len(missing)} 个")
+    if missing:
+        cpu_count = os.cpu_count() or 1
+        workers = max(1, min(workers or cpu_count, len(missing)))
+        threads = max(1, cpu_count // workers)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = []
+            for segment in missing:
+                start, end = segment['images']
+                # 先编码到临时文件，成功后再改名，避免中断时留下不完整的分段被误复用
+                tmp_path = segment_dir / f"{segment['key']}.tmp.mp4"
+                futures.append((pool.submit(encode_segment, encode_files[start:end],
+                                            frame_counts[start:end], str(tmp_path),
+                                            width, height, fps, threads, profile),
+                                tmp_path, segment_dir / segment['file']))
+            for future, tmp_path, final_path in futures:
+                future.result()
+                os.replace(tmp_path, final_path)
+
+    print(f"\n正在拼接分段并输出视频到: {output_path}")
+    mux_segments([str(segment_dir / segment['file']) for segment in segments], audio_files,
+                 output_path, video_duration, audio_gains, audio_fade_in, audio_fade_out, profile)
+    check_video_output(output_path, video_duration)
+    manifest['output_file'] = output_stamp(output_path)
+    save_manifest(segment_dir, manifest)
+
+    # 清理不再被引用的旧分段
+    used = {segment['file'] for segment in segments}
+    for path in segment_dir.glob("*.mp4"):
+        if path.name not in used:
+            path.unlink(missing_ok=True)
+
+    print(f"\n✅ 视频创建完成: {output_path}")
+    print(f"   - 图片数量: {len(image_files)}")
+    print(f"   - 视频时长: {video_duration:.2f}秒")
+    print(f"   - 音轨数量: {len(audio_files)}")
@@ -0,0 +1,341 @@
+"""任务队列与常驻工作进程
+任务保存在本地SQLite数据库中（单机代替消息队列），可以随时提交。
+工作进程常驻运行、循环领取任务：whisper模型只加载一次，各类任务有各自的并发上限，
+每个任务的状态、排队时间和执行耗时都记录在数据库中。
+领取任务时记录租约到期时间，工作进程运行期间定期续约；工作进程崩溃或被杀死后租约过期，
+任何工作进程都会把这些任务放回队列。
+
+用法（在项目根目录运行）:
+    python -m utils.job_queue submit transcribe '{"video_path": "input_video/a.mp4"}'
+    python -m utils.job_queue worker
+    python -m utils.job_queue status
+"""
+import os
+import json
+import time
+import socket
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+import yaml
+
+DEFAULT_DB_PATH = "cache/jobs.sqlite3"
+JOB_STATES = ('queued', 'running', 'done', 'failed')
+# 任务租约时长（秒），工作进程每隔三分之一租约续约一次
+DEFAULT_LEASE_SECONDS = 60.0
+
+
+def load_config(config_path='config/job_queue.yaml'):
+    """加载配置文件"""
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f)
+    except Exception as e:
+        print(f"加载配置文件失败: {str(e)}")
+        return None
+
+
+def connect(db_path=DEFAULT_DB_PATH):
+    """打开任务数据库"""
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(db_path), timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            type TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            state TEXT NOT NULL DEFAULT 'queued',
+            worker TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            result TEXT,
+            submitted_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL,
+            lease_expires REAL
+        )
+    """)
+    # 旧版本创建的数据库没有租约字段
+    columns = {row['name'] for row in conn.execute("PRAGMA table_info(jobs)")}
+    if 'lease_expires' not in columns:
+        conn.execute("ALTER TABLE jobs ADD COLUMN lease_expires REAL")
+    conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, type, id)")
+    return conn
+
+
+def submit_job(conn, job_type, payload):
+    """提交任务，返回任务id"""
+    if job_type not in JOB_HANDLERS:
+        raise ValueError(f"未知的任务类型: {job_type}，可选: {', '.join(JOB_HANDLERS)}")
+    cursor = conn.execute("INSERT INTO jobs (type, payload, submitted_at) VALUES (?, ?, ?)",
+                          (job_type, json.dumps(payload, ensure_ascii=False), time.time()))
+    return cursor.lastrowid
+
+
+def claim_job(conn, job_type, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """领取一个最早提交的指定类型任务，没有时返回None
+
+    在写事务中完成查询和更新，多个工作进程同时领取也不会拿到同一个任务。
+    任务的租约在 lease_seconds 秒后到期，工作进程需要在此之前用 renew_leases 续约。
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT * FROM jobs WHERE state = 'queued' AND type = ? ORDER BY id LIMIT 1",
+                           (job_type,)).fetchone()
+        if row:
+            now = time.time()
+            conn.execute("UPDATE jobs SET state = 'running', worker = ?, attempts = attempts + 1, "
+                         "started_at = ?, lease_expires = ? WHERE id = ?",
+                         (worker, now, now + lease_seconds, row['id']))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return row
+
+
+def finish_job(conn, job_id, result=None, error=None):
+    """记录任务结果"""
+    conn.execute("UPDATE jobs SET state = ?, result = ?, error = ?, finished_at = ?, lease_expires = NULL "
+                 "WHERE id = ?",
+                 ('failed' if error else 'done', json.dumps(result, ensure_ascii=False, default=str),
+                  error, time.time(), job_id))
+
+
+def renew_leases(conn, job_ids, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """为本工作进程正在执行的任务续约（心跳）"""
+    if not job_ids:
+        return
+    placeholders = ','.join('?' * len(job_ids))
+    conn.execute(f"UPDATE jobs SET lease_expires = ? WHERE state = 'running' AND worker = ? "
+                 f"AND id IN ({placeholders})", [time.time() + lease_seconds, worker] + list(job_ids))
+
+
+def requeue_stale(conn, worker=None):
+    """把租约已过期的任务放回队列，不论是哪个工作进程领取的
+
+    worker 不为空时，同名工作进程（固定名字重启）上次退出时未完成的任务也立即放回队列。
+    没有租约记录的任务是旧版本工作进程领取的，无法续约，同样视为过期。
+    """
+    cursor = conn.execute("UPDATE jobs SET state = 'queued', worker = NULL, started_at = NULL, "
+                          "lease_expires = NULL WHERE state = 'running' "
+                          "AND (lease_expires IS NULL OR lease_expires < ? OR worker = ?)",
+                          (time.time(), worker))
+    if cursor.rowcount:
+        print(f"重新排队 {cursor.rowcount} 个未完成的任务")
+    return cursor.rowcount
+
+
+def list_jobs(conn, state=None, limit=50):
+    """最近的任务及其排队时间和执行耗时"""
+    sql = "SELECT * FROM jobs"
+    params = []
+    if state:
+        sql += " WHERE state = ?"
+        params.append(state)
+    sql += " ORDER BY id DESC LIMIT ?"
+    params.append(limit)
+    jobs = []
+    for row in conn.execute(sql, params):
+        job = dict(row)
+        job['wait_seconds'] = (row['started_at'] - row['submitted_at']) if row['started_at'] else None
+        job['run_seconds'] = (row['finished_at'] - row['started_at']) \
+            if row['finished_at'] and row['started_at'] else None
+        jobs.append(job)
+    return jobs
+
+
+def print_status(conn, limit=20):
+    """打印各状态的任务数和最近的任务"""
+    counts = dict(conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+    print("  ".join(f"{state}: {counts.get(state, 0)}" for state in JOB_STATES))
+    print(f"\n{'id':>6} {'类型':<16} {'状态':<8} {'排队(秒)':>10} {'耗时(秒)':>10}  错误")
+    for job in list_jobs(conn, limit=limit):
+        wait_s = f"{job['wait_seconds']:.2f}" if job['wait_seconds'] is not None else '-'
+        run_s = f"{job['run_seconds']:.2f}" if job['run_seconds'] is not None else '-'
+        print(f"{job['id']:>6} {job['type']:<16} {job['state']:<8} {wait_s:>10} {run_s:>10}  "
+              f"{job['error'] or ''}")
+
+
+# ---- 任务处理函数：参数为任务payload，返回值记录为任务结果 ----
+
+def _handle_transcribe(payload):
+    from utils.video_processor import load_config as load_vp_config
+    from utils.video_processor import lookup_cached_results, transcribe_video
+    config = load_vp_config(payload.get('config', 'config/video_processor.yaml'))
+    output_config = config['video']['output']
+    cache_config = config.get('cache', {})
+    video_file = Path(payload['video_path'])
+    Path(output_config['output_dir']).mkdir(parents=True, exist_ok=True)
+    pending = lookup_cached_results([video_file], config['whisper'], output_config, cache_config)
+    if video_file in pending:
+        transcribe_video(video_file, config['whisper'], output_config, config.get('decode', {}),
+                         config.get('streaming', {}), pending[video_file], cache_config)
+    return str(Path(output_config['output_dir']) / video_file.stem)
+
+
+def _handle_merge_subtitle(payload):
+    from utils.merge_subtitle import merge_subtitle_to_video
+    if not merge_subtitle_to_video(payload['video_path'], payload['subtitle_path'], payload['output_path'],
+                                   payload.get('segments', 1), payload.get('workers', 0),
+                                   payload.get('mode', 'burn'), payload.get('language', 'chi'),
+                                   payload.get('profile')):
+        raise RuntimeError("合并字幕失败")
+    return payload['output_path']
+
+
+def _handle_concat(payload):
+    from utils.video_concat import concatenate_multiple_videos
+    if not concatenate_multiple_videos(payload['video_paths'], payload['output_path'],
+                                       reencode=payload.get('reencode', False), profile=payload.get('profile')):
+        raise RuntimeError("拼接失败")
+    return payload['output_path']
+
+
+def _handle_images_to_video(payload):
+    from utils.images_to_video import render_slideshow
+    render_slideshow(**payload)
+    return payload.get('output_path')
+
+
+def _handle_compose(payload):
+    from utils.composer import compose
+    compose(payload)
+    return payload.get('output')
+
+
+def _handle_pipeline(payload):
+    from utils.pipeline import build_video_tasks, run_pipeline, load_config as load_pipeline_config
+    from utils.video_processor import load_config as load_vp_config
+    from utils.merge_subtitle import load_config as load_ms_config
+    pipeline_config = load_pipeline_config()
+    vp_config = load_vp_config()
+    ms_config = load_ms_config()
+    missing = [path for path, config in (('config/pipeline.yaml', pipeline_config),
+                                         ('config/video_processor.yaml', vp_config),
+                                         ('config/merge_subtitle.yaml', ms_config)) if not config]
+    if missing:
+        raise RuntimeError(f"流水线配置加载失败: {', '.join(missing)}")
+    tasks = build_video_tasks([Path(payload['video_path'])], pipeline_config, vp_config, ms_config)
+    # 同一视频的各步骤依次执行，工作进程层面已控制并发
+    report = run_pipeline(tasks, workers=1)
+    failed = [name for name, item in report.items() if item['state'] in ('failed', 'blocked')]
+    if failed:
+        raise RuntimeError(f"流水线任务失败: {', '.join(failed)}")
+    return {name: str(item['result']) for name, item in report.items()}
+
+
+JOB_HANDLERS = {
+    'transcribe': _handle_transcribe,
+    'merge_subtitle': _handle_merge_subtitle,
+    'concat': _handle_concat,
+    'images_to_video': _handle_images_to_video,
+    'compose': _handle_compose,
+    'pipeline': _handle_pipeline,
+}
+
+
+def _run_job(job_type, payload):
+    return JOB_HANDLERS[job_type](payload)
+
+
+def run_worker(db_path=DEFAULT_DB_PATH, limits=None, poll_interval=1.0, worker=None, once=False,
+               warm_up=False, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """
+    常驻工作进程：循环领取并执行任务
+
+    Args:
+        limits: {任务类型: 并发上限}，未列出的类型不领取
+        poll_interval: 队列为空时的轮询间隔（秒）
+        worker: 工作进程名，缺省为 主机名:进程号
+        once: 队列清空后退出（用于批量处理）
+        warm_up: 启动时预先加载whisper模型
+        lease_seconds: 任务租约时长（秒），工作进程停止续约超过该时长后任务由其他工作进程重新领取
+    """
+    limits = limits or {'transcribe': 1, 'merge_subtitle': 2, 'concat': 2, 'images_to_video': 1,
+                        'compose': 1, 'pipeline': 1}
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    conn = connect(db_path)
+    requeue_stale(conn, worker)
+
+    if warm_up and limits.get('transcribe'):
+        from utils.video_processor import load_config as load_vp_config, warm_up_model
+        warm_up_model(load_vp_config()['whisper'])
+
+    print(f"工作进程 {worker} 已启动，并发上限: {limits}")
+    running = {}
+    last_heartbeat = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, sum(limits.values()))) as pool:
+        try:
+            while True:
+                # 定期续约正在执行的任务，并回收其他工作进程崩溃后留下的过期任务
+                if time.monotonic() - last_heartbeat >= lease_seconds / 3:
+                    renew_leases(conn, [job_id for _, job_id in running.values()], worker, lease_seconds)
+                    requeue_stale(conn)
+                    last_heartbeat = time.monotonic()
+
+                for job_type, limit in limits.items():
+                    while sum(1 for t, _ in running.values() if t == job_type) < limit:
+                        job = claim_job(conn, job_type, worker, lease_seconds)
+                        if job is None:
+                            break
+                        print(f"开始任务 #{job['id']} {job_type}")
+                        future = pool.submit(_run_job, job_type, json.loads(job['payload']))
+                        running[future] = (job_type, job['id'])
+
+                if not running:
+                    if once:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+
+                done, _ = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job_type, job_id = running.pop(future)
+                    try:
+                        finish_job(conn, job_id, result=future.result())
+                        print(f"任务完成 #{job_id} {job_type}")
+                    except Exception as e:
+                        finish_job(conn, job_id, error=str(e))
+                        print(f"任务失败 #{job_id} {job_type}: {str(e)}")
+        except KeyboardInterrupt:
+            print("收到中断，等待正在执行的任务完成...")
+            while running:
+                done, _ = wait(running, timeout=lease_seconds / 3)
+                for future in done:
+                    job_type, job_id = running.pop(future)
+                    try:
+                        finish_job(conn, job_id, result=future.result())
+                    except Exception as e:
+                        finish_job(conn, job_id, error=str(e))
+                renew_leases(conn, [job_id for _, job_id in running.values()], worker, lease_seconds)
+    conn.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="视频任务队列")
+    sub = parser.add_subparsers(dest='command', required=True)
+    submit_parser = sub.add_parser('submit', help="提交任务")
+    submit_parser.add_argument('type', choices=list(JOB_HANDLERS))
+    submit_parser.add_argument('payload', help="任务参数（JSON）")
+    worker_parser = sub.add_parser('worker', help="启动常驻工作进程")
+    worker_parser.add_argument('--once', action='store_true', help="队列清空后退出")
+    status_parser = sub.add_parser('status', help="查看任务状态")
+    status_parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    queue_config = load_config() or {}
+    db_path = queue_config.get('db_path', DEFAULT_DB_PATH)
+    if args.command == 'submit':
+        conn = connect(db_path)
+        print(f"已提交任务 #{submit_job(conn, args.type, json.loads(args.payload))}")
+    elif args.command == 'worker':
+        run_worker(db_path, queue_config.get('limits'), queue_config.get('poll_interval', 1.0),
+                   queue_config.get('worker'), args.once, queue_config.get('warm_up', False),
+                   queue_config.get('lease_seconds', DEFAULT_LEASE_SECONDS))
+    else:
+        print_status(connect(db_path), args.limit)
@@ -0,0 +1,224 @@
+"""长视频分块转写
+按静音位置把音频切成若干块逐块转写，边转写边追加写出SRT字幕和文本，
+时间戳按块起点偏移；每完成一块记录进度，崩溃后可从最后完成的块继续。
+进度按 媒体内容哈希 + 分块 + 模型 + 转写参数 校验，源文件内容变化后从头转写。
+
+"""
+import os
+import json
+import time
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+from utils.video_processor import (
+    MODEL_LOCK,
+    SAMPLE_RATE,
+    format_time,
+    get_model,
+    load_pcm,
+    warm_up_model,
+    _model_key,
+)
+from utils.result_cache import media_digest
+from utils.transcript import Transcript, count_chinese_chars, write_index, write_info
+
+PROGRESS_FILE = "progress.json"
+# 媒体内容哈希索引所在目录，与转写结果缓存共用，同一文件不必重复计算哈希
+DIGEST_CACHE_DIR = "cache/transcripts"
+# 静音检测的分析帧长（秒）
+FRAME_SECONDS = 0.03
+
+
+def find_chunks(audio, chunk_seconds=300, search_seconds=30):
+    """按静音切分音频，返回 [(起始采样, 结束采样), ...]
+
+    在每个目标切分点之前 search_seconds 秒的窗口内，
+    选能量最低的位置作为切分点，避免把一句话切成两半。
+    """
+    total = len(audio)
+    chunk = int(chunk_seconds * SAMPLE_RATE)
+    if total <= chunk:
+        return [(0, total)]
+
+    frame = int(FRAME_SECONDS * SAMPLE_RATE)
+    search_frames = max(1, int(search_seconds / FRAME_SECONDS))
+    bounds = []
+    start = 0
+    while total - start > chunk:
+        target = (start + chunk) // frame
+        lo = max(start // frame + 1, target - search_frames)
+        window = np.asarray(audio[lo * frame:target * frame], dtype=np.float32)
+        if len(window) < frame:
+            cut = start + chunk
+        else:
+            energy = np.square(window[:len(window) // frame * frame]).reshape(-1, frame).mean(axis=1)
+            cut = (lo + int(np.argmin(energy))) * frame
+        bounds.append((start, cut))
+        start = cut
+    bounds.append((start, total))
+    return bounds
+
+
+def _transcribe_chunk(audio, start, end, whisper_config):
+    """转写一个块，返回相对整段音频的 [(开始秒, 结束秒, 文本), ...]"""
+    options = whisper_config.get('transcribe_options') or {}
+    model = get_model(whisper_config)
+    with MODEL_LOCK:
+        result = model.transcribe(np.asarray(audio[start:end]), fp16=_model_key(whisper_config)[2], **options)
+    offset = start / SAMPLE_RATE
+    return [(segment['start'] + offset, segment['end'] + offset, segment['text'].strip())
+            for segment in result['segments']]
+
+
+def _init_chunk_worker(whisper_config, threads_per_worker):
+    """分块转写工作进程初始化"""
+    import torch
+    torch.set_num_threads(threads_per_worker)
+    warm_up_model(whisper_config)
+
+
+def _transcribe_chunk_file(pcm_path, start, end, whisper_config):
+    """工作进程中从PCM文件转写一个块"""
+    return _transcribe_chunk(load_pcm(pcm_path), start, end, whisper_config)
+
+
+def _load_progress(progress_path, signature):
+    """读取断点进度，参数不一致时视为重新开始"""
+    try:
+        with open(progress_path, 'r', encoding='utf-8') as f:
+            progress = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return progress if progress.get('signature') == signature else None
+
+
+def _save_progress(progress_path, progress):
+    """原子写入进度文件"""
+    tmp_path = progress_path.with_name(progress_path.name + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(progress, f, ensure_ascii=False)
+    os.replace(tmp_path, progress_path)
+
+
+def _open_output(path, offset):
+    """以追加方式打开输出文件，并截掉上次崩溃时写了一半的内容"""
+    f = open(path, 'a+b')
+    f.truncate(offset)
+    f.seek(offset)
+    return f
+
+
+def _iter_results(audio, chunks, whisper_config, workers, tmp_dir):
+    """按顺序产出每个块的转写结果
+
+    workers > 1 时由进程池并行转写，结果仍按块顺序返回，
+    最多预先提交 workers * 2 个块，避免乱序结果堆积在内存中。
+    """
+    if workers <= 1:
+        for start, end in chunks:
+            yield _transcribe_chunk(audio, start, end, whisper_config)
+        return
+
+    pcm_path = getattr(audio, 'filename', None)
+    own_file = pcm_path is None
+    if own_file:
+        fd, pcm_path = tempfile.mkstemp(suffix='.f32', dir=tmp_dir)
+        os.close(fd)
+        np.asarray(audio, dtype=np.float32).tofile(pcm_path)
+    threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_chunk_worker,
+                                 initargs=(whisper_config, threads_per_worker)) as pool:
+            futures = []
+            next_index = 0
+            for index in range(len(chunks)):
+                while next_index < len(chunks) and next_index < index + workers * 2:
+                    start, end = chunks[next_index]
+                    futures.append(pool.submit(_transcribe_chunk_file, pcm_path, start, end, whisper_config))
+                    next_index += 1
+                yield futures[index].result()
+                futures[index] = None
+    finally:
+        if own_file:
+            os.unlink(pcm_path)
+
+
+def transcribe_long_audio(audio, one_output_dir, whisper_config, output_config, stream_config, media_path=None):
+    """分块转写长音频并流式写出 subtitle.srt / text.txt，完成后写 info.json 和检索索引
+
+    media_path 为音频来源的媒体文件，其内容哈希记入进度签名：同名文件内容被替换后不会接着旧进度写。
+    """
+    one_output_dir = Path(one_output_dir)
+    chunks = find_chunks(audio, stream_config.get('chunk_seconds', 300),
+                         stream_config.get('search_seconds', 30))
+    signature = {
+        'media': media_digest(media_path, stream_config.get('digest_cache_dir', DIGEST_CACHE_DIR))
+        if media_path else None,
+        'samples': len(audio),
+        'chunks': chunks,
+        'model': whisper_config['model'],
+        'options': whisper_config.get('transcribe_options') or {},
+    }
+    # 经过JSON往返后元组会变成列表，这里统一成JSON形式再比较
+    signature = json.loads(json.dumps(signature))
+
+    progress_path = one_output_dir / PROGRESS_FILE
+    progress = _load_progress(progress_path, signature) or {
+        'signature': signature, 'chunks_done': 0, 'cue_index': 0,
+        'char_count': 0, 'srt_bytes': 0, 'txt_bytes': 0,
+    }
+    if progress['chunks_done']:
+        print(f"从第 {progress['chunks_done'] + 1}/{len(chunks)} 块继续转写")
+
+    srt_file = _open_output(one_output_dir / "subtitle.srt", progress['srt_bytes']) \
+        if output_config['is_subtitle'] else None
+    txt_file = _open_output(one_output_dir / "text.txt", progress['txt_bytes']) \
+        if output_config['is_text'] else None
+    try:
+        remaining = chunks[progress['chunks_done']:]
+        results = _iter_results(audio, remaining, whisper_config,
+                                int(stream_config.get('workers', 1)), stream_config.get('tmp_dir'))
+        clock = time.perf_counter()
+        for segments in results:
+            srt_lines = []
+            text_parts = []
+            for start, end, text in segments:
+                progress['cue_index'] += 1
+                srt_lines.append(f"{progress['cue_index']}\n{format_time(start)} --> {format_time(end)}\n{text}\n\n")
+                text_parts.append(f"{text}，")
+            chunk_text = ''.join(text_parts)
+            progress['char_count'] += count_chinese_chars(chunk_text)
+
+            for f, data, key in ((srt_file, ''.join(srt_lines), 'srt_bytes'), (txt_file, chunk_text, 'txt_bytes')):
+                if f is None:
+                    continue
+                f.write(data.encode('utf-8'))
+                f.flush()
+                os.fsync(f.fileno())
+                progress[key] = f.tell()
+            progress['chunks_done'] += 1
+            _save_progress(progress_path, progress)
+            now = time.perf_counter()
+            print(f"完成第 {progress['chunks_done']}/{len(chunks)} 块，"
+                  f"累计字数: {progress['char_count']}，耗时: {now - clock:.2f}秒")
+            clock = now
+    finally:
+        for f in (srt_file, txt_file):
+            if f is not None:
+                f.close()
+
+    # 分段结果从写完的字幕读回，不在进度文件中重复保存
+    transcript = Transcript.from_srt(one_output_dir / "subtitle.srt") if output_config['is_subtitle'] else None
+    if transcript is not None and output_config.get('is_vtt', False):
+        with open(one_output_dir / "subtitle.vtt", 'w', encoding='utf-8') as f:
+            f.write(transcript.render(srt=False, vtt=True, text=False)['vtt'])
+    if output_config['is_text']:
+        full_text = (one_output_dir / "text.txt").read_text(encoding='utf-8')
+        print(f"文本总字数: {progress['char_count']}")
+        write_info(one_output_dir, full_text, progress['char_count'], transcript)
+    if transcript is not None and output_config.get('is_index', True):
+        write_index(transcript, one_output_dir)
+    progress_path.unlink(missing_ok=True)
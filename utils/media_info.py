@@ -0,0 +1,284 @@
+"""媒体信息探测与缓存
+用ffprobe读取媒体文件的容器和流信息，结果按 (路径, 大小, 修改时间) 缓存在SQLite中，
+文件未变化时不再启动ffprobe进程；批量探测时未命中的文件用线程池并行探测。
+
+"""
+import os
+import json
+import sqlite3
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from fractions import Fraction
+from pathlib import Path
+from utils.telemetry import span
+
+DEFAULT_CACHE_PATH = "cache/media_info.sqlite3"
+# 探测字段变化时修改版本号，使旧缓存失效
+CACHE_VERSION = 3
+
+
+def _fraction(value):
+    """把ffprobe的 "30000/1001" 形式解析为精确分数，无效值返回None"""
+    if not value:
+        return None
+    try:
+        result = Fraction(value)
+    except (ValueError, ZeroDivisionError):
+        return None
+    return result or None
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class StreamInfo:
+    """单个音视频流的信息"""
+    __slots__ = ('index', 'codec_type', 'codec_name', 'profile', 'level', 'width', 'height', 'fps',
+                 'time_base', 'pix_fmt', 'sample_rate', 'channels', 'channel_layout', 'bit_rate', 'duration')
+
+    def __init__(self, index, codec_type, codec_name=None, profile=None, level=None, width=None, height=None,
+                 fps=None, time_base=None, pix_fmt=None, sample_rate=None, channels=None,
+                 channel_layout=None, bit_rate=None, duration=None):
+        self.index = index
+        self.codec_type = codec_type
+        self.codec_name = codec_name
+        self.profile = profile
+        self.level = level
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.time_base = time_base
+        self.pix_fmt = pix_fmt
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.channel_layout = channel_layout
+        self.bit_rate = bit_rate
+        self.duration = duration
+
+    @classmethod
+    def from_ffprobe(cls, stream):
+        """从ffprobe的stream字段构造"""
+        return cls(
+            index=stream.get('index'),
+            codec_type=stream.get('codec_type'),
+            codec_name=stream.get('codec_name'),
+            profile=stream.get('profile'),
+            level=_int(stream.get('level')) if stream.get('codec_type') == 'video' else None,
+            width=_int(stream.get('width')),
+            height=_int(stream.get('height')),
+            fps=_fraction(stream.get('r_frame_rate')) if stream.get('codec_type') == 'video' else None,
+            time_base=stream.get('time_base'),
+            pix_fmt=stream.get('pix_fmt'),
+            sample_rate=_int(stream.get('sample_rate')),
+            channels=_int(stream.get('channels')),
+            channel_layout=stream.get('channel_layout'),
+            bit_rate=_int(stream.get('bit_rate')),
+            duration=_float(stream.get('duration')),
+        )
+
+    def to_dict(self):
+        data = {name: getattr(self, name) for name in self.__slots__}
+        data['fps'] = str(self.fps) if self.fps is not None else None
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        data['fps'] = _fraction(data.get('fps'))
+        return cls(**data)
+
+    def __repr__(self):
+        return f"StreamInfo({self.index}, {self.codec_type}, {self.codec_name})"
+
+
+class MediaInfo:
+    """媒体文件信息：容器时长、起始时间、大小、码率以及各个流"""
+    __slots__ = ('path', 'size', 'mtime_ns', 'duration', 'start_time', 'bit_rate', 'format_name', 'streams')
+
+    def __init__(self, path, size, mtime_ns, duration=None, start_time=None, bit_rate=None, format_name=None,
+                 streams=()):
+        self.path = path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.duration = duration
+        self.start_time = start_time
+        self.bit_rate = bit_rate
+        self.format_name = format_name
+        self.streams = list(streams)
+
+    @classmethod
+    def from_ffprobe(cls, path, stat, probe):
+        """从ffprobe的json输出构造"""
+        fmt = probe.get('format', {})
+        return cls(
+            path=str(path),
+            size=_int(fmt.get('size')) or stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            duration=_float(fmt.get('duration')),
+            start_time=_float(fmt.get('start_time')),
+            bit_rate=_int(fmt.get('bit_rate')),
+            format_name=fmt.get('format_name'),
+            streams=[StreamInfo.from_ffprobe(s) for s in probe.get('streams', [])],
+        )
+
+    @property
+    def video_streams(self):
+        return [s for s in self.streams if s.codec_type == 'video']
+
+    @property
+    def audio_streams(self):
+        return [s for s in self.streams if s.codec_type == 'audio']
+
+    @property
+    def subtitle_streams(self):
+        return [s for s in self.streams if s.codec_type == 'subtitle']
+
+    @property
+    def video(self):
+        """第一个视频流，没有时为None"""
+        return next((s for s in self.streams if s.codec_type == 'video'), None)
+
+    @property
+    def audio(self):
+        """第一个音频流，没有时为None"""
+        return next((s for s in self.streams if s.codec_type == 'audio'), None)
+
+    @property
+    def fps(self):
+        video = self.video
+        return video.fps if video else None
+
+    def to_dict(self):
+        return {
+            'path': self.path,
+            'size': self.size,
+            'mtime_ns': self.mtime_ns,
+            'duration': self.duration,
+            'start_time': self.start_time,
+            'bit_rate': self.bit_rate,
+            'format_name': self.format_name,
+            'streams': [s.to_dict() for s in self.streams],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        data['streams'] = [StreamInfo.from_dict(s) for s in data.get('streams', [])]
+        return cls(**data)
+
+    def __repr__(self):
+        return f"MediaInfo({self.path!r}, duration={self.duration}, streams={len(self.streams)})"
+
+
+def run_ffprobe(path):
+    """运行ffprobe，返回解析后的json"""
+    result = subprocess.run([
+        'ffprobe', '-v', 'quiet',
+        '-print_format', 'json',
+        '-show_format',
+        '-show_streams',
+        str(path)
+    ], capture_output=True, text=True, check=True)
+    return json.loads(result.stdout)
+
+
+def _open_cache(cache_path):
+    """打开探测缓存数据库"""
+    Path(cache_path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(cache_path), timeout=30)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS media_info (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            version INTEGER NOT NULL,
+            data TEXT NOT NULL
+        )
+    """)
+    return conn
+
+
+def _load_cached(conn, keys, batch_size=500):
+    """按路径批量读取缓存记录，返回 {路径: (大小, 修改时间, 数据)}"""
+    rows = {}
+    for start in range(0, len(keys), batch_size):
+        batch = keys[start:start + batch_size]
+        placeholders = ','.join('?' * len(batch))
+        for path, size, mtime_ns, data in conn.execute(
+                f"SELECT path, size, mtime_ns, data FROM media_info "
+                f"WHERE version = ? AND path IN ({placeholders})", [CACHE_VERSION] + batch):
+            rows[path] = (size, mtime_ns, data)
+    return rows
+
+
+def _probe_uncached(path, stat):
+    """探测单个文件，失败时返回None"""
+    try:
+        return MediaInfo.from_ffprobe(path, stat, run_ffprobe(path))
+    except (subprocess.CalledProcessError, OSError, ValueError) as e:
+        print(f"获取媒体信息失败 {path}: {str(e)}")
+        return None
+
+
+def probe_many(paths, workers=8, cache_path=DEFAULT_CACHE_PATH):
+    """
+    批量探测媒体文件
+
+    已缓存且大小、修改时间未变的文件直接从SQLite读取；其余文件用线程池并行运行ffprobe，
+    结果在一个事务中写回缓存。cache_path 为None时不使用缓存。
+
+    Returns:
+        list: 与 paths 一一对应的 MediaInfo，文件不存在或探测失败时为None
+    """
+    results = [None] * len(paths)
+    stats = {}
+    for i, path in enumerate(paths):
+        try:
+            stats[i] = os.stat(path)
+        except OSError as e:
+            print(f"获取媒体信息失败 {path}: {str(e)}")
+
+    conn = _open_cache(cache_path) if cache_path else None
+    try:
+        keys = {i: os.path.abspath(paths[i]) for i in stats}
+        cached = _load_cached(conn, list(keys.values())) if conn else {}
+        pending = []
+        for i, stat in stats.items():
+            row = cached.get(keys[i])
+            if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+                results[i] = MediaInfo.from_dict(json.loads(row[2]))
+            else:
+                pending.append((i, keys[i], stat))
+
+        if pending:
+            with span('probe', files=len(pending), cached=len(stats) - len(pending)), \
+                    ThreadPoolExecutor(max_workers=max(1, min(workers, len(pending)))) as pool:
+                probed = list(pool.map(lambda item: _probe_uncached(paths[item[0]], item[2]), pending))
+            rows = []
+            for (i, key, stat), info in zip(pending, probed):
+                results[i] = info
+                if info is not None:
+                    rows.append((key, stat.st_size, stat.st_mtime_ns, CACHE_VERSION, json.dumps(info.to_dict())))
+            if conn and rows:
+                with conn:
+                    conn.executemany("INSERT OR REPLACE INTO media_info VALUES (?, ?, ?, ?, ?)", rows)
+    finally:
+        if conn:
+            conn.close()
+    return results
+
+
+def probe(path, cache_path=DEFAULT_CACHE_PATH):
+    """探测单个媒体文件，失败时返回None"""
+    return probe_many([path], workers=1, cache_path=cache_path)[0]
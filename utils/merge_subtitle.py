@@ -1,7 +1,11 @@
+import os
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import sys
 import yaml
+from utils.encoder_profiles import container_args, video_args
+from utils.telemetry import run_ffmpeg
 
 def load_config():
     """加载配置文件"""
@@ -13,8 +17,41 @@ def load_config():
         return None 
 
 
-def merge_subtitle_to_video(video_path, subtitle_path, output_path):
-    """将字幕合并到视频中"""
+SUBTITLE_STYLE = "FontName=Microsoft YaHei,FontSize=24,PrimaryColour=&HFFFFFF&,OutlineColour=&H000000&,Outline=1"
+
+
+def subtitle_filter(subtitle_path):
+    """烧录字幕的滤镜"""
+    return f"subtitles={subtitle_path}:force_style='{SUBTITLE_STYLE}'"
+
+
+# 软字幕按输出容器选择字幕编码
+SOFT_SUBTITLE_CODECS = {'.mp4': 'mov_text', '.m4v': 'mov_text', '.mov': 'mov_text',
+                        '.mkv': 'srt', '.webm': 'webvtt'}
+
+
+def mux_subtitle(video_path, subtitle_path, output_path, language="chi"):
+    """把字幕作为可选字幕轨封装进视频，音视频流直接复制，不重新编码"""
+    codec = SOFT_SUBTITLE_CODECS.get(Path(output_path).suffix.lower(), 'mov_text')
+    run_ffmpeg([
+        'ffmpeg', '-y', '-v', 'error',
+        '-i', str(video_path),
+        '-i', str(subtitle_path),
+        '-map', '0:v', '-map', '0:a?', '-map', '1:0',
+        '-c', 'copy', '-c:s', codec,
+        '-metadata:s:s:0', f"language={language}",
+        str(output_path)
+    ], 'mux', output=str(output_path))
+
+
+def merge_subtitle_to_video(video_path, subtitle_path, output_path, segments=1, workers=0,
+                            mode="burn", language="chi", profile=None):
+    """将字幕合并到视频中
+
+    mode 为 "burn" 时把字幕烧录进画面；为 "soft" 时作为可选字幕轨封装，不重新编码。
+    烧录时 segments 不为1则在关键帧处分段并行烧录（0为按CPU核数分段），
+    workers 为同时烧录的分段数，profile 为烧录使用的编码配置（见 utils.encoder_profiles）。
+    """
     try:
         # 检查输入文件是否存在
         if not Path(video_path).exists():
@@ -27,13 +64,25 @@ def merge_subtitle_to_video(video_path, subtitle_path, output_path):
         # 确保输出目录存在
         Path(output_path).parent.mkdir(parents=True, exist_ok=True)
 
+        if mode == "soft":
+            mux_subtitle(video_path, subtitle_path, output_path, language)
+            print(f"成功生成带软字幕的视频: {output_path}")
+            return True
+
+        if segments != 1:
+            from utils.subtitle_burn import burn_subtitle_segmented
+            if burn_subtitle_segmented(video_path, subtitle_path, output_path, segments, workers,
+                                       profile=profile):
+                print(f"成功生成带字幕的视频: {output_path}")
+                return True
+
         # 使用ffmpeg合并字幕
-        subprocess.run([
-            'ffmpeg', '-i', str(video_path),
-            '-vf', f"subtitles={subtitle_path}:force_style='FontName=Microsoft YaHei,FontSize=24,PrimaryColour=&HFFFFFF&,OutlineColour=&H000000&,Outline=1'",
-            '-c:a', 'copy',
+        run_ffmpeg([
+            'ffmpeg', '-y', '-i', str(video_path),
+            '-vf', subtitle_filter(subtitle_path)
+        ] + video_args(profile, pix_fmt=None) + ['-c:a', 'copy'] + container_args(profile) + [
             str(output_path)
-        ], check=True)
+        ], 'render', output=str(output_path))
         
         print(f"成功生成带字幕的视频: {output_path}")
         return True
@@ -44,6 +93,45 @@ def merge_subtitle_to_video(video_path, subtitle_path, output_path):
         print(f"发生错误: {str(e)}")
         return False
 
+def find_subtitle_pairs(input_dir, processed_dir, extensions=(".mp4", ".mkv")):
+    """把输入目录中的视频与转写输出目录中的 <视频名>/subtitle.srt 配对
+
+    Returns:
+        list: [(视频路径, 字幕路径), ...]，没有字幕的视频会被跳过
+    """
+    extensions = {ext.lower() for ext in extensions}
+    pairs = []
+    for video_path in sorted(Path(input_dir).glob("*")):
+        if video_path.suffix.lower() not in extensions:
+            continue
+        subtitle_path = Path(processed_dir) / video_path.stem / "subtitle.srt"
+        if subtitle_path.exists():
+            pairs.append((video_path, subtitle_path))
+        else:
+            print(f"跳过没有字幕的视频: {video_path}")
+    return pairs
+
+
+def merge_subtitles_batch(pairs, output_dir, mode="burn", workers=2, segments=1, language="chi", profile=None):
+    """并发合并多组视频和字幕，输出到 output_dir/<视频文件名>
+
+    Returns:
+        list: 每组是否成功
+    """
+    output_dir = Path(output_dir)
+    workers = max(1, min(workers, len(pairs)))
+    # 多个视频同时处理时，每个视频分段烧录只占用分到的那份CPU，避免并发进程数成倍超出核数
+    segment_workers = max(1, (os.cpu_count() or 1) // workers)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(merge_subtitle_to_video, video_path, subtitle_path,
+                               output_dir / Path(video_path).name, segments, segment_workers, mode, language,
+                               profile)
+                   for video_path, subtitle_path in pairs]
+        results = [future.result() for future in futures]
+    print(f"字幕合并完成: 成功 {sum(results)} 个，失败 {len(results) - sum(results)} 个")
+    return results
+
+
 def begin_merge_subtitle():
     """开始合并字幕到视频"""
     config = load_config()
@@ -56,12 +144,29 @@ def begin_merge_subtitle():
     video_path = input_config.get('video_path', 'input_video.mp4')
     subtitle_path = input_config.get('subtitle_path', 'input_subtitle.srt')
     output_path = output_config.get('output_path', 'output/merged_video.mp4')
+    burn_config = config.get('burn', {})
+    mode = config.get('mode', 'burn')
+    language = config.get('language', 'chi')
+    profile = config.get('profile')
+
+    batch_config = config.get('batch', {})
+    if batch_config.get('enabled', False):
+        pairs = find_subtitle_pairs(batch_config.get('input_dir', 'input_video'),
+                                    batch_config.get('processed_dir', 'output_video/processed'),
+                                    batch_config.get('extensions', ['.mp4', '.mkv']))
+        if not pairs:
+            print("没有找到可以合并的视频和字幕")
+            return
+        merge_subtitles_batch(pairs, batch_config.get('output_dir', 'output_video/subtitled'), mode,
+                              batch_config.get('workers', 2), burn_config.get('segments', 1), language, profile)
+        return
 
     if not video_path or not subtitle_path or not output_path:
         print("配置文件中缺少必要的路径信息")
         return
 
-    merge_subtitle_to_video(video_path, subtitle_path, output_path)
+    merge_subtitle_to_video(video_path, subtitle_path, output_path,
+                            burn_config.get('segments', 1), burn_config.get('workers', 0), mode, language, profile)
 
 if __name__ == "__main__":
     begin_merge_subtitle()
\ No newline at end of file
@@ -0,0 +1,238 @@
+"""视频处理流水线
+把每个输入视频的 转写 → 合并字幕 → 拼接片头片尾 描述为任务图，
+不同视频的任务在线程池中并发执行，每类任务有各自的并发上限。
+上一步的产物按路径直接交给下一步；产物比输入新时跳过该任务。
+
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+import yaml
+
+
+def load_config(config_path='config/pipeline.yaml'):
+    """加载配置文件"""
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f)
+    except Exception as e:
+        print(f"加载配置文件失败: {str(e)}")
+        return None
+
+
+class Task:
+    """任务图中的一个节点
+
+    func 以依赖任务的结果（产物路径）为参数，返回本任务的产物路径；
+    outputs 为本任务的产物，sources 为依赖任务之外的输入文件，用于判断产物是否最新。
+    """
+    __slots__ = ('name', 'kind', 'func', 'deps', 'outputs', 'sources')
+
+    def __init__(self, name, kind, func, deps=(), outputs=(), sources=()):
+        self.name = name
+        self.kind = kind
+        self.func = func
+        self.deps = list(deps)
+        self.outputs = [Path(p) for p in outputs]
+        self.sources = [Path(p) for p in sources if p]
+
+    def __repr__(self):
+        return f"Task({self.name!r})"
+
+
+def is_up_to_date(outputs, sources):
+    """所有产物都存在且不早于所有输入时返回True"""
+    if not outputs:
+        return False
+    try:
+        oldest_output = min(os.stat(p).st_mtime_ns for p in outputs)
+        newest_source = max((os.stat(p).st_mtime_ns for p in sources), default=0)
+    except OSError:
+        return False
+    return oldest_output >= newest_source
+
+
+def _run_task(task, args):
+    start = time.perf_counter()
+    result = task.func(*args)
+    return result, time.perf_counter() - start
+
+
+def run_pipeline(tasks, workers=4, limits=None):
+    """
+    按依赖关系调度任务
+
+    Args:
+        tasks: Task 列表，依赖必须出现在列表中
+        workers: 线程池大小
+        limits: {任务类型: 并发上限}，未列出的类型只受 workers 限制
+
+    Returns:
+        dict: {任务名: {'state': done/skipped/failed/blocked, 'seconds': 耗时, 'result': 产物}}
+    """
+    limits = limits or {}
+    by_name = {task.name: task for task in tasks}
+    report = {}
+    pending = list(tasks)
+    running = {}
+    running_kinds = {}
+
+    def finished(name):
+        return name in report and report[name]['state'] in ('done', 'skipped')
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        while pending or running:
+            # 反复扫描，直到没有新的任务被标记或提交（跳过的任务会让其下游立即就绪）
+            scanned = None
+            while scanned != len(pending):
+                scanned = len(pending)
+                for task in list(pending):
+                    if any(report.get(dep, {}).get('state') in ('failed', 'blocked') for dep in task.deps):
+                        report[task.name] = {'state': 'blocked', 'seconds': 0.0, 'result': None}
+                        pending.remove(task)
+                        continue
+                    if not all(finished(dep) for dep in task.deps):
+                        continue
+                    args = [report[dep]['result'] for dep in task.deps]
+                    sources = task.sources + [Path(p) for dep in task.deps
+                                              for p in by_name[dep].outputs]
+                    if is_up_to_date(task.outputs, sources):
+                        print(f"产物已是最新，跳过: {task.name}")
+                        result = task.outputs[0] if len(task.outputs) == 1 else task.outputs
+                        report[task.name] = {'state': 'skipped', 'seconds': 0.0, 'result': result}
+                        pending.remove(task)
+                        continue
+                    if running_kinds.get(task.kind, 0) >= limits.get(task.kind, workers):
+                        continue
+                    running[pool.submit(_run_task, task, args)] = task
+                    running_kinds[task.kind] = running_kinds.get(task.kind, 0) + 1
+                    pending.remove(task)
+
+            if not running:
+                # 没有任务在运行，剩下的任务依赖了不在任务图中的任务
+                for task in pending:
+                    report[task.name] = {'state': 'blocked', 'seconds': 0.0, 'result': None}
+                    print(f"任务依赖缺失，未执行: {task.name}")
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = running.pop(future)
+                running_kinds[task.kind] -= 1
+                try:
+                    result, seconds = future.result()
+                    report[task.name] = {'state': 'done', 'seconds': seconds, 'result': result}
+                    print(f"任务完成 {task.name}，耗时: {seconds:.2f}秒")
+                except Exception as e:
+                    report[task.name] = {'state': 'failed', 'seconds': 0.0, 'result': None}
+                    print(f"任务失败 {task.name}: {str(e)}")
+    return report
+
+
+def print_report(report):
+    """打印各任务的状态和耗时"""
+    names = {'done': '完成', 'skipped': '跳过', 'failed': '失败', 'blocked': '未执行'}
+    print(f"\n{'任务':<40} {'状态':>6} {'耗时(秒)':>10}")
+    for name, item in report.items():
+        print(f"{name:<40} {names[item['state']]:>6} {item['seconds']:>10.2f}")
+
+
+def _transcribe(video_file, vp_config, output_config):
+    """转写任务：命中转写缓存时直接恢复结果，返回字幕路径"""
+    from utils.video_processor import lookup_cached_results, transcribe_video
+    cache_config = vp_config.get('cache', {})
+    pending = lookup_cached_results([video_file], vp_config['whisper'], output_config, cache_config)
+    if video_file in pending:
+        transcribe_video(video_file, vp_config['whisper'], output_config, vp_config.get('decode', {}),
+                         vp_config.get('streaming', {}), pending[video_file], cache_config)
+    subtitle_path = Path(output_config['output_dir']) / video_file.stem / "subtitle.srt"
+    if not subtitle_path.exists():
+        raise RuntimeError(f"没有生成字幕 {subtitle_path}")
+    return subtitle_path
+
+
+def _merge_subtitle(video_file, subtitle_path, output_path, ms_config, profile=None):
+    """合并字幕任务，返回输出视频路径"""
+    from utils.merge_subtitle import merge_subtitle_to_video
+    burn_config = ms_config.get('burn', {})
+    if not merge_subtitle_to_video(video_file, subtitle_path, output_path,
+                                   burn_config.get('segments', 1), burn_config.get('workers', 0),
+                                   ms_config.get('mode', 'burn'), ms_config.get('language', 'chi'),
+                                   profile or ms_config.get('profile')):
+        raise RuntimeError(f"合并字幕失败 {video_file}")
+    return output_path
+
+
+def _concat(video_paths, output_path, reencode=False, profile=None, cache_max_mb=None):
+    """拼接片头片尾任务，返回输出视频路径"""
+    from utils.video_concat import concatenate_multiple_videos
+    if not concatenate_multiple_videos(video_paths, output_path, reencode=reencode, profile=profile,
+                                       cache_max_mb=cache_max_mb):
+        raise RuntimeError(f"拼接失败 {output_path}")
+    return output_path
+
+
+def build_video_tasks(video_files, pipeline_config, vp_config, ms_config):
+    """为每个视频生成 转写 → 合并字幕 → 拼接 三个任务"""
+    output_config = dict(vp_config['video']['output'], is_subtitle=True)
+    subtitled_dir = Path(pipeline_config.get('subtitled_dir', 'output_video/subtitled'))
+    final_dir = Path(pipeline_config.get('final_dir', 'output_video/final'))
+    intro = pipeline_config.get('intro')
+    outro = pipeline_config.get('outro')
+    # 烧录字幕后还要拼接时，烧录结果只是中间产物：用无损中间编码配置输出，
+    # 拼接时再统一按成品配置编码一次，不在两个阶段各付一次成品编码的代价
+    intermediate = pipeline_config.get('intermediate_profile')
+    use_intermediate = bool((intro or outro) and intermediate and ms_config.get('mode', 'burn') == 'burn')
+    merge_profile = intermediate if use_intermediate else None
+    final_profile = pipeline_config.get('profile')
+    from utils.video_concat import DEFAULT_CACHE_MAX_MB
+    cache_max_mb = pipeline_config.get('concat_cache_max_mb', DEFAULT_CACHE_MAX_MB)
+
+    tasks = []
+    for video_file in video_files:
+        stem = video_file.stem
+        subtitle_path = Path(output_config['output_dir']) / stem / "subtitle.srt"
+        merged_path = subtitled_dir / video_file.name
+        tasks.append(Task(
+            f"transcribe:{stem}", 'transcribe',
+            lambda v=video_file: _transcribe(v, vp_config, output_config),
+            outputs=[subtitle_path], sources=[video_file]))
+        tasks.append(Task(
+            f"subtitle:{stem}", 'subtitle',
+            lambda srt, v=video_file, out=merged_path: _merge_subtitle(v, srt, out, ms_config, merge_profile),
+            deps=[f"transcribe:{stem}"], outputs=[merged_path], sources=[video_file]))
+        if intro or outro:
+            final_path = final_dir / video_file.name
+            tasks.append(Task(
+                f"concat:{stem}", 'concat',
+                lambda merged, out=final_path: _concat([p for p in (intro, merged, outro) if p], out,
+                                                       use_intermediate, final_profile, cache_max_mb),
+                deps=[f"subtitle:{stem}"], outputs=[final_path], sources=[intro, outro]))
+    return tasks
+
+
+def begin_pipeline():
+    """运行视频处理流水线"""
+    from utils.video_processor import load_config as load_vp_config
+    from utils.merge_subtitle import load_config as load_ms_config
+    pipeline_config = load_config()
+    vp_config = load_vp_config()
+    ms_config = load_ms_config()
+    if not pipeline_config or not vp_config or not ms_config:
+        return
+
+    video_config = vp_config['video']
+    extensions = {ext.lower() for ext in video_config['extensions']}
+    video_files = sorted(f for f in Path(video_config['input_dir']).glob("*")
+                         if f.suffix.lower() in extensions)
+    if not video_files:
+        print("没有找到需要处理的视频文件")
+        return
+    Path(video_config['output']['output_dir']).mkdir(parents=True, exist_ok=True)
+
+    tasks = build_video_tasks(video_files, pipeline_config, vp_config, ms_config)
+    start = time.perf_counter()
+    report = run_pipeline(tasks, pipeline_config.get('workers', 4), pipeline_config.get('limits', {}))
+    print_report(report)
+    print(f"流水线总耗时: {time.perf_counter() - start:.2f}秒")
+    return report
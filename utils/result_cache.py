@@ -0,0 +1,182 @@
+"""转写结果缓存
+按 媒体文件内容哈希 + 模型名 + 转写参数 缓存字幕/文本结果，
+内容未变的视频（即使改了名字）直接恢复结果，无需加载whisper。
+
+"""
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# 文件内容哈希索引，按 (路径, 大小, 修改时间) 记录，避免每次运行都重新读取整个视频
+DIGEST_INDEX_NAME = "_digests.json"
+# 正在写入的缓存条目所在的临时目录前缀；超过 STALE_TMP_SECONDS 仍未完成的视为崩溃残留
+TMP_PREFIX = ".tmp-"
+STALE_TMP_SECONDS = 24 * 3600
+# 同一进程内多个线程（图片缓存、片段标准化、TTS等线程池）会同时更新哈希索引，
+# 读取-合并-写回必须互斥，否则后写入的一方会覆盖前者新增的记录
+_DIGEST_INDEX_LOCK = threading.Lock()
+
+
+def _load_digest_index(cache_dir):
+    """读取文件哈希索引"""
+    index_path = Path(cache_dir) / DIGEST_INDEX_NAME
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_digest_index(cache_dir, index):
+    """原子写入文件哈希索引"""
+    index_path = Path(cache_dir) / DIGEST_INDEX_NAME
+    fd, tmp_path = tempfile.mkstemp(prefix=f"{index_path.name}.", suffix='.tmp', dir=index_path.parent)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, index_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """计算文件内容哈希"""
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def media_digests(paths, cache_dir):
+    """批量获取文件内容哈希，只读写一次哈希索引
+
+    计算哈希时不持有锁，写回时在锁内重新读取索引并合并新记录，不丢失其他线程的更新。
+    """
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    with _DIGEST_INDEX_LOCK:
+        index = _load_digest_index(cache_dir)
+    digests = []
+    updates = {}
+    for path in paths:
+        path = Path(path)
+        stat = path.stat()
+        key = str(path.resolve())
+        entry = updates.get(key) or index.get(key)
+        if not (entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns):
+            entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'digest': file_digest(path)}
+            updates[key] = entry
+        digests.append(entry['digest'])
+    if updates:
+        with _DIGEST_INDEX_LOCK:
+            index = _load_digest_index(cache_dir)
+            index.update(updates)
+            _save_digest_index(cache_dir, index)
+    return digests
+
+
+def media_digest(path, cache_dir):
+    """获取媒体文件内容哈希，文件大小和修改时间未变时直接复用上次的结果"""
+    return media_digests([path], cache_dir)[0]
+
+
+def result_key(video_path, whisper_config, cache_dir):
+    """生成缓存键：内容哈希 + 模型名 + 转写参数"""
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    payload = json.dumps({
+        'media': media_digest(video_path, cache_dir),
+        'model': whisper_config['model'],
+        'options': whisper_config.get('transcribe_options') or {},
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def restore_result(key, one_output_dir, file_names, cache_dir):
+    """命中缓存时把结果文件复制到输出目录，返回是否命中"""
+    entry_dir = Path(cache_dir) / key
+    if not all((entry_dir / name).exists() for name in file_names):
+        return False
+
+    Path(one_output_dir).mkdir(parents=True, exist_ok=True)
+    try:
+        for name in file_names:
+            shutil.copyfile(entry_dir / name, Path(one_output_dir) / name)
+        # 更新访问时间，供LRU淘汰使用
+        os.utime(entry_dir)
+    except FileNotFoundError:
+        # 条目在复制途中被淘汰或被同名的新条目替换，按未命中处理
+        return False
+    return True
+
+
+def save_result(key, one_output_dir, file_names, cache_dir, max_size_mb=None):
+    """将输出目录中的结果文件存入缓存
+
+    先写入缓存目录下的临时目录，全部复制完成后再改名为条目目录，
+    中途崩溃只会留下临时目录，不会留下缺文件或文件不完整的条目。
+    """
+    entry_dir = Path(cache_dir) / key
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(prefix=f"{TMP_PREFIX}{key[:16]}.", dir=cache_dir))
+    try:
+        for name in file_names:
+            src = Path(one_output_dir) / name
+            if src.exists():
+                shutil.copyfile(src, tmp_dir / name)
+        # 已有同名条目时先删除（目录不能直接覆盖非空目录），restore_result 看到的要么是完整的旧条目，
+        # 要么没有条目，要么是完整的新条目
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        try:
+            os.replace(tmp_dir, entry_dir)
+        except OSError:
+            # 另一个进程刚好写入了同一条目，内容相同，保留对方的即可
+            if not entry_dir.is_dir():
+                raise
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    os.utime(entry_dir)
+    if max_size_mb:
+        evict(cache_dir, int(max_size_mb * 1024 * 1024))
+
+
+def _entry_size(entry_dir):
+    """缓存条目占用的字节数"""
+    return sum(f.stat().st_size for f in entry_dir.iterdir() if f.is_file())
+
+
+def evict(cache_dir, max_bytes):
+    """缓存总大小超过上限时，按最近使用时间淘汰最旧的条目；同时清理崩溃残留的临时目录"""
+    entries = []
+    for d in Path(cache_dir).iterdir():
+        if not d.is_dir():
+            continue
+        if d.name.startswith(TMP_PREFIX):
+            if time.time() - d.stat().st_mtime > STALE_TMP_SECONDS:
+                shutil.rmtree(d, ignore_errors=True)
+            continue
+        entries.append(d)
+    sizes = {d: _entry_size(d) for d in entries}
+    total = sum(sizes.values())
+    if total <= max_bytes:
+        return 0
+
+    removed = 0
+    for entry_dir in sorted(entries, key=lambda d: d.stat().st_mtime):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        total -= sizes[entry_dir]
+        removed += 1
+    print(f"转写缓存超出上限，已淘汰 {removed} 个条目")
+    return removed
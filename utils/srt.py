@@ -0,0 +1,41 @@
+"""SRT字幕时间的解析、格式化与读写
+转写、流式转写、分段烧录、合成和时间线共用这些函数，不依赖任何音视频处理模块。
+
+"""
+
+
+def parse_srt_time(value):
+    """把 00:01:02,345 解析为毫秒"""
+    hms, ms = value.strip().replace('.', ',').split(',')
+    hours, minutes, seconds = hms.split(':')
+    return ((int(hours) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + int(ms)
+
+
+def format_srt_time(ms, separator=','):
+    """把毫秒格式化为SRT时间，separator 为 '.' 时即WebVTT时间
+
+    所有字幕写出（转写、流式转写、分段烧录、合成）都使用这一个函数，同一时间戳的输出一致。
+    """
+    return f"{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d}{separator}{ms % 1000:03d}"
+
+
+def read_srt(subtitle_path):
+    """读取SRT字幕，返回 [(开始毫秒, 结束毫秒, 文本), ...]"""
+    with open(subtitle_path, 'r', encoding='utf-8-sig') as f:
+        blocks = f.read().replace('\r\n', '\n').split('\n\n')
+    cues = []
+    for block in blocks:
+        lines = [line for line in block.split('\n') if line.strip()]
+        timing = next((i for i, line in enumerate(lines) if '-->' in line), None)
+        if timing is None:
+            continue
+        start, end = lines[timing].split('-->')
+        cues.append((parse_srt_time(start), parse_srt_time(end.split()[0]), '\n'.join(lines[timing + 1:])))
+    return cues
+
+
+def write_srt(cues, subtitle_path):
+    """写出SRT字幕"""
+    with open(subtitle_path, 'w', encoding='utf-8') as f:
+        for i, (start, end, text) in enumerate(cues, start=1):
+            f.write(f"{i}\n{format_srt_time(start)} --> {format_srt_time(end)}\n{text}\n\n")
@@ -0,0 +1,208 @@
+"""分段并行烧录字幕
+在关键帧处把视频切成若干段，字幕也按分段拆开，每段由独立的ffmpeg进程并行烧录，
+最后用concat demuxer流复制拼接视频段，并直接复制原视频的音轨。
+
+每段从关键帧开始解码、按帧数截取，并保留原始时间戳（-copyts）、减去文件起始时间后送入字幕滤镜，
+与整段串行烧录时字幕滤镜看到的时间戳相同，字幕在每一帧上的显示与整段串行烧录完全一致。
+要求输入为闭合GOP（x264默认）。
+
+"""
+import os
+import math
+import bisect
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from fractions import Fraction
+from pathlib import Path
+from utils.media_info import probe
+from utils.encoder_profiles import container_args, video_args
+from utils.merge_subtitle import subtitle_filter
+from utils.srt import read_srt, write_srt
+from utils.telemetry import run_ffmpeg, span
+
+
+def split_srt(cues, boundaries):
+    """按分段时间范围拆分字幕
+
+    Args:
+        cues: read_srt 的结果
+        boundaries: 各分段起始时间（秒），最后一段一直到结尾
+
+    Returns:
+        list: 每个分段与其时间范围有重叠的字幕；跨越分段边界的字幕会同时出现在相邻两段中
+    """
+    pieces = []
+    for i, start in enumerate(boundaries):
+        start_ms = int(start * 1000)
+        end_ms = math.ceil(boundaries[i + 1] * 1000) if i + 1 < len(boundaries) else None
+        pieces.append([cue for cue in cues
+                       if cue[1] >= start_ms and (end_ms is None or cue[0] <= end_ms)])
+    return pieces
+
+
+def keyframe_index(video_path):
+    """读取视频流所有帧的显示时间戳和关键帧时间戳（只解复用，不解码）
+
+    Returns:
+        (time_base, 全部帧pts升序列表, 关键帧pts升序列表)
+    """
+    with span('probe', input=str(video_path)):
+        result = subprocess.run([
+            'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+            '-show_entries', 'stream=time_base:packet=pts,flags',
+            '-of', 'csv=p=0', str(video_path)
+        ], capture_output=True, text=True, check=True)
+    time_base = None
+    pts_list = []
+    keyframes = []
+    for line in result.stdout.splitlines():
+        fields = line.strip().split(',')
+        if len(fields) == 1 and '/' in fields[0]:
+            time_base = Fraction(fields[0])
+            continue
+        if len(fields) < 2 or fields[0] in ('', 'N/A'):
+            continue
+        pts = int(fields[0])
+        pts_list.append(pts)
+        if 'K' in fields[1]:
+            keyframes.append(pts)
+    pts_list.sort()
+    keyframes.sort()
+    return time_base, pts_list, keyframes
+
+
+def plan_chunks(time_base, pts_list, keyframes, segments):
+    """在关键帧处把视频均分为至多 segments 段
+
+    Returns:
+        list: [(起始关键帧pts, 帧数), ...]
+    """
+    if not pts_list or not keyframes:
+        return []
+    first, last = pts_list[0], pts_list[-1]
+    starts = [first]
+    for i in range(1, segments):
+        target = first + (last - first) * i // segments
+        k = bisect.bisect_left(keyframes, target)
+        if k < len(keyframes) and keyframes[k] > starts[-1]:
+            starts.append(keyframes[k])
+    chunks = []
+    for i, start in enumerate(starts):
+        begin = bisect.bisect_left(pts_list, start)
+        end = bisect.bisect_left(pts_list, starts[i + 1]) if i + 1 < len(starts) else len(pts_list)
+        chunks.append((start, end - begin))
+    return chunks
+
+
+def _seek_time(pts, time_base, start_time=0.0):
+    """关键帧相对文件起始时间的位置（-ss 以文件起始时间为零点），向上取整到微秒，保证定位到该关键帧而不是前一个"""
+    return f"{max(0.0, math.ceil((pts * time_base - Fraction(start_time)) * 1000000) / 1000000):.6f}"
+
+
+def burn_chunk(video_path, subtitle_path, output_path, start, frame_count, timescale, threads, profile=None,
+               start_time=0.0):
+    """烧录单个分段：从关键帧开始解码 frame_count 帧，时间戳减去文件起始时间后送入字幕滤镜
+
+    时间戳在解复用时（-itsoffset）平移，不经过setpts滤镜，帧时长得以保留，段末帧不会在封装时被丢弃；
+    输出时再把分段的第一帧平移到0。
+    """
+    run_ffmpeg([
+        'ffmpeg', '-y', '-v', 'error',
+        '-noaccurate_seek', '-ss', start, '-itsoffset', f"{-start_time:.6f}", '-copyts',
+        '-i', str(video_path),
+        '-map', '0:v:0',
+        '-vf', subtitle_filter(subtitle_path),
+        '-frames:v', str(frame_count),
+        '-fps_mode', 'passthrough'
+    ] + video_args(profile, pix_fmt=None, threads=threads) + [
+        '-video_track_timescale', str(timescale),
+        '-avoid_negative_ts', 'make_zero',
+        '-an',
+        str(output_path)
+    ], 'render', output=str(output_path))
+    return output_path
+
+
+def write_chunk_list(chunk_paths, starts, time_base, filelist_path):
+    """生成带分段时长的concat列表，starts 比 chunk_paths 多一个元素（最后一段为None）"""
+    with open(filelist_path, 'w', encoding='utf-8') as f:
+        f.write("ffconcat version 1.0\n")
+        for i, chunk_path in enumerate(chunk_paths):
+            escaped = str(Path(chunk_path).absolute()).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+            if starts[i + 1] is not None:
+                f.write(f"duration {float((starts[i + 1] - starts[i]) * time_base):.6f}\n")
+
+
+def burn_subtitle_segmented(video_path, subtitle_path, output_path, segments=0, workers=0, temp_dir="temp",
+                            profile=None):
+    """
+    分段并行烧录字幕
+
+    Args:
+        video_path: 输入视频
+        subtitle_path: SRT字幕
+        output_path: 输出视频
+        segments: 分段数，0为CPU核数
+        workers: 同时烧录的分段数，0为CPU核数
+        profile: 编码配置名（见 utils.encoder_profiles）
+
+    Returns:
+        bool: 分段数不足两段时返回False，由调用方改用串行烧录
+    """
+    cpu_count = os.cpu_count() or 1
+    segments = segments or cpu_count
+    info = probe(video_path)
+    if info is None or info.video is None:
+        return False
+
+    time_base, pts_list, keyframes = keyframe_index(video_path)
+    time_base = time_base or Fraction(info.video.time_base)
+    chunks = plan_chunks(time_base, pts_list, keyframes, segments)
+    if len(chunks) < 2:
+        print("关键帧太少，无法分段烧录")
+        return False
+
+    # -copyts 保留的是原始时间戳，串行烧录时ffmpeg会减去文件起始时间，分段烧录也要按起始时间换算
+    start_time = info.start_time or 0.0
+    boundaries = [float(start * time_base) - start_time for start, _ in chunks]
+    pieces = split_srt(read_srt(subtitle_path), boundaries)
+    workers = max(1, min(workers or cpu_count, len(chunks)))
+    threads = max(1, cpu_count // workers)
+
+    Path(temp_dir).mkdir(exist_ok=True)
+    work_dir = Path(tempfile.mkdtemp(prefix="burn_", dir=temp_dir))
+    try:
+        print(f"分 {len(chunks)} 段并行烧录字幕，并发数 {workers}")
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = []
+            for i, ((start, frame_count), cues) in enumerate(zip(chunks, pieces)):
+                piece_path = work_dir / f"piece_{i}.srt"
+                write_srt(cues, piece_path)
+                futures.append(pool.submit(burn_chunk, video_path, piece_path, work_dir / f"chunk_{i}.mp4",
+                                           _seek_time(start, time_base, start_time), frame_count,
+                                           time_base.denominator, threads, profile, start_time))
+            chunk_paths = [future.result() for future in futures]
+
+        # 视频段流复制拼接，音轨直接复制原视频；
+        # 按下一段起始关键帧写明每段时长，避免段末帧时长丢失导致时间戳错位
+        filelist_path = work_dir / "filelist.txt"
+        write_chunk_list(chunk_paths, [start for start, _ in chunks] + [None], time_base, filelist_path)
+        run_ffmpeg([
+            'ffmpeg', '-y', '-v', 'error',
+            '-f', 'concat', '-safe', '0', '-i', str(filelist_path),
+            '-i', str(video_path),
+            '-map', '0:v:0', '-map', '1:a?',
+            '-c', 'copy'
+        ] + container_args(profile) + [
+            str(output_path)
+        ], 'mux', output=str(output_path))
+        return True
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        try:
+            Path(temp_dir).rmdir()
+        except OSError:
+            pass
@@ -0,0 +1,229 @@
+"""运行时遥测
+为各环节（probe/decode/transcribe/render/mux）记录耗时区间（span），
+解析ffmpeg的 -progress 输出得到实时帧率、速度和剩余时间，
+并以结构化JSON日志（每行一个事件）和可选的Prometheus文本格式文件输出。
+
+配置见 config/telemetry.yaml；配置文件不存在时只打印进度，不写日志。
+"""
+import json
+import multiprocessing
+import os
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+import yaml
+
+DEFAULT_SETTINGS = {
+    'log_path': None,
+    'prometheus_path': None,
+    'progress': True,
+    'progress_interval': 5.0,
+}
+
+_lock = threading.Lock()
+_local = threading.local()
+_settings = None
+# 各环节累计值：{stage: {'runs', 'failures', 'seconds', 'media_seconds'}}
+_totals = {}
+
+
+def load_config(config_path='config/telemetry.yaml'):
+    """加载遥测配置，缺失的项使用默认值"""
+    settings = dict(DEFAULT_SETTINGS)
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            settings.update(yaml.safe_load(f) or {})
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"加载遥测配置失败: {str(e)}")
+    return settings
+
+
+def configure(**settings):
+    """覆盖遥测配置（如命令行或测试中指定日志路径）"""
+    global _settings
+    with _lock:
+        _settings = {**get_settings(), **settings}
+
+
+def get_settings():
+    global _settings
+    if _settings is None:
+        _settings = load_config()
+    return _settings
+
+
+def log_event(event, **fields):
+    """写入一条结构化日志"""
+    log_path = get_settings().get('log_path')
+    if not log_path:
+        return
+    record = {'ts': round(time.time(), 3), 'event': event, 'pid': os.getpid(), **fields}
+    line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+    with _lock:
+        os.makedirs(os.path.dirname(log_path) or '.', exist_ok=True)
+        with open(log_path, 'a', encoding='utf-8') as f:
+            f.write(line)
+
+
+@contextmanager
+def span(stage, **attrs):
+    """记录一个环节的耗时
+
+    with 块内可向返回的字典写入 media_seconds（处理的媒体时长），用于计算吞吐量（倍速），
+    也可写入其他字段，一并记录到日志。嵌套的 span 会记录父环节。
+    """
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    fields = dict(attrs)
+    parent = stack[-1] if stack else None
+    stack.append(stage)
+    start = time.perf_counter()
+    status = 'ok'
+    try:
+        yield fields
+    except BaseException:
+        status = 'error'
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        stack.pop()
+        _record(stage, seconds, fields.get('media_seconds'), status)
+        if parent:
+            fields['parent'] = parent
+        if fields.get('media_seconds') and seconds > 0:
+            fields['speed'] = round(fields['media_seconds'] / seconds, 3)
+        log_event('span', stage=stage, seconds=round(seconds, 3), status=status, **fields)
+        # 进程池中的子进程只写日志，指标文件由主进程维护，避免互相覆盖
+        if get_settings().get('prometheus_path') and multiprocessing.parent_process() is None:
+            write_prometheus(get_settings()['prometheus_path'])
+
+
+def _record(stage, seconds, media_seconds, status):
+    with _lock:
+        totals = _totals.setdefault(stage, {'runs': 0, 'failures': 0, 'seconds': 0.0, 'media_seconds': 0.0})
+        totals['runs'] += 1
+        totals['failures'] += status != 'ok'
+        totals['seconds'] += seconds
+        totals['media_seconds'] += media_seconds or 0.0
+
+
+def stage_totals():
+    """各环节的累计运行次数、耗时和处理的媒体时长"""
+    with _lock:
+        return {stage: dict(totals) for stage, totals in _totals.items()}
+
+
+def write_prometheus(path):
+    """把累计指标写成Prometheus文本格式（先写临时文件再改名，采集方不会读到半个文件）"""
+    metrics = (
+        ('video_stage_runs_total', 'counter', "环节运行次数", 'runs'),
+        ('video_stage_failures_total', 'counter', "环节失败次数", 'failures'),
+        ('video_stage_seconds_total', 'counter', "环节累计耗时（秒）", 'seconds'),
+        ('video_stage_media_seconds_total', 'counter', "环节累计处理的媒体时长（秒）", 'media_seconds'),
+    )
+    totals = stage_totals()
+    lines = []
+    for name, kind, help_text, key in metrics:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for stage, values in sorted(totals.items()):
+            lines.append(f'{name}{{stage="{stage}"}} {values[key]:g}')
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp_path, path)
+
+
+def parse_progress(lines):
+    """把ffmpeg -progress 输出解析为进度快照，每遇到 progress=continue/end 产出一个字典"""
+    block = {}
+    for line in lines:
+        key, sep, value = line.strip().partition('=')
+        if not sep:
+            continue
+        block[key] = value.strip()
+        if key == 'progress':
+            yield block
+            block = {}
+
+
+def _progress_fields(block, duration, elapsed):
+    """从进度快照中取出已处理时长、帧率、速度和剩余时间"""
+    fields = {}
+    out_time_us = block.get('out_time_us', '')
+    if out_time_us.lstrip('-').isdigit() and int(out_time_us) > 0:
+        fields['out_seconds'] = int(out_time_us) / 1000000
+    if block.get('frame', '').isdigit():
+        fields['frame'] = int(block['frame'])
+    try:
+        fields['fps'] = float(block.get('fps', ''))
+    except ValueError:
+        pass
+    out_seconds = fields.get('out_seconds')
+    if out_seconds and elapsed > 0:
+        # ffmpeg输出的speed是平滑后的值且可能为N/A，用已处理时长/已用时间计算更稳定
+        fields['speed'] = round(out_seconds / elapsed, 3)
+        if duration:
+            fields['eta_seconds'] = round(max(0.0, duration - out_seconds) / fields['speed'], 1)
+    return fields
+
+
+def run_ffmpeg(cmd, stage, duration=None, **attrs):
+    """运行ffmpeg并记录进度，失败时与 subprocess.run(check=True) 一样抛出 CalledProcessError
+
+    Args:
+        cmd: 以 'ffmpeg' 开头的命令
+        stage: 环节名（render/mux/decode ...）
+        duration: 预计输出时长（秒），用于估算剩余时间
+        attrs: 附加到日志的字段（如输出路径）
+
+    stdin 已关闭，输出文件存在时ffmpeg无法询问是否覆盖，会直接退出且返回0，
+    因此这里统一加上 -y -nostdin，调用方不会因漏写 -y 而留下旧文件。
+    """
+    settings = get_settings()
+    cmd = [str(arg) for arg in cmd]
+    global_args = [arg for arg in ('-y', '-nostdin') if arg not in cmd]
+    cmd = cmd[:1] + global_args + ['-progress', 'pipe:1', '-nostats'] + cmd[1:]
+    interval = float(settings.get('progress_interval') or 0)
+    with span(stage, **attrs) as fields:
+        start = time.perf_counter()
+        last_report = start
+        latest = {}
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stdin=subprocess.DEVNULL, text=True)
+        try:
+            for block in parse_progress(process.stdout):
+                now = time.perf_counter()
+                latest = _progress_fields(block, duration, now - start)
+                if block.get('progress') != 'end' and now - last_report >= interval:
+                    last_report = now
+                    _report_progress(stage, latest, duration, attrs)
+        finally:
+            process.stdout.close()
+            returncode = process.wait()
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, cmd)
+        if latest.get('out_seconds'):
+            fields['media_seconds'] = round(latest['out_seconds'], 3)
+        if 'frame' in latest:
+            fields['frames'] = latest['frame']
+
+
+def _report_progress(stage, progress, duration, attrs):
+    log_event('progress', stage=stage, **progress, **attrs)
+    if not get_settings().get('progress', True):
+        return
+    done = progress.get('out_seconds', 0.0)
+    parts = [f"[{stage}] {done:.1f}s" + (f"/{duration:.1f}s" if duration else "")]
+    if 'fps' in progress:
+        parts.append(f"{progress['fps']:.1f} fps")
+    if 'speed' in progress:
+        parts.append(f"{progress['speed']:.2f}x")
+    if 'eta_seconds' in progress:
+        parts.append(f"剩余 {progress['eta_seconds']:.0f}s")
+    print("  ".join(parts))
@@ -0,0 +1,209 @@
+"""按旁白时长排列幻灯片
+每张图片的显示时长由对应的旁白片段（或字幕条目）决定，而不是固定的 duration_per_image。
+片段时长从文件头读取（经过探测缓存），不解码音频；
+画面、旁白和背景音在一次ffmpeg调用中完成，不再先渲染视频再截取或补齐音频。
+旁白片段用concat demuxer按顺序读取，它按第一个片段的格式解码所有片段，
+片段的编码、采样率或声道数不一致时先统一转换为PCM WAV。
+
+"""
+import os
+import shutil
+import tempfile
+from utils.audio_bed import audio_bed_filter, audio_bed_inputs
+from utils.images_to_video import (
+    _escape_concat_path,
+    build_slideshow_filter,
+    get_audio_files,
+    get_sorted_images,
+    prepare_image_inputs,
+    write_image_concat_list,
+)
+from utils.encoder_profiles import audio_args, container_args, video_args
+from utils.media_info import probe_many
+from utils.telemetry import run_ffmpeg
+
+
+def get_sorted_narration(narration_dir):
+    """获取按文件名数字排序的旁白片段（0.wav, 1.wav, ...，与图片一一对应）"""
+    return sorted(get_audio_files(narration_dir),
+                  key=lambda x: int(os.path.splitext(os.path.basename(x))[0]))
+
+
+def probe_narration(clip_paths):
+    """从文件头读取每个旁白片段的信息（经过探测缓存），缺少音频流或时长时报错"""
+    infos = probe_many(clip_paths)
+    for path, info in zip(clip_paths, infos):
+        if info is None or not info.duration or info.audio is None:
+            raise ValueError(f"无法读取旁白时长: {path}")
+    return infos
+
+
+def narration_durations(clip_paths):
+    """从文件头读取每个旁白片段的时长（秒）"""
+    return [info.duration for info in probe_narration(clip_paths)]
+
+
+def narration_format(info):
+    """concat demuxer能否连续解码取决于的音频参数"""
+    audio = info.audio
+    return audio.codec_name, audio.sample_rate, audio.channels, audio.channel_layout
+
+
+def conform_narration(clip_paths, infos, work_dir):
+    """旁白片段格式一致时原样返回；否则全部转换为同一采样率和声道数的PCM WAV，返回转换后的路径"""
+    formats = {narration_format(info) for info in infos}
+    if len(formats) == 1:
+        return list(clip_paths)
+
+    sample_rate = max(info.audio.sample_rate or 0 for info in infos) or 48000
+    channels = max(info.audio.channels or 0 for info in infos) or 1
+    print(f"旁白片段格式不一致（{len(formats)} 种），统一转换为 {sample_rate}Hz {channels}声道 WAV")
+    conformed = []
+    for i, (clip_path, info) in enumerate(zip(clip_paths, infos)):
+        output_path = os.path.join(work_dir, f"narration_{i}.wav")
+        run_ffmpeg(['ffmpeg', '-y', '-v', 'error', '-i', clip_path, '-map', '0:a:0',
+                    '-ar', str(sample_rate), '-ac', str(channels), '-c:a', 'pcm_s16le', output_path],
+                   'decode', duration=info.duration, input=clip_path)
+        conformed.append(output_path)
+    return conformed
+
+
+def cue_durations(subtitle_path, image_count):
+    """按字幕条目计算每张图片的时长：第i张图片从第i条字幕开始，到下一条字幕开始时结束
+
+    第一张图片从0秒开始，最后一张图片到最后一条字幕结束时结束。
+    """
+    from utils.srt import read_srt
+    cues = read_srt(subtitle_path)
+    if len(cues) != image_count:
+        raise ValueError(f"字幕条数（{len(cues)}）与图片数量（{image_count}）不一致")
+    starts = [0] + [start for start, _, _ in cues[1:]]
+    ends = starts[1:] + [cues[-1][1]]
+    return [(end - start) / 1000 for start, end in zip(starts, ends)]
+
+
+def align_to_frames(durations, fps):
+    """按累计时间取整到帧，避免逐张取整造成的累计漂移，返回每张图片的帧数"""
+    frames = []
+    elapsed = 0.0
+    previous = 0
+    for duration in durations:
+        elapsed += duration
+        boundary = round(elapsed * fps)
+        frames.append(max(1, boundary - previous))
+        previous += frames[-1]
+    return frames
+
+
+def write_narration_concat_list(clip_paths, slot_durations, list_path):
+    """旁白片段列表：每个片段占用对应图片的时长，片段之间的空隙由 aresample 补静音"""
+    with open(list_path, 'w', encoding='utf-8') as f:
+        f.write("ffconcat version 1.0\n")
+        for clip_path, duration in zip(clip_paths, slot_durations):
+            f.write(f"file '{_escape_concat_path(clip_path)}'\n")
+            f.write(f"duration {duration:.6f}\n")
+
+
+def create_video_timeline(images_dir="input_images",
+                          output_path="output/combined_video.mp4",
+                          fps=24,
+                          narration_dir=None,
+                          subtitle_path=None,
+                          narration_audio=None,
+                          gap=0.0,
+                          audio_dir=None,
+                          audio_count=1,
+                          audio_gains=None,
+                          audio_fade_in=0.0,
+                          audio_fade_out=0.0,
+                          resolution=None,
+                          image_cache_dir=None,
+                          profile=None
+                          ):
+    """
+    按旁白时长创建幻灯片视频
+
+    Args:
+        narration_dir: 旁白片段目录（0.wav, 1.wav, ...），每个片段对应一张图片
+        subtitle_path: 不使用旁白片段时，按SRT字幕条目决定每张图片的时长
+        narration_audio: 与字幕对应的整段旁白音频（可选）
+        gap: 使用旁白片段时，每个片段之后的停顿（秒）
+        audio_dir: 背景音目录（可选），循环、截取到视频时长后与旁白混合
+        其余参数与 create_video_with_ffmpeg 相同
+    """
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    image_files = get_sorted_images(images_dir)
+    if not image_files:
+        raise ValueError(f"在 {images_dir} 中没有找到图片文件")
+
+    clip_paths = []
+    clip_infos = []
+    if narration_dir:
+        clip_paths = get_sorted_narration(narration_dir)
+        if len(clip_paths) != len(image_files):
+            raise ValueError(f"旁白片段数量（{len(clip_paths)}）与图片数量（{len(image_files)}）不一致")
+        clip_infos = probe_narration(clip_paths)
+        durations = [info.duration + gap for info in clip_infos]
+    elif subtitle_path:
+        durations = cue_durations(subtitle_path, len(image_files))
+    else:
+        raise ValueError("需要指定旁白片段目录或字幕文件")
+
+    frame_counts = align_to_frames(durations, fps)
+    slot_durations = [n / fps for n in frame_counts]
+    video_duration = sum(frame_counts) / fps
+    bed_files = get_audio_files(audio_dir)[:audio_count] if audio_dir else []
+    image_files, (width, height) = prepare_image_inputs(image_files, resolution, image_cache_dir)
+    print(f"找到 {len(image_files)} 张图片，按旁白排列后视频时长: {video_duration:.2f} 秒，"
+          f"分辨率: {width}x{height}")
+
+    work_dir = tempfile.mkdtemp(prefix="timeline_")
+    try:
+        image_list = os.path.join(work_dir, "images.txt")
+        write_image_concat_list(image_files, slot_durations, image_list)
+        cmd = ['ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', image_list]
+        filters = [f"[0:v]{build_slideshow_filter(width, height, fps)}[v]"]
+
+        narration_input = None
+        if clip_paths:
+            narration_list = os.path.join(work_dir, "narration.txt")
+            write_narration_concat_list(conform_narration(clip_paths, clip_infos, work_dir),
+                                        slot_durations, narration_list)
+            cmd += ['-f', 'concat', '-safe', '0', '-i', narration_list]
+            narration_input = 1
+        elif narration_audio:
+            cmd += ['-i', narration_audio]
+            narration_input = 1
+        if narration_input is not None:
+            # 补齐片段之间的空隙和结尾，保证旁白与图片时间轴对齐
+            filters.append(f"[{narration_input}:a]aresample=async=1:first_pts=0,"
+                           f"apad,atrim=0:{video_duration:.6f}[narration]")
+
+        if bed_files:
+            first = 1 if narration_input is None else 2
+            cmd += audio_bed_inputs(bed_files)
+            filters.append(audio_bed_filter(len(bed_files), video_duration, first,
+                                            audio_gains, audio_fade_in, audio_fade_out, output_label="bed"))
+        if narration_input is not None and bed_files:
+            filters.append("[narration][bed]amix=inputs=2:duration=first:normalize=0[a]")
+            audio_label = "[a]"
+        elif narration_input is not None:
+            audio_label = "[narration]"
+        elif bed_files:
+            audio_label = "[bed]"
+        else:
+            audio_label = None
+
+        cmd += ['-filter_complex', ';'.join(filters), '-map', '[v]']
+        if audio_label:
+            cmd += ['-map', audio_label] + audio_args(profile)
+        cmd += ['-t', f"{video_duration:.6f}"] + video_args(profile) + container_args(profile) + [output_path]
+        print(f"\n正在输出视频到: {output_path}")
+        run_ffmpeg(cmd, 'render', duration=video_duration, output=output_path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"\n✅ 视频创建完成: {output_path}")
+    print(f"   - 图片数量: {len(image_files)}")
+    print(f"   - 视频时长: {video_duration:.2f}秒")
+    return [n / fps for n in frame_counts]
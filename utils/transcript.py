@@ -0,0 +1,330 @@
+"""转写结果的数据模型、输出与检索
+Transcript 用紧凑数组保存各段的起止时间（毫秒）和文本，一次遍历同时生成
+SRT/VTT字幕、纯文本和JSON，并为每个视频写出检索索引 index.json（段时间戳 + 字符/二元组倒排表）。
+
+跨视频检索时先在输出目录的SQLite目录表中按二元组筛出候选视频，
+只读取候选视频的 index.json 确认短语并取出时间戳，不需要逐个读取全部转写结果。
+
+"""
+import os
+import re
+import json
+import sqlite3
+from array import array
+from pathlib import Path
+from utils.srt import format_srt_time, read_srt
+
+INDEX_NAME = "index.json"
+CATALOG_NAME = ".search.sqlite3"
+# 索引格式变化时修改版本号，目录表会重新收录
+INDEX_VERSION = 1
+
+# 检索时忽略大小写、空白和标点，中文按字、其他文字按字母数字切分
+_IGNORED = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def count_chinese_chars(text):
+    """统计中文字符数量"""
+    return sum(1 for char in text if '\u4e00' <= char <= '\u9fff')
+
+
+def normalize(text):
+    """检索用的规范化文本：小写并去掉空白和标点"""
+    return _IGNORED.sub('', text.lower())
+
+
+def text_grams(text):
+    """规范化文本中的全部单字和相邻二元组"""
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+
+def query_grams(phrase):
+    """短语检索使用的二元组（单字短语使用单字），全部命中才可能包含该短语"""
+    text = normalize(phrase)
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class Transcript:
+    """一段转写结果：起止时间为毫秒整数数组，文本为去掉首尾空白后的列表"""
+    __slots__ = ('starts', 'ends', 'texts')
+
+    def __init__(self, starts=(), ends=(), texts=()):
+        self.starts = array('q', starts)
+        self.ends = array('q', ends)
+        self.texts = list(texts)
+
+    @classmethod
+    def from_segments(cls, segments):
+        """从whisper的 result['segments']（或 (开始秒, 结束秒, 文本) 元组）构造"""
+        transcript = cls()
+        for segment in segments:
+            if isinstance(segment, dict):
+                start, end, text = segment['start'], segment['end'], segment['text']
+            else:
+                start, end, text = segment
+            transcript.append(start, end, text)
+        return transcript
+
+    @classmethod
+    def from_srt(cls, subtitle_path):
+        """从SRT字幕构造（用于为已有的转写结果补建索引）"""
+        transcript = cls()
+        for start, end, text in read_srt(subtitle_path):
+            transcript.starts.append(start)
+            transcript.ends.append(end)
+            transcript.texts.append(text.strip())
+        return transcript
+
+    def append(self, start, end, text):
+        """追加一段，时间单位为秒"""
+        self.starts.append(round(start * 1000))
+        self.ends.append(round(end * 1000))
+        self.texts.append(text.strip())
+
+    def __len__(self):
+        return len(self.texts)
+
+    @property
+    def duration(self):
+        return self.ends[-1] / 1000 if self.ends else 0.0
+
+    def render(self, srt=True, vtt=False, text=True):
+        """一次遍历生成各种格式
+
+        Returns:
+            dict: {'srt': str, 'vtt': str, 'text': str, 'char_count': int}，未请求的格式不生成
+        """
+        srt_parts = [] if srt else None
+        vtt_parts = ["WEBVTT\n\n"] if vtt else None
+        text_parts = [] if text else None
+        char_count = 0
+        for i, (start, end, content) in enumerate(zip(self.starts, self.ends, self.texts), start=1):
+            if srt_parts is not None:
+                srt_parts.append(f"{i}\n{format_srt_time(start)} --> {format_srt_time(end)}\n{content}\n\n")
+            if vtt_parts is not None:
+                vtt_parts.append(f"{format_srt_time(start, '.')} --> {format_srt_time(end, '.')}\n{content}\n\n")
+            if text_parts is not None:
+                text_parts.append(f"{content}，")
+                char_count += count_chinese_chars(content)
+        rendered = {'char_count': char_count}
+        if srt_parts is not None:
+            rendered['srt'] = ''.join(srt_parts)
+        if vtt_parts is not None:
+            rendered['vtt'] = ''.join(vtt_parts)
+        if text_parts is not None:
+            rendered['text'] = ''.join(text_parts)
+        return rendered
+
+    def build_index(self):
+        """检索索引：各段时间戳、文本和 单字/二元组 → 段序号 的倒排表"""
+        postings = {}
+        for i, content in enumerate(self.texts):
+            for gram in text_grams(normalize(content)):
+                postings.setdefault(gram, []).append(i)
+        return {
+            'version': INDEX_VERSION,
+            'starts': self.starts.tolist(),
+            'ends': self.ends.tolist(),
+            'texts': self.texts,
+            'grams': postings,
+        }
+
+
+def _write_text(path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(data)
+
+
+def write_info(one_output_dir, text, char_count, transcript=None):
+    """写出 info.json：全文、中文字数，有分段结果时附带时长和各段时间戳"""
+    info = {'text': text, 'char_count': char_count}
+    if transcript is not None:
+        info['duration'] = transcript.duration
+        info['segments'] = [{'start': start / 1000, 'end': end / 1000, 'text': content}
+                            for start, end, content in zip(transcript.starts, transcript.ends, transcript.texts)]
+    with open(Path(one_output_dir) / "info.json", 'w', encoding='utf-8') as f:
+        json.dump(info, f, ensure_ascii=False)
+
+
+def write_outputs(transcript, one_output_dir, output_config):
+    """按输出配置一次写出 subtitle.srt / subtitle.vtt / text.txt / info.json / index.json
+
+    Returns:
+        int: 中文字符数
+    """
+    one_output_dir = Path(one_output_dir)
+    rendered = transcript.render(srt=output_config['is_subtitle'], vtt=output_config.get('is_vtt', False),
+                                 text=output_config['is_text'])
+    if 'srt' in rendered:
+        _write_text(one_output_dir / "subtitle.srt", rendered['srt'])
+    if 'vtt' in rendered:
+        _write_text(one_output_dir / "subtitle.vtt", rendered['vtt'])
+    if 'text' in rendered:
+        _write_text(one_output_dir / "text.txt", rendered['text'])
+        print(f"文本总字数: {rendered['char_count']}")
+        write_info(one_output_dir, rendered['text'], rendered['char_count'], transcript)
+    if output_config.get('is_index', True):
+        write_index(transcript, one_output_dir)
+    return rendered['char_count']
+
+
+def write_index(transcript, one_output_dir):
+    """写出检索索引（先写临时文件再改名，检索时不会读到半个文件）"""
+    index_path = Path(one_output_dir) / INDEX_NAME
+    tmp_path = index_path.with_name(f"{INDEX_NAME}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(transcript.build_index(), f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, index_path)
+    return index_path
+
+
+def load_index(index_path):
+    with open(index_path, 'r', encoding='utf-8') as f:
+        index = json.load(f)
+    return index if index.get('version') == INDEX_VERSION else None
+
+
+def _open_catalog(processed_dir):
+    conn = sqlite3.connect(Path(processed_dir) / CATALOG_NAME, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS videos (
+            name TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            version INTEGER NOT NULL
+        )
+    """)
+    conn.execute("CREATE TABLE IF NOT EXISTS grams (gram TEXT NOT NULL, name TEXT NOT NULL)")
+    conn.execute("CREATE INDEX IF NOT EXISTS grams_gram ON grams (gram)")
+    conn.execute("CREATE INDEX IF NOT EXISTS grams_name ON grams (name)")
+    return conn
+
+
+def sync_catalog(processed_dir):
+    """把新增或变化的 index.json 收录进目录表，删除已不存在的视频；只读取有变化的索引文件
+
+    Returns:
+        sqlite3.Connection
+    """
+    processed_dir = Path(processed_dir)
+    conn = _open_catalog(processed_dir)
+    known = {name: (size, mtime_ns, version)
+             for name, size, mtime_ns, version in conn.execute("SELECT name, size, mtime_ns, version FROM videos")}
+    current = {}
+    with os.scandir(processed_dir) as entries:
+        for entry in entries:
+            if not entry.is_dir():
+                continue
+            try:
+                stat = os.stat(os.path.join(entry.path, INDEX_NAME))
+            except OSError:
+                continue
+            current[entry.name] = stat
+
+    changed = [name for name, stat in current.items()
+               if known.get(name) != (stat.st_size, stat.st_mtime_ns, INDEX_VERSION)]
+    removed = [name for name in known if name not in current]
+    if changed or removed:
+        with conn:
+            for name in removed + changed:
+                conn.execute("DELETE FROM grams WHERE name = ?", (name,))
+                conn.execute("DELETE FROM videos WHERE name = ?", (name,))
+            for name in changed:
+                index = load_index(processed_dir / name / INDEX_NAME)
+                if index is None:
+                    continue
+                conn.executemany("INSERT INTO grams (gram, name) VALUES (?, ?)",
+                                 ((gram, name) for gram in index['grams']))
+                stat = current[name]
+                conn.execute("INSERT INTO videos (name, size, mtime_ns, version) VALUES (?, ?, ?, ?)",
+                             (name, stat.st_size, stat.st_mtime_ns, INDEX_VERSION))
+        print(f"检索目录更新: 收录 {len(changed)} 个，移除 {len(removed)} 个")
+    return conn
+
+
+def candidate_videos(conn, grams):
+    """包含全部二元组的视频"""
+    grams = sorted(grams)
+    placeholders = ','.join('?' * len(grams))
+    rows = conn.execute(f"SELECT name FROM grams WHERE gram IN ({placeholders}) "
+                        f"GROUP BY name HAVING COUNT(DISTINCT gram) = ?", grams + [len(grams)])
+    return sorted(name for name, in rows)
+
+
+def search_index(index, phrase):
+    """在单个视频的索引中查找短语（短语需在同一段内），返回 [(开始秒, 结束秒, 文本), ...]"""
+    target = normalize(phrase)
+    grams = query_grams(phrase)
+    candidates = None
+    for gram in grams:
+        posting = set(index['grams'].get(gram, ()))
+        candidates = posting if candidates is None else candidates & posting
+        if not candidates:
+            return []
+    return [(index['starts'][i] / 1000, index['ends'][i] / 1000, index['texts'][i])
+            for i in sorted(candidates) if target in normalize(index['texts'][i])]
+
+
+def search(processed_dir, phrase, limit=None):
+    """在输出目录的全部转写结果中检索短语
+
+    Returns:
+        list: [(视频名, 开始秒, 结束秒, 文本), ...]，按视频名和时间排序
+    """
+    grams = query_grams(phrase)
+    if not grams:
+        return []
+    conn = sync_catalog(processed_dir)
+    try:
+        names = candidate_videos(conn, grams)
+    finally:
+        conn.close()
+    matches = []
+    for name in names:
+        index = load_index(Path(processed_dir) / name / INDEX_NAME)
+        if index is None:
+            continue
+        matches.extend((name, start, end, text) for start, end, text in search_index(index, phrase))
+        if limit and len(matches) >= limit:
+            return matches[:limit]
+    return matches
+
+
+def reindex(processed_dir):
+    """为已有的转写结果（只有 subtitle.srt）补建 index.json"""
+    count = 0
+    for subtitle_path in sorted(Path(processed_dir).glob("*/subtitle.srt")):
+        index_path = subtitle_path.with_name(INDEX_NAME)
+        if index_path.exists() and index_path.stat().st_mtime_ns >= subtitle_path.stat().st_mtime_ns:
+            continue
+        write_index(Transcript.from_srt(subtitle_path), subtitle_path.parent)
+        count += 1
+    print(f"补建索引 {count} 个")
+    return count
+
+
+def print_matches(matches):
+    for name, start, end, text in matches:
+        print(f"{name}  {format_srt_time(round(start * 1000))} --> {format_srt_time(round(end * 1000))}  {text}")
+    print(f"共找到 {len(matches)} 处")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="检索转写结果")
+    parser.add_argument('phrase', nargs='?', help="要查找的短语")
+    parser.add_argument('--dir', default="output_video/processed", help="转写输出目录")
+    parser.add_argument('--limit', type=int, default=None)
+    parser.add_argument('--reindex', action='store_true', help="为只有 subtitle.srt 的旧结果补建索引")
+    args = parser.parse_args()
+
+    if args.reindex:
+        reindex(args.dir)
+    if args.phrase:
+        print_matches(search(args.dir, args.phrase, args.limit))
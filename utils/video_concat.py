@@ -1,224 +1,492 @@
 import os
+import json
+import shutil
+import hashlib
 import subprocess
+import tempfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from utils.encoder_profiles import DEFAULT_PROFILE, is_lossless, video_args
+from utils.media_info import probe, probe_many
+from utils.result_cache import media_digests
+from utils.telemetry import run_ffmpeg
 
-def concatenate_videos(video1_path, video2_path, output_path, temp_dir="temp"):
+# 归一化片段缓存的默认容量上限（MB），超出后按最近使用时间淘汰
+DEFAULT_CACHE_MAX_MB = 2048
+
+# 代价估算参数：流复制的读写吞吐（MB/秒），libx264 medium 编码1080p的速度（帧/秒）
+COPY_MB_PER_SECOND = 200.0
+ENCODE_FPS_1080P = 60.0
+
+# 拼接时可以重新编码成的目标编码格式
+VIDEO_ENCODERS = {'h264': 'libx264', 'hevc': 'libx265', 'mpeg4': 'mpeg4', 'vp9': 'libvpx-vp9'}
+AUDIO_ENCODERS = {'aac': 'aac', 'mp3': 'libmp3lame', 'opus': 'libopus'}
+H264_PROFILES = {'High': 'high', 'Main': 'main', 'Baseline': 'baseline', 'Constrained Baseline': 'baseline'}
+
+# 流复制拼接后输出时长与各片段时长之和允许的误差（秒）
+DURATION_TOLERANCE = 0.5
+
+
+class ConcatMismatchError(RuntimeError):
+    """重新编码的片段与流复制的片段编码参数不一致，或拼接结果不完整"""
+
+def write_concat_list(video_paths, filelist_path):
+    """
+    生成concat demuxer使用的文件列表
+
+    Args:
+        video_paths (list): 视频文件路径列表
+        filelist_path (str): 列表文件路径
+    """
+    with open(filelist_path, 'w', encoding='utf-8') as f:
+        for video_path in video_paths:
+            escaped = str(Path(video_path).absolute()).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+def concatenate_videos(video1_path, video2_path, output_path, temp_dir="temp", dry_run=False,
+                       cache_dir="cache/normalized", workers=0, reencode=False, profile=None,
+                       cache_max_mb=DEFAULT_CACHE_MAX_MB):
     """
     拼接两个视频文件
-    
+
     Args:
         video1_path (str): 第一个视频文件路径
-        video2_path (str): 第二个视频文件路径  
+        video2_path (str): 第二个视频文件路径
         output_path (str): 输出视频路径
         temp_dir (str): 临时文件目录
+        dry_run (bool): 只打印拼接计划，不执行
+        cache_dir (str): 归一化片段的缓存目录
+        workers (int): 并行归一化的片段数，0为CPU核数
+        reencode (bool): 全部重新编码
+        profile (str): 重新编码使用的编码配置
+        cache_max_mb (float): 归一化片段缓存的容量上限（MB），None为不限制
     """
-    
-    # 确保输出目录存在
-    output_dir = Path(output_path).parent
-    output_dir.mkdir(parents=True, exist_ok=True)
-    
-    # 创建临时目录
-    temp_path = Path(temp_dir)
-    temp_path.mkdir(exist_ok=True)
-    
-    try:
-        # 方法1: 使用filter_complex进行拼接（推荐，处理不同分辨率/编码格式）
-        print("开始拼接视频...")
-        subprocess.run([
-            'ffmpeg', '-y',  # -y 覆盖输出文件
-            '-i', str(video1_path),
-            '-i', str(video2_path),
-            '-filter_complex', '[0:v][0:a][1:v][1:a]concat=n=2:v=1:a=1[outv][outa]',
-            '-map', '[outv]',
-            '-map', '[outa]',
-            '-c:v', 'libx264',  # 视频编码
-            '-c:a', 'aac',      # 音频编码
-            '-preset', 'medium', # 编码速度/质量平衡
-            str(output_path)
-        ], check=True)
-        
-        print(f"视频拼接成功: {output_path}")
-        return True
-        
-    except subprocess.CalledProcessError as e:
-        print(f"拼接失败，尝试使用文件列表方法...")
-        
-        # 方法2: 使用文件列表进行拼接（适用于相同格式的文件）
-        try:
-            # 创建文件列表
-            filelist_path = temp_path / "filelist.txt"
-            with open(filelist_path, 'w', encoding='utf-8') as f:
-                f.write(f"file '{Path(video1_path).absolute()}'\n")
-                f.write(f"file '{Path(video2_path).absolute()}'\n")
-            
-            subprocess.run([
-                'ffmpeg', '-y',
-                '-f', 'concat',
-                '-safe', '0',
-                '-i', str(filelist_path),
-                '-c', 'copy',  # 不重新编码，直接复制
-                str(output_path)
-            ], check=True)
-            
-            print(f"视频拼接成功: {output_path}")
-            return True
-            
-        except subprocess.CalledProcessError as e2:
-            print(f"视频拼接失败: {str(e2)}")
-            return False
-        finally:
-            # 清理临时文件
-            if filelist_path.exists():
-                filelist_path.unlink()
-    
-    finally:
-        # 清理临时目录（如果为空）
-        try:
-            temp_path.rmdir()
-        except OSError:
-            pass  # 目录不为空或有其他文件
+    return concatenate_multiple_videos([video1_path, video2_path], output_path, temp_dir, dry_run,
+                                       cache_dir, workers, reencode, profile, cache_max_mb)
 
-def concatenate_multiple_videos(video_paths, output_path, temp_dir="temp"):
+def concatenate_multiple_videos(video_paths, output_path, temp_dir="temp", dry_run=False,
+                                cache_dir="cache/normalized", workers=0, reencode=False, profile=None,
+                       cache_max_mb=DEFAULT_CACHE_MAX_MB):
     """
     拼接多个视频文件
-    
+
+    先并行探测所有输入，选出代价最低的可行方案：
+    全部流复制、只重新编码不一致的片段、或全部重新编码。
+    需要重新编码的片段各自独立归一化（并行、按内容缓存），最后统一用concat demuxer拼接，
+    内存和打开的文件数不随片段数量增长。
+
     Args:
         video_paths (list): 视频文件路径列表
         output_path (str): 输出视频路径
         temp_dir (str): 临时文件目录
+        dry_run (bool): 只打印拼接计划，不执行
+        cache_dir (str): 归一化片段的缓存目录
+        workers (int): 并行归一化的片段数，0为CPU核数
+        reencode (bool): 全部重新编码（输入为无损中间产物时，拼接同时完成最终编码）
+        profile (str): 重新编码使用的编码配置（见 utils.encoder_profiles），缺省为 delivery
+        cache_max_mb (float): 归一化片段缓存的容量上限（MB），超出后按最近使用时间淘汰，None为不限制
     """
-    
-    if len(video_paths) < 2:
+
+    existing_paths = []
+    for video_path in video_paths:
+        if Path(video_path).exists():
+            existing_paths.append(video_path)
+        else:
+            print(f"警告: 文件不存在 {video_path}")
+
+    if len(existing_paths) < 2:
         print("至少需要两个视频文件进行拼接")
         return False
-    
+
+    plan = plan_concat(existing_paths, force_reencode=reencode)
+    if plan is None:
+        return False
+    print_concat_plan(plan)
+    if dry_run:
+        return plan
+
     # 确保输出目录存在
     output_dir = Path(output_path).parent
     output_dir.mkdir(parents=True, exist_ok=True)
-    
-    # 创建临时目录
-    temp_path = Path(temp_dir)
-    temp_path.mkdir(exist_ok=True)
-    
+
+    # 每次拼接使用独立的临时目录，并发运行互不冲突
+    Path(temp_dir).mkdir(exist_ok=True)
+    work_dir = Path(tempfile.mkdtemp(prefix="concat_", dir=temp_dir))
+
     try:
-        # 创建文件列表
-        filelist_path = temp_path / "filelist.txt"
-        with open(filelist_path, 'w', encoding='utf-8') as f:
-            for video_path in video_paths:
-                if Path(video_path).exists():
-                    f.write(f"file '{Path(video_path).absolute()}'\n")
-                else:
-                    print(f"警告: 文件不存在 {video_path}")
-        
-        print(f"开始拼接 {len(video_paths)} 个视频文件...")
-        
-        # 使用concat demuxer进行拼接
-        subprocess.run([
-            'ffmpeg', '-y',
-            '-f', 'concat',
-            '-safe', '0',
-            '-i', str(filelist_path),
-            '-c', 'copy',
-            str(output_path)
-        ], check=True)
-        
+        print(f"开始拼接 {len(existing_paths)} 个视频文件...")
+        execute_concat_plan(plan, output_path, work_dir, cache_dir, workers, profile, cache_max_mb)
         print(f"多个视频拼接成功: {output_path}")
         return True
-        
-    except subprocess.CalledProcessError as e:
+
+    except (subprocess.CalledProcessError, ConcatMismatchError) as e:
         print(f"多个视频拼接失败: {str(e)}")
-        
-        # 如果失败，尝试重新编码
+        if plan['strategy'] == 'reencode':
+            return False
+
+        # 流复制失败时退回全部重新编码
         try:
             print("尝试重新编码拼接...")
-            
-            # 构建filter_complex参数
-            inputs = []
-            filter_parts = []
-            
-            for i, video_path in enumerate(video_paths):
-                inputs.extend(['-i', str(video_path)])
-                filter_parts.append(f'[{i}:v][{i}:a]')
-            
-            filter_complex = ''.join(filter_parts) + f'concat=n={len(video_paths)}:v=1:a=1[outv][outa]'
-            
-            cmd = [
-                'ffmpeg', '-y'
-            ] + inputs + [
-                '-filter_complex', filter_complex,
-                '-map', '[outv]',
-                '-map', '[outa]',
-                '-c:v', 'libx264',
-                '-c:a', 'aac',
-                '-preset', 'medium',
-                str(output_path)
-            ]
-            
-            subprocess.run(cmd, check=True)
+            needs_audio = any(info['audio']['codec'] for info in plan['infos'])
+            fallback = dict(plan, strategy='reencode', reencode=list(plan['inputs']),
+                            target=_reencode_target(plan['target'], needs_audio))
+            execute_concat_plan(fallback, output_path, work_dir, cache_dir, workers, profile,
+                                cache_max_mb)
             print(f"重新编码拼接成功: {output_path}")
             return True
-            
-        except subprocess.CalledProcessError as e2:
+
+        except (subprocess.CalledProcessError, ConcatMismatchError) as e2:
             print(f"重新编码拼接也失败: {str(e2)}")
             return False
-    
+
     finally:
         # 清理临时文件
-        if 'filelist_path' in locals() and filelist_path.exists():
-            filelist_path.unlink()
-        
+        shutil.rmtree(work_dir, ignore_errors=True)
+
         # 清理临时目录（如果为空）
         try:
-            temp_path.rmdir()
+            Path(temp_dir).rmdir()
         except OSError:
             pass
 
-def get_video_info(video_path):
-    """获取视频信息"""
-    try:
-        result = subprocess.run([
-            'ffprobe', '-v', 'quiet',
-            '-print_format', 'json',
-            '-show_format',
-            '-show_streams',
-            str(video_path)
-        ], capture_output=True, text=True, check=True)
-        
-        import json
-        info = json.loads(result.stdout)
-        
-        # 提取视频流信息
-        video_stream = next((s for s in info['streams'] if s['codec_type'] == 'video'), None)
-        audio_stream = next((s for s in info['streams'] if s['codec_type'] == 'audio'), None)
-        
-        return {
-            'duration': float(info['format']['duration']),
-            'size': int(info['format']['size']),
-            'video': {
-                'codec': video_stream['codec_name'] if video_stream else None,
-                'width': int(video_stream['width']) if video_stream else None,
-                'height': int(video_stream['height']) if video_stream else None,
-                'fps': eval(video_stream['r_frame_rate']) if video_stream else None
-            },
-            'audio': {
-                'codec': audio_stream['codec_name'] if audio_stream else None,
-                'sample_rate': int(audio_stream['sample_rate']) if audio_stream else None
-            }
+def clip_params(info):
+    """从 MediaInfo 中取出拼接关心的参数（帧率保持为精确分数）"""
+    video = info.video
+    audio = info.audio
+    return {
+        'duration': info.duration or 0.0,
+        'size': info.size,
+        'video': {
+            'codec': video.codec_name if video else None,
+            'profile': video.profile if video else None,
+            'level': video.level if video else None,
+            'width': video.width if video else None,
+            'height': video.height if video else None,
+            'fps': video.fps if video else None,
+            'time_base': video.time_base if video else None,
+            'pix_fmt': video.pix_fmt if video else None
+        },
+        'audio': {
+            'codec': audio.codec_name if audio else None,
+            'sample_rate': audio.sample_rate if audio else None,
+            'channels': audio.channels if audio else None,
+            'channel_layout': audio.channel_layout if audio else None
         }
-    except Exception as e:
-        print(f"获取视频信息失败 {video_path}: {str(e)}")
+    }
+
+def get_video_info(video_path):
+    """获取视频信息（经过探测缓存）"""
+    info = probe(video_path)
+    return clip_params(info) if info else None
+
+def clip_signature(info):
+    """能否直接流复制拼接取决于的参数：编码、档次、级别、分辨率、帧率、时间基、像素格式和音频参数"""
+    video = info['video']
+    audio = info['audio']
+    return (
+        video['codec'], video['profile'], video['level'], video['width'], video['height'],
+        round(video['fps'], 3) if video['fps'] else None, video['time_base'], video['pix_fmt'],
+        audio['codec'], audio['sample_rate'], audio['channels'], audio['channel_layout']
+    )
+
+def _encode_seconds(info, target):
+    """估算把一个片段编码为目标格式的耗时（秒）"""
+    frames = info['duration'] * (target['video']['fps'] or 25)
+    pixel_ratio = (target['video']['width'] * target['video']['height']) / (1920 * 1080)
+    return frames * pixel_ratio / ENCODE_FPS_1080P
+
+def _copy_seconds(infos):
+    """估算流复制拼接的耗时（秒）"""
+    return sum(info['size'] for info in infos) / (COPY_MB_PER_SECOND * 1024 * 1024)
+
+def plan_concat(video_paths, workers=8, force_reencode=False):
+    """
+    生成拼接计划
+
+    并行探测所有输入，以出现最多的参数组合为目标：
+    - copy: 所有片段参数一致，直接流复制
+    - partial: 只把不一致的片段重新编码成目标参数，再流复制拼接
+    - reencode: 目标编码无法匹配或指定 force_reencode 时，全部重新编码
+
+    Returns:
+        dict: 计划，包含 strategy / inputs / infos / target / reencode / estimated_seconds
+    """
+    infos = [clip_params(info) if info else None for info in probe_many(video_paths, workers)]
+    if any(info is None for info in infos):
+        print("部分视频无法读取信息，无法生成拼接计划")
+        return None
+    if any(info['video']['codec'] is None for info in infos):
+        print("部分文件没有视频流，无法拼接")
         return None
 
-if __name__ == "__main__":
-    # 示例用法
-    video1 = "video1.mp4"
-    video2 = "video2.mp4"
-    output = "output/concatenated_video.mp4"
-    
-    # 拼接两个视频
-    success = concatenate_videos(video1, video2, output)
-    
-    if success:
-        print("视频拼接完成！")
+    signatures = [clip_signature(info) for info in infos]
+    target_signature, _ = Counter(signatures).most_common(1)[0]
+    target = infos[signatures.index(target_signature)]
+    mismatched = [path for path, sig in zip(video_paths, signatures) if sig != target_signature]
+
+    # 多数片段没有音轨而少数片段有时，不能按多数派去掉音轨，只能全部重新编码
+    needs_audio = any(info['audio']['codec'] for info in infos)
+    encodable = (target['video']['codec'] in VIDEO_ENCODERS and
+                 (target['audio']['codec'] in AUDIO_ENCODERS or
+                  (target['audio']['codec'] is None and not needs_audio)))
+    if not mismatched and not force_reencode:
+        strategy = 'copy'
+        reencode = []
+        estimated = _copy_seconds(infos)
+    elif encodable and not force_reencode:
+        strategy = 'partial'
+        reencode = mismatched
+        estimated = _copy_seconds(infos) + sum(
+            _encode_seconds(info, target) for path, info in zip(video_paths, infos) if path in mismatched)
     else:
-        print("视频拼接失败！") 
\ No newline at end of file
+        strategy = 'reencode'
+        reencode = list(video_paths)
+        target = _reencode_target(target, needs_audio)
+        estimated = _copy_seconds(infos) + sum(_encode_seconds(info, target) for info in infos)
+
+    return {
+        'strategy': strategy,
+        'inputs': list(video_paths),
+        'infos': infos,
+        'target': target,
+        'reencode': reencode,
+        'estimated_seconds': estimated,
+    }
+
+def _reencode_target(target, needs_audio):
+    """全部重新编码时的目标参数：保留多数片段的分辨率和帧率，编码格式换成可编码的格式"""
+    video = dict(target['video'])
+    if video['codec'] not in VIDEO_ENCODERS:
+        video.update(codec='h264', profile='High', pix_fmt='yuv420p')
+    audio = dict(target['audio'])
+    if audio['codec'] not in AUDIO_ENCODERS and (audio['codec'] or needs_audio):
+        audio.update(codec='aac', sample_rate=audio['sample_rate'] or 44100, channels=audio['channels'] or 2)
+    return dict(target, video=video, audio=audio)
+
+def print_concat_plan(plan):
+    """打印拼接计划及估算代价"""
+    names = {'copy': '全部流复制', 'partial': '部分重新编码后流复制', 'reencode': '全部重新编码'}
+    video = plan['target']['video']
+    audio = plan['target']['audio']
+    print(f"拼接计划: {names[plan['strategy']]}，预计耗时约 {plan['estimated_seconds']:.1f} 秒")
+    print(f"  目标参数: {video['codec']} {video['width']}x{video['height']} "
+          f"{float(video['fps'] or 0):.3f}fps {video['pix_fmt']}，"
+          f"音频: {audio['codec'] or '无'} {audio['sample_rate'] or ''}")
+    for path, info in zip(plan['inputs'], plan['infos']):
+        action = "重新编码" if path in plan['reencode'] else "流复制"
+        print(f"  - [{action}] {path} ({info['video']['codec']} {info['video']['width']}x"
+              f"{info['video']['height']}, {info['duration']:.2f}秒)")
+
+def _target_encode_args(target, profile=None):
+    """把片段编码为目标参数所需的输出参数；H.264 使用编码配置的速度/质量参数"""
+    video = target['video']
+    pix_fmt = video['pix_fmt'] or 'yuv420p'
+    if video['codec'] == 'h264':
+        args = video_args(profile, pix_fmt=pix_fmt)
+        if video['profile'] in H264_PROFILES and not is_lossless(profile):
+            args += ['-profile:v', H264_PROFILES[video['profile']]]
+            if video.get('level'):
+                args += ['-level:v', str(video['level'])]
+    else:
+        args = ['-c:v', VIDEO_ENCODERS.get(video['codec'], 'libx264'), '-pix_fmt', pix_fmt]
+    if video['time_base']:
+        args += ['-video_track_timescale', video['time_base'].split('/')[1]]
+    audio = target['audio']
+    if audio['codec']:
+        args += ['-c:a', AUDIO_ENCODERS.get(audio['codec'], 'aac'),
+                 '-ar', str(audio['sample_rate']), '-ac', str(audio['channels'])]
+        if audio.get('channel_layout'):
+            args += ['-af', f"aformat=channel_layouts={audio['channel_layout']}"]
+    return args
+
+def _scale_filter(target):
+    """缩放、补边并统一帧率到目标参数"""
+    video = target['video']
+    width, height = video['width'], video['height']
+    return (f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={video['fps']}")
+
+def conform_clip(video_path, info, target, output_path, profile=None):
+    """把单个片段重新编码为目标参数，使其可以与其他片段流复制拼接"""
+    cmd = ['ffmpeg', '-y', '-i', str(video_path)]
+    has_audio = info['audio']['codec'] is not None
+    target_audio = target['audio']
+    if target_audio['codec'] and not has_audio:
+        # 目标有音轨而片段没有时补一段静音
+        layout = 'mono' if target_audio['channels'] == 1 else 'stereo'
+        cmd += ['-f', 'lavfi', '-t', f"{info['duration']:.6f}",
+                '-i', f"anullsrc=r={target_audio['sample_rate']}:cl={layout}"]
+    cmd += ['-vf', _scale_filter(target), '-map', '0:v:0']
+    if target_audio['codec']:
+        cmd += ['-map', '0:a:0' if has_audio else '1:a:0']
+    cmd += _target_encode_args(target, profile)
+    if not target_audio['codec']:
+        cmd += ['-an']
+    cmd += [str(output_path)]
+    run_ffmpeg(cmd, 'render', duration=info['duration'], output=str(output_path))
+    return output_path
+
+def concat_copy(video_paths, output_path, work_dir):
+    """用concat demuxer流复制拼接"""
+    filelist_path = Path(work_dir) / "filelist.txt"
+    write_concat_list(video_paths, filelist_path)
+    run_ffmpeg([
+        'ffmpeg', '-y',
+        '-f', 'concat',
+        '-safe', '0',
+        '-i', str(filelist_path),
+        '-c', 'copy',
+        str(output_path)
+    ], 'mux', output=str(output_path))
+
+def normalized_clip_name(digest, target, profile=None):
+    """归一化片段的缓存文件名：片段内容哈希 + 目标编码参数"""
+    payload = json.dumps({
+        'media': digest,
+        'filter': _scale_filter(target),
+        'encode': _target_encode_args(target, profile),
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32] + ".mp4"
+
+def _normalize_one(video_path, info, target, output_path, profile=None):
+    """归一化单个片段，先写临时文件再改名，避免中断时留下不完整的缓存"""
+    tmp_path = output_path.with_name(f"{output_path.stem}.{os.getpid()}.tmp.mp4")
+    conform_clip(video_path, info, target, tmp_path, profile)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+def evict_normalized_cache(cache_dir, max_bytes, keep=()):
+    """
+    归一化片段缓存总大小超过上限时，按最近访问时间淘汰最旧的片段
+
+    Args:
+        cache_dir (str): 归一化片段的缓存目录
+        max_bytes (int): 缓存容量上限（字节）
+        keep (iterable): 本次拼接正在使用的片段，不会被淘汰
+
+    Returns:
+        int: 淘汰的片段数
+    """
+    keep = {Path(path).name for path in keep}
+    clips = [(f, f.stat()) for f in Path(cache_dir).glob("*.mp4") if not f.name.endswith(".tmp.mp4")]
+    total = sum(st.st_size for _, st in clips)
+    if total <= max_bytes:
+        return 0
+
+    removed = 0
+    for clip, st in sorted(clips, key=lambda item: item[1].st_atime):
+        if total <= max_bytes:
+            break
+        if clip.name in keep:
+            continue
+        try:
+            clip.unlink()
+        except FileNotFoundError:
+            # 并发运行的另一次拼接已淘汰该片段
+            pass
+        total -= st.st_size
+        removed += 1
+    print(f"归一化片段缓存超出上限，已淘汰 {removed} 个片段")
+    return removed
+
+def normalize_clips(video_paths, infos, target, cache_dir="cache/normalized", workers=0, profile=None,
+                    cache_max_mb=None):
+    """
+    把片段并行归一化为目标参数，结果按 片段内容哈希 + 目标参数 缓存
+    cache_max_mb 不为空时，缓存超出上限后按最近访问时间淘汰本次未使用的片段
+
+    Returns:
+        list: 与 video_paths 一一对应的归一化片段路径
+    """
+    cache_path = Path(cache_dir)
+    cache_path.mkdir(parents=True, exist_ok=True)
+    digests = media_digests(video_paths, cache_path)
+    outputs = [cache_path / normalized_clip_name(digest, target, profile) for digest in digests]
+
+    # 缓存未命中且内容不重复的片段才需要编码
+    missing = {}
+    for video_path, info, output in zip(video_paths, infos, outputs):
+        if output.exists():
+            # 更新访问时间，文件系统以noatime挂载时LRU淘汰依然有效
+            os.utime(output)
+        elif output not in missing:
+            missing[output] = (video_path, info)
+    print(f"归一化片段缓存命中 {len(video_paths) - len(missing)} 个，需重新编码 {len(missing)} 个")
+
+    if missing:
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+            futures = []
+            for output, (video_path, info) in missing.items():
+                print(f"重新编码片段: {video_path}")
+                futures.append(pool.submit(_normalize_one, video_path, info, target, output, profile))
+            for future in futures:
+                future.result()
+    if cache_max_mb:
+        evict_normalized_cache(cache_path, int(cache_max_mb * 1024 * 1024), keep=outputs)
+    return outputs
+
+def execute_concat_plan(plan, output_path, work_dir, cache_dir="cache/normalized", workers=0, profile=None,
+                        cache_max_mb=DEFAULT_CACHE_MAX_MB):
+    """
+    按计划执行拼接：需要重新编码的片段先并行归一化，再统一用concat demuxer流复制拼接
+
+    部分重新编码时，归一化片段的编码参数必须与流复制的片段完全一致，否则拼出的码流无法正确解码；
+    拼接前逐个核对归一化片段，拼接后核对输出时长，不一致时抛出 ConcatMismatchError，由调用方改为全部重新编码。
+    """
+    indexes = [i for i, path in enumerate(plan['inputs']) if path in plan['reencode']]
+    paths = list(plan['inputs'])
+    if plan['strategy'] == 'partial' and is_lossless(profile):
+        # 无损片段的H.264档次与其余流复制的片段不同，不能混在同一条码流中
+        print(f"部分重新编码时不能使用无损编码配置，改用 {DEFAULT_PROFILE}")
+        profile = DEFAULT_PROFILE
+    if indexes:
+        normalized = normalize_clips([plan['inputs'][i] for i in indexes],
+                                     [plan['infos'][i] for i in indexes],
+                                     plan['target'], cache_dir, workers, profile, cache_max_mb)
+        for i, path in zip(indexes, normalized):
+            paths[i] = path
+        if plan['strategy'] == 'partial':
+            check_normalized(normalized, plan['target'])
+    concat_copy(paths, output_path, work_dir)
+    check_concat_output(output_path, sum(info['duration'] for info in plan['infos']))
+
+def check_normalized(paths, target):
+    """确认归一化片段与目标参数的流复制签名一致（编码器可能不接受要求的档次、级别或声道布局）"""
+    expected = clip_signature(target)
+    for path, info in zip(paths, probe_many([str(p) for p in paths])):
+        actual = clip_signature(clip_params(info)) if info else None
+        if actual != expected:
+            raise ConcatMismatchError(f"归一化片段编码参数与目标不一致: {path}\n"
+                                      f"  预期 {expected}\n  实际 {actual}")
+
+def check_concat_output(output_path, duration):
+    """确认拼接输出包含视频流，且时长等于各片段时长之和"""
+    info = probe(output_path, cache_path=None)
+    if info is None or info.video is None:
+        raise ConcatMismatchError(f"拼接输出没有视频流: {output_path}")
+    if info.duration is not None and abs(info.duration - duration) > DURATION_TOLERANCE:
+        raise ConcatMismatchError(f"拼接输出时长 {info.duration:.2f} 秒，预期 {duration:.2f} 秒: {output_path}")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="拼接多个视频文件")
+    parser.add_argument('output', nargs='?', default="output/concatenated_video.mp4", help="输出视频路径")
+    parser.add_argument('videos', nargs='*', default=["video1.mp4", "video2.mp4"], help="输入视频路径")
+    parser.add_argument('--dry-run', action='store_true', help="只打印拼接计划和估算代价，不执行")
+    parser.add_argument('--cache-dir', default="cache/normalized", help="归一化片段的缓存目录")
+    parser.add_argument('--cache-max-mb', type=float, default=DEFAULT_CACHE_MAX_MB,
+                        help="归一化片段缓存的容量上限（MB），0为不限制")
+    parser.add_argument('--workers', type=int, default=0, help="并行归一化的片段数，0为CPU核数")
+    parser.add_argument('--reencode', action='store_true', help="全部重新编码")
+    parser.add_argument('--profile', default=None, help="重新编码使用的编码配置：draft/delivery/intermediate")
+    args = parser.parse_args()
+
+    success = concatenate_multiple_videos(args.videos, args.output, dry_run=args.dry_run,
+                                          cache_dir=args.cache_dir, workers=args.workers,
+                                          cache_max_mb=args.cache_max_mb,
+                                          reencode=args.reencode, profile=args.profile)
+
+    if not args.dry_run:
+        print("视频拼接完成！" if success else "视频拼接失败！")
@@ -3,11 +3,32 @@
 
 """
 import os
+import gc
+import time
+import shutil
+import tempfile
+import threading
 import subprocess
+import multiprocessing
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
 from pathlib import Path
-import whisper
-import json
 import yaml
+from utils.result_cache import result_key, restore_result, save_result
+from utils.srt import format_srt_time
+from utils.telemetry import run_ffmpeg, span
+from utils.transcript import Transcript, write_outputs
+
+# 已加载的whisper模型缓存，键为 (模型名, 设备, 是否fp16)，按LRU顺序排列
+_MODEL_CACHE = OrderedDict()
+# 只保护模型缓存字典本身的短锁，加载模型时不持有
+_MODEL_CACHE_LOCK = threading.Lock()
+# 每个缓存键一把加载锁：同一模型只加载一次，加载其他模型或命中缓存的线程不必等待
+_MODEL_LOAD_LOCKS = {}
+# 进程内转写互斥：任务队列的转写任务与流水线任务在不同线程中
+# 共用同一个模型缓存，whisper模型不支持多线程同时推理
+MODEL_LOCK = threading.RLock()
 
 def load_config(config_path='config/video_processor.yaml'):
     """加载配置文件"""
@@ -18,10 +39,6 @@ def load_config(config_path='config/video_processor.yaml'):
         print(f"加载配置文件失败: {str(e)}")
         return None 
     
-def count_chinese_chars(text):
-    """统计中文字符数量"""
-    return sum(1 for char in text if '\u4e00' <= char <= '\u9fff')
-
 def ensure_directories(one_output_dir):
     """确保输出目录存在"""
     one_output_dir.mkdir(exist_ok=True)
@@ -39,48 +56,228 @@ def extract_audio(video_path, output_path):
     except subprocess.CalledProcessError as e:
         print(f"提取音频失败 {video_path}: {str(e)}")
 
-def generate_subtitle(video_path, whisper_config,output_config):
-    """使用whisper生成字幕"""
-    
-    model = whisper.load_model(whisper_config['model'])
-    result = model.transcribe(str(video_path))
+
+# whisper要求的输入格式：16kHz单声道float32 PCM
+SAMPLE_RATE = 16000
+PCM_ARGS = ['-f', 'f32le', '-ac', '1', '-ar', str(SAMPLE_RATE)]
+
+
+def _decode_command(video_path, output='-'):
+    """构造把视频音轨解码为PCM的ffmpeg命令"""
+    return ['ffmpeg', '-nostdin', '-v', 'error', '-y', '-i', str(video_path), '-vn'] + PCM_ARGS + [output]
+
+
+def decode_audio_to_file(video_path, pcm_path):
+    """一次ffmpeg解码，把PCM写入文件（供其他进程以内存映射方式读取）"""
+    run_ffmpeg(_decode_command(video_path, str(pcm_path)), 'decode', input=str(video_path))
+    return pcm_path
+
+
+def load_pcm(pcm_path):
+    """以内存映射方式打开PCM文件（写时复制，不修改原文件）"""
+    import numpy as np
+    return np.memmap(pcm_path, dtype=np.float32, mode='c')
+
+
+@contextmanager
+def decoded_audio(video_path, max_memory_mb=512, tmp_dir=None):
+    """一次ffmpeg解码得到16kHz单声道PCM
+
+    数据量不超过 max_memory_mb 时直接放在内存中；
+    超过时（长视频）改写到临时文件并以内存映射方式返回，退出时删除临时文件。
+    """
+    import numpy as np
+    limit = int(max_memory_mb * 1024 * 1024)
+    buffer = bytearray()
+    spill = None
+    total = 0
+    with span('decode', input=str(video_path)) as fields, tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(_decode_command(video_path), stdout=subprocess.PIPE, stderr=stderr)
+        try:
+            while True:
+                chunk = process.stdout.read(1 << 20)
+                if not chunk:
+                    break
+                total += len(chunk)
+                if spill is not None:
+                    spill.write(chunk)
+                    continue
+                buffer += chunk
+                if len(buffer) > limit:
+                    spill = tempfile.NamedTemporaryFile(suffix='.f32', dir=tmp_dir, delete=False)
+                    spill.write(buffer)
+                    buffer = bytearray()
+        finally:
+            process.stdout.close()
+            returncode = process.wait()
+            if spill is not None:
+                spill.close()
+        if returncode != 0:
+            if spill is not None:
+                os.unlink(spill.name)
+            stderr.seek(0)
+            raise subprocess.CalledProcessError(returncode, process.args,
+                                                stderr=stderr.read().decode('utf-8', 'replace'))
+        # float32 单声道，每个采样4字节
+        fields['media_seconds'] = round(total / 4 / SAMPLE_RATE, 3)
+
+    if spill is None:
+        yield np.frombuffer(buffer, dtype=np.float32)
+        return
+    audio = load_pcm(spill.name)
+    try:
+        yield audio
+    finally:
+        del audio
+        try:
+            os.unlink(spill.name)
+        except OSError:
+            pass
+
+
+def encode_mp3(source, output_path):
+    """把PCM编码为MP3，source 为PCM数组或PCM文件路径，不再重新解码视频"""
+    cmd = ['ffmpeg', '-nostdin', '-v', 'error', '-y'] + PCM_ARGS
+    try:
+        if isinstance(source, (str, Path)):
+            subprocess.run(cmd + ['-i', str(source), '-acodec', 'libmp3lame', '-q:a', '2',
+                                  str(output_path)], check=True)
+        else:
+            process = subprocess.Popen(cmd + ['-i', '-', '-acodec', 'libmp3lame', '-q:a', '2',
+                                              str(output_path)], stdin=subprocess.PIPE)
+            view = memoryview(source).cast('B')
+            try:
+                for offset in range(0, len(view), 1 << 20):
+                    process.stdin.write(view[offset:offset + (1 << 20)])
+            finally:
+                process.stdin.close()
+            if process.wait() != 0:
+                raise subprocess.CalledProcessError(process.returncode, process.args)
+        print(f"成功提取音频: {output_path}")
+    except subprocess.CalledProcessError as e:
+        print(f"提取音频失败 {output_path}: {str(e)}")
+
+
+def _default_device():
+    """选择默认推理设备"""
+    import torch
+    return 'cuda' if torch.cuda.is_available() else 'cpu'
+
+
+def _model_key(whisper_config):
+    """根据配置生成模型缓存键 (模型名, 设备, 是否fp16)"""
+    device = whisper_config.get('device') or _default_device()
+    fp16 = whisper_config.get('fp16')
+    if fp16 is None:
+        fp16 = device != 'cpu'
+    return (whisper_config['model'], device, bool(fp16))
+
+
+def _release_model(model, device):
+    """释放被淘汰的模型占用的内存/显存"""
+    del model
+    gc.collect()
+    if device.startswith('cuda'):
+        import torch
+        torch.cuda.empty_cache()
+
+
+def get_model(whisper_config):
+    """获取whisper模型
+
+    同一进程内按 (模型名, 设备, 精度) 复用已加载的模型，
+    缓存数量超过 cache_size 时淘汰最久未使用的模型。
+    加载在锁外进行，同一模型由第一个线程加载、其余线程等待其结果；命中缓存时不被加载阻塞。
+    """
+    key = _model_key(whisper_config)
+    with _MODEL_CACHE_LOCK:
+        if key in _MODEL_CACHE:
+            _MODEL_CACHE.move_to_end(key)
+            return _MODEL_CACHE[key]
+        load_lock = _MODEL_LOAD_LOCKS.setdefault(key, threading.Lock())
+
+    with load_lock:
+        with _MODEL_CACHE_LOCK:
+            if key in _MODEL_CACHE:
+                # 等待期间其他线程已加载完成
+                _MODEL_CACHE.move_to_end(key)
+                return _MODEL_CACHE[key]
+
+        # whisper/torch 导入耗时数秒，只在真正需要模型时导入
+        import whisper
+        name, device, fp16 = key
+        start = time.perf_counter()
+        model = whisper.load_model(name, device=device)
+        print(f"加载whisper模型 {name} ({device}, fp16={fp16}) 耗时: {time.perf_counter() - start:.2f}秒")
+
+        cache_size = max(1, int(whisper_config.get('cache_size', 1)))
+        evicted = []
+        with _MODEL_CACHE_LOCK:
+            while len(_MODEL_CACHE) >= cache_size:
+                evicted.append(_MODEL_CACHE.popitem(last=False))
+            _MODEL_CACHE[key] = model
+    # 正在用被淘汰模型转写的线程仍持有引用，转写结束后才真正释放
+    for (old_name, old_device, _), old_model in evicted:
+        print(f"淘汰whisper模型: {old_name} ({old_device})")
+        _release_model(old_model, old_device)
+    return model
+
+
+def warm_up_model(whisper_config):
+    """预热模型：提前加载并用一段静音跑一次推理，返回耗时（秒）"""
+    start = time.perf_counter()
+    model = get_model(whisper_config)
+    if whisper_config.get('warm_up', True):
+        import numpy as np
+        with MODEL_LOCK:
+            model.transcribe(np.zeros(SAMPLE_RATE, dtype=np.float32),
+                             fp16=_model_key(whisper_config)[2])
+    return time.perf_counter() - start
+
+
+def clear_model_cache():
+    """清空模型缓存"""
+    with _MODEL_CACHE_LOCK:
+        evicted = list(_MODEL_CACHE.items())
+        _MODEL_CACHE.clear()
+    for (_, device, _), model in evicted:
+        _release_model(model, device)
+
+
+def generate_subtitle(video_path, whisper_config,output_config, audio=None, stream_config=None):
+    """使用whisper生成字幕
+
+    audio 为已解码的16kHz PCM，传入时直接转写，不再让whisper重新解码视频。
+    启用 stream_config 且音频足够长时改为分块流式转写。
+    """
+    if audio is None:
+        with decoded_audio(video_path) as audio:
+            return generate_subtitle(video_path, whisper_config, output_config, audio, stream_config)
+
     output_dir=Path(output_config['output_dir'])
     one_output_dir=output_dir/video_path.stem
-    if output_config['is_subtitle']:
-        subtitle_path = one_output_dir /  f"subtitle.srt"
-        with open(subtitle_path, 'w', encoding='utf-8') as f:
-            for i, segment in enumerate(result['segments'], start=1):
-                start = format_time(segment['start'])  # type: ignore
-                end = format_time(segment['end'])      # type: ignore
-                text = segment['text'].strip()         # type: ignore
-                f.write(f"{i}\n")
-                f.write(f"{start} --> {end}\n")
-                f.write(f"{text}\n\n")
-    
-    if output_config['is_text']:
-        full_text = ""
-        txt_path = one_output_dir / f"text.txt"
-        with open(txt_path, 'w', encoding='utf-8') as f:
-            for i, segment in enumerate(result['segments'], start=1):
-                text = segment['text'].strip()         # type: ignore
-                full_text += text + "，"
-                f.write(f"{text}，")
-        char_count = count_chinese_chars(full_text)
-        print(f"文本总字数: {char_count}")
-    
-        json_path = one_output_dir / f"info.json"
-        #将full_text和char_count写入json
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump({'text': full_text, 'char_count': char_count}, f, ensure_ascii=False)
-        
-        
+    stream_config = stream_config or {}
+    if stream_config.get('enabled', False) and \
+            len(audio) > stream_config.get('min_duration', 1200) * SAMPLE_RATE:
+        from utils.long_transcribe import transcribe_long_audio
+        with span('transcribe', input=str(video_path), model=whisper_config['model'], streaming=True,
+                  media_seconds=round(len(audio) / SAMPLE_RATE, 3)):
+            transcribe_long_audio(audio, one_output_dir, whisper_config, output_config, stream_config,
+                                  media_path=video_path)
+        return
+
+    options = whisper_config.get('transcribe_options') or {}
+    model = get_model(whisper_config)
+    with MODEL_LOCK:
+        with span('transcribe', input=str(video_path), model=whisper_config['model'],
+                  media_seconds=round(len(audio) / SAMPLE_RATE, 3)):
+            result = model.transcribe(audio, fp16=_model_key(whisper_config)[2], **options)
+    write_outputs(Transcript.from_segments(result['segments']), one_output_dir, output_config)
+
+
 def format_time(seconds):
-    """将秒数转换为SRT时间格式"""
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    seconds = seconds % 60
-    milliseconds = int((seconds - int(seconds)) * 1000)
-    return f"{hours:02d}:{minutes:02d}:{int(seconds):02d},{milliseconds:03d}"
+    """将秒数转换为SRT时间格式（四舍五入到毫秒，与 Transcript 一致）"""
+    return format_srt_time(round(seconds * 1000))
 
 def process_videos():
     """处理所有视频文件"""
@@ -101,15 +298,251 @@ def process_videos():
 
     video_files = [f for f in Path(video_config['input_dir']).glob("*") 
                   if f.suffix.lower() in video_extensions]
-    
+    if not video_files:
+        print("没有找到需要处理的视频文件")
+        return
+
+    # 先查转写缓存，内容未变的视频直接恢复结果，全部命中时不加载模型
+    cache_config = config.get('cache', {})
+    cache_keys = lookup_cached_results(video_files, whisper_config, output_config, cache_config)
+    video_files = [f for f in video_files if f in cache_keys]
+    if not video_files:
+        print("所有视频均命中转写缓存，无需加载模型")
+        return
+
+    batch_config = config.get('batch', {})
+    decode_config = config.get('decode', {})
+    stream_config = config.get('streaming', {})
+    if batch_config.get('enabled', False):
+        # 批处理时已按文件并行，分块转写在各工作进程内顺序进行
+        stream_config = dict(stream_config, workers=1)
+        process_videos_parallel(video_files, whisper_config, output_config, batch_config,
+                                cache_keys, cache_config, decode_config, stream_config)
+        return
+
+    # 每次运行只加载一次模型
+    load_seconds = warm_up_model(whisper_config)
+
+    timings = []
+    run_start = time.perf_counter()
     for video_file in video_files:
-        one_output_dir=Path(output_config['output_dir'])/video_file.stem
-        ensure_directories(one_output_dir)
+        file_start = time.perf_counter()
+        transcribe_video(video_file, whisper_config, output_config, decode_config, stream_config,
+                         cache_keys[video_file], cache_config)
+        elapsed = time.perf_counter() - file_start
+        timings.append(elapsed)
+        print(f"处理完成 {video_file.name}，耗时: {elapsed:.2f}秒")
+
+    report_timings(timings, load_seconds, time.perf_counter() - run_start)
+
+
+def transcribe_video(video_file, whisper_config, output_config, decode_config=None, stream_config=None,
+                     cache_key=None, cache_config=None):
+    """转写单个视频并写入 <output_dir>/<视频名>/，完成后存入转写缓存"""
+    decode_config = decode_config or {}
+    one_output_dir = Path(output_config['output_dir']) / video_file.stem
+    ensure_directories(one_output_dir)
+    # 只解码一次，PCM同时用于MP3编码和whisper转写
+    with decoded_audio(video_file, decode_config.get('max_memory_mb', 512),
+                       decode_config.get('tmp_dir')) as audio:
         if output_config['is_audio']:
+            encode_mp3(audio, one_output_dir / "audio.mp3")
+        generate_subtitle(video_file, whisper_config, output_config, audio, stream_config)
+    cache_result(video_file, cache_key, output_config, cache_config or {})
+    return one_output_dir
+
+
+def result_files(output_config):
+    """根据输出配置列出需要缓存的结果文件"""
+    names = []
+    if output_config['is_subtitle']:
+        names.append("subtitle.srt")
+    if output_config.get('is_vtt', False):
+        names.append("subtitle.vtt")
+    if output_config['is_text']:
+        names.extend(["text.txt", "info.json"])
+    if output_config.get('is_index', True):
+        names.append("index.json")
+    return names
+
+
+def lookup_cached_results(video_files, whisper_config, output_config, cache_config):
+    """查询转写缓存
+
+    命中的视频直接恢复结果文件；返回未命中视频到缓存键的映射
+    （未启用缓存时缓存键为 None）。
+    """
+    if not cache_config.get('enabled', False):
+        return {video_file: None for video_file in video_files}
+
+    cache_dir = cache_config.get('cache_dir', 'cache/transcripts')
+    names = result_files(output_config)
+    pending = {}
+    for video_file in video_files:
+        one_output_dir = Path(output_config['output_dir']) / video_file.stem
+        ensure_directories(one_output_dir)
+        key = result_key(video_file, whisper_config, cache_dir)
+        if names and restore_result(key, one_output_dir, names, cache_dir):
+            print(f"命中转写缓存: {video_file.name}")
             audio_path = one_output_dir / "audio.mp3"
-            extract_audio(video_file,audio_path)
-        generate_subtitle(video_file, whisper_config,output_config)
-        
+            if output_config['is_audio'] and not audio_path.exists():
+                extract_audio(video_file, audio_path)
+            continue
+        pending[video_file] = key
+    print(f"转写缓存命中 {len(video_files) - len(pending)} 个，待转写 {len(pending)} 个")
+    return pending
+
+
+def cache_result(video_file, key, output_config, cache_config):
+    """转写完成后把结果存入缓存"""
+    if key is None:
+        return
+    one_output_dir = Path(output_config['output_dir']) / video_file.stem
+    save_result(key, one_output_dir, result_files(output_config),
+                cache_config.get('cache_dir', 'cache/transcripts'),
+                cache_config.get('max_size_mb'))
+
+
+def _init_transcribe_worker(whisper_config, threads_per_worker):
+    """whisper工作进程初始化：限制推理线程数，并在进程生命周期内只加载一次模型"""
+    import torch
+    torch.set_num_threads(threads_per_worker)
+    warm_up_model(whisper_config)
+
+
+def _decode_task(video_file, pcm_path, output_config):
+    """解码线程：把视频解码为PCM文件，需要时从同一份PCM编码MP3，返回 (PCM路径, 耗时秒)"""
+    start = time.perf_counter()
+    decode_audio_to_file(video_file, pcm_path)
+    if output_config['is_audio']:
+        encode_mp3(pcm_path, Path(output_config['output_dir']) / video_file.stem / "audio.mp3")
+    return pcm_path, time.perf_counter() - start
+
+
+def _transcribe_task(video_file, pcm_path, whisper_config, output_config, stream_config=None):
+    """在工作进程中转写单个视频（内存映射读取PCM），返回转写耗时（秒）"""
+    start = time.perf_counter()
+    generate_subtitle(video_file, whisper_config, output_config, load_pcm(pcm_path), stream_config)
+    return time.perf_counter() - start
+
+
+def process_videos_parallel(video_files, whisper_config, output_config, batch_config,
+                            cache_keys=None, cache_config=None, decode_config=None,
+                            stream_config=None):
+    """并行批处理视频
+
+    whisper转写使用进程池，每个工作进程各自持有一个模型；
+    音频解码只是调用ffmpeg子进程，使用独立的线程池即可。
+    解码结果写入临时PCM文件，转写进程以内存映射方式读取，避免在进程间拷贝音频。
+    同时在途（解码中或已解码待转写）的视频数不超过 max_pending，转写完成一个才解码下一个，
+    磁盘上最多保留 max_pending 个PCM临时文件，每个文件在其转写结束后立即删除。
+    """
+    transcribe_workers = max(1, int(batch_config.get('transcribe_workers', 2)))
+    extract_workers = max(1, int(batch_config.get('extract_workers', 4)))
+    # 默认每个转写进程一个正在转写、另有一个已解码待转写
+    max_pending = max(1, int(batch_config.get('max_pending') or transcribe_workers + 1))
+    extract_workers = min(extract_workers, max_pending)
+    # 平分CPU核心，避免多个进程的torch线程互相争抢
+    threads_per_worker = max(1, (os.cpu_count() or 1) // transcribe_workers)
+    print(f"并行处理 {len(video_files)} 个视频："
+          f"whisper进程 {transcribe_workers} 个，音频提取并发 {extract_workers} 个")
+
+    for video_file in video_files:
+        ensure_directories(Path(output_config['output_dir']) / video_file.stem)
+
+    run_start = time.perf_counter()
+    timings = []
+    failed = []
+    # torch/CUDA 不支持fork后复用，工作进程统一使用spawn启动
+    mp_context = multiprocessing.get_context('spawn')
+    pcm_dir = Path(tempfile.mkdtemp(prefix='pcm_', dir=(decode_config or {}).get('tmp_dir')))
+    try:
+        with ThreadPoolExecutor(max_workers=extract_workers) as extract_pool, \
+                ProcessPoolExecutor(max_workers=transcribe_workers, mp_context=mp_context,
+                                    initializer=_init_transcribe_worker,
+                                    initargs=(whisper_config, threads_per_worker)) as transcribe_pool:
+            decode_futures = {}
+            transcribe_futures = {}
+            pending = set()
+            queued = iter(enumerate(video_files))
+
+            def submit_decodes():
+                """补足在途数量：每个在途视频对应一个解码任务或转写任务"""
+                while len(pending) < max_pending:
+                    item = next(queued, None)
+                    if item is None:
+                        return
+                    index, video_file = item
+                    pcm_path = pcm_dir / f"{index}.f32"
+                    future = extract_pool.submit(_decode_task, video_file, pcm_path, output_config)
+                    decode_futures[future] = (video_file, pcm_path)
+                    pending.add(future)
+
+            # 解码完成一个就提交一个转写任务，解码与推理流水线并行
+            submit_decodes()
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                pending.difference_update(done)
+                for future in done:
+                    if future in decode_futures:
+                        video_file, pcm_path = decode_futures.pop(future)
+                        try:
+                            pcm_path, decode_seconds = future.result()
+                        except Exception as e:
+                            pcm_path.unlink(missing_ok=True)
+                            failed.append(video_file)
+                            print(f"解码失败 {video_file.name}: {str(e)}")
+                            continue
+                        new_future = transcribe_pool.submit(_transcribe_task, video_file, pcm_path,
+                                                            whisper_config, output_config, stream_config)
+                        transcribe_futures[new_future] = (video_file, pcm_path, decode_seconds)
+                        pending.add(new_future)
+                        continue
+
+                    video_file, pcm_path, decode_seconds = transcribe_futures.pop(future)
+                    pcm_path.unlink(missing_ok=True)
+                    try:
+                        transcribe_seconds = future.result()
+                    except Exception as e:
+                        failed.append(video_file)
+                        print(f"处理失败 {video_file.name}: {str(e)}")
+                        continue
+                    if cache_keys:
+                        cache_result(video_file, cache_keys[video_file], output_config, cache_config)
+                    # 单文件延迟只计该文件自身的解码和转写耗时，与串行模式一致；
+                    # 排队等待计入总耗时和吞吐量，不计入单文件延迟
+                    elapsed = decode_seconds + transcribe_seconds
+                    timings.append(elapsed)
+                    print(f"处理完成 {video_file.name}，解码: {decode_seconds:.2f}秒，"
+                          f"转写: {transcribe_seconds:.2f}秒，完成时刻: {time.perf_counter() - run_start:.2f}秒")
+                submit_decodes()
+    finally:
+        shutil.rmtree(pcm_dir, ignore_errors=True)
+
+    if timings:
+        report_timings(timings, None, time.perf_counter() - run_start)
+    if failed:
+        print(f"  - 失败 {len(failed)} 个: {', '.join(f.name for f in failed)}")
+
+
+def report_timings(timings, load_seconds, total_seconds):
+    """输出批处理耗时统计
+
+    load_seconds 为 None 时表示模型由各工作进程自行加载，不单独统计。
+    """
+    count = len(timings)
+    ordered = sorted(timings)
+    p50 = ordered[count // 2]
+    p95 = ordered[min(count - 1, int(count * 0.95))]
+    print(f"\n共处理 {count} 个视频，总耗时: {total_seconds:.2f}秒")
+    if load_seconds is not None:
+        print(f"  - 模型加载/预热: {load_seconds:.2f}秒（本次运行仅一次）")
+    print(f"  - 单文件延迟: 平均 {sum(timings) / count:.2f}秒，"
+          f"P50 {p50:.2f}秒，P95 {p95:.2f}秒，最慢 {ordered[-1]:.2f}秒")
+    if total_seconds > 0:
+        print(f"  - 吞吐量: {count * 3600 / total_seconds:.1f} 个/小时")
+    if load_seconds is not None and count > 1:
+        print(f"  - 相比每个文件重新加载模型，约节省: {load_seconds * (count - 1):.2f}秒")
 
 if __name__ == "__main__":
     # 这里需要传入config，或者从文件加载